@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Compares the LCM-generated codec for `dt_communication_msg_t` against
+`dt_communication_utils.codec` for different payload sizes.
+
+Usage:
+
+    python3 benchmarks/dt_communication_utils/bench_codec.py [--number N]
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+from dt_communication_utils import codec
+from dt_communication_utils.dt_communication_msg_t import dt_communication_msg_t
+
+PAYLOAD_SIZES = [0, 64, 1024, 16 * 1024, 256 * 1024, 1024 * 1024]
+
+
+def make_message(size: int) -> dt_communication_msg_t:
+    msg = dt_communication_msg_t()
+    msg.timestamp = 1600000000000000
+    msg.group = "/duckietown/benchmark"
+    msg.origin = "autobot01"
+    msg.destination = "*"
+    msg.metadata = json.dumps({"msg_type": "CompressedImage"})
+    msg.txt = ""
+    msg.payload = os.urandom(size)
+    msg.length = size
+    return msg
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="Iterations per measurement")
+    parsed = parser.parse_args()
+    n = parsed.number
+    # ---
+    print(f"{'payload':>10} | {'encode (lcm)':>13} | {'encode (fast)':>13} | "
+          f"{'decode (lcm)':>13} | {'decode (fast)':>13} | {'speedup enc/dec':>16}")
+    print("-" * 95)
+    for size in PAYLOAD_SIZES:
+        msg = make_message(size)
+        data = msg.encode()
+        assert codec.encode(msg) == data
+        # measure (microseconds per message)
+        enc_lcm = timeit.timeit(msg.encode, number=n) / n * 1e6
+        enc_fast = timeit.timeit(lambda: codec.encode(msg), number=n) / n * 1e6
+        dec_lcm = timeit.timeit(lambda: dt_communication_msg_t.decode(data), number=n) / n * 1e6
+        dec_fast = timeit.timeit(lambda: codec.decode(data), number=n) / n * 1e6
+        print(f"{size:>10} | {enc_lcm:>10.2f} us | {enc_fast:>10.2f} us | "
+              f"{dec_lcm:>10.2f} us | {dec_fast:>10.2f} us | "
+              f"{enc_lcm / enc_fast:>7.2f}x/{dec_lcm / dec_fast:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compares the payloads sent by publishers of a slowly changing state (a few bytes change
+between consecutive messages) without delta encoding, with compression only and with
+delta encoding (see `dt_communication_utils.delta`): average size of the payload sent,
+encode and decode time.
+
+Payloads are encoded and decoded directly, no network traffic is generated.
+
+Usage:
+
+    python3 benchmarks/dt_communication_utils/bench_delta.py [--number N]
+"""
+
+import os
+import sys
+import zlib
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+from dt_communication_utils import DTDeltaOptions
+from dt_communication_utils.delta import DTDelta
+
+STATE_SIZES = [256, 4096, 65536]
+# bytes changed between consecutive messages
+CHANGES = 8
+
+
+def states(size: int, n: int):
+    # compressible state (e.g., a configuration) that changes a little at every message
+    state = bytearray((b"duckietown-" * (size // 11 + 1))[:size])
+    out = []
+    for _ in range(n):
+        for _ in range(CHANGES):
+            state[random.randrange(size)] = random.randrange(256)
+        out.append(bytes(state))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000, help="Messages per measurement")
+    parsed = parser.parse_args()
+    n = parsed.number
+    # ---
+    print(f"{'state':>8} | {'encoding':>11} | {'size':>9} | {'encode':>10} | {'decode':>10}")
+    print("-" * 62)
+    for size in STATE_SIZES:
+        payloads = states(size, n)
+        # none
+        print(f"{size:>8} | {'none':>11} | {size:>7} B | {'-':>10} | {'-':>10}")
+        # compression only
+        compressed = []
+        enc = timeit.timeit(lambda: compressed.extend(zlib.compress(p, 1) for p in payloads),
+                            number=1) / n * 1e6
+        dec = timeit.timeit(lambda: [zlib.decompress(c) for c in compressed], number=1) / n * 1e6
+        avg = sum(map(len, compressed)) / n
+        print(f"{size:>8} | {'zlib':>11} | {avg:>7.0f} B | {enc:>7.2f} us | {dec:>7.2f} us")
+        # delta encoding
+        sender, receiver = DTDelta(), DTDelta()
+        encoder = sender.encoder(DTDeltaOptions(keyframe_every=10, keyframe_period=3600))
+        encoded = []
+        enc = timeit.timeit(lambda: encoded.extend(encoder.encode(p) for p in payloads),
+                            number=1) / n * 1e6
+        decoded = []
+        dec = timeit.timeit(lambda: decoded.extend(receiver.decode("bench", e) for e in encoded),
+                            number=1) / n * 1e6
+        assert decoded == payloads
+        avg = sum(map(len, encoded)) / n
+        print(f"{size:>8} | {'delta':>11} | {avg:>7.0f} B | {enc:>7.2f} us | {dec:>7.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Measures the cost of delivering one message to N local subscribers of the same group,
+using the shared dispatcher (decode once) versus decoding the message once per
+subscriber (the behavior before the dispatcher was introduced).
+
+Messages are injected directly into the dispatcher, no network traffic is generated.
+
+Usage:
+
+    python3 benchmarks/dt_communication_utils/bench_dispatcher.py [--number N] [--size BYTES]
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+from dt_communication_utils import DTRawCommunicationGroup, DTCommunicationGroup, codec
+from dt_communication_utils.header import DTCommunicationMessageHeader
+
+SUBSCRIBERS = [1, 2, 5, 10, 20]
+
+
+def make_group(size: int):
+    try:
+        from std_msgs.msg import String
+        group = DTCommunicationGroup("/benchmark/dispatcher", String)
+        message = String(data="x" * size)
+    except ImportError:
+        group = DTRawCommunicationGroup("/benchmark/dispatcher")
+        message = os.urandom(size)
+    return group, message
+
+
+def encode(group, message) -> bytes:
+    return codec.encode_fields(
+        1600000000000000,
+        (group.encoded_header, codec.encode_string("*"), group.encoded_metadata,
+         codec.encode_string("")),
+        group.encode(message)
+    )
+
+
+def decode_per_subscriber(group, data: bytes, n: int):
+    # what every subscriber used to do on its own
+    for _ in range(n):
+        msg = codec.decode(data)
+        header = DTCommunicationMessageHeader(msg.timestamp, msg.origin, msg.destination,
+                                              msg.txt or None)
+        payload = group.decode(msg.payload, json.loads(msg.metadata))
+        _callback(payload, header)
+
+
+def _callback(_, __):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5000, help="Iterations per measurement")
+    parser.add_argument("--size", type=int, default=1024, help="Size of the payload")
+    parsed = parser.parse_args()
+    n = parsed.number
+    # ---
+    group, message = make_group(parsed.size)
+    data = encode(group, message)
+    topic = group.DEFAULT_CHANNEL
+    print(f"payload: {type(message).__name__}, {parsed.size} bytes")
+    print(f"{'subscribers':>11} | {'per-subscriber':>14} | {'dispatcher':>11} | {'speedup':>7}")
+    print("-" * 55)
+    try:
+        for num in SUBSCRIBERS:
+            subscribers = [group.Subscriber(_callback) for _ in range(num)]
+            before = timeit.timeit(lambda: decode_per_subscriber(group, data, num),
+                                   number=n) / n * 1e6
+            after = timeit.timeit(lambda: group.dispatcher.dispatch(topic, data),
+                                  number=n) / n * 1e6
+            print(f"{num:>11} | {before:>11.2f} us | {after:>8.2f} us | {before / after:>6.2f}x")
+            for subscriber in subscribers:
+                subscriber.shutdown()
+    finally:
+        group.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Compares the envelope of version 1 (`dt_communication_msg_t`) against the compact envelope
+(see `dt_communication_utils.envelope`) for small payloads: size of the message on the
+wire, share of the message taken by the envelope, encode and decode (header and body)
+time. Messages are those of a group exchanging ROS messages of type `CompressedImage`.
+
+Usage:
+
+    python3 benchmarks/dt_communication_utils/bench_envelope.py [--number N]
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+from dt_communication_utils import codec, envelope
+
+PAYLOAD_SIZES = [0, 16, 64, 256, 1024]
+
+GROUP = "/duckietown/benchmark"
+ORIGIN = "autobot01"
+MD5SUM = "8f7a12909da2c9d3332d540a0977563f"
+METADATA = codec.encode_string(json.dumps({"msg_type": "CompressedImage"}))
+# pre-encoded by the groups
+HEADER_V1 = codec.encode_string(GROUP) + codec.encode_string(ORIGIN)
+HEADER_V2 = envelope.encode_header(GROUP, ORIGIN, MD5SUM)
+
+
+def encode_v1(payload: bytes) -> bytes:
+    return codec.encode_fields(1600000000000000, (
+        HEADER_V1,
+        codec.encode_string("*"),
+        METADATA,
+        codec.encode_string(""),
+    ), payload)
+
+
+def encode_v2(payload: bytes) -> bytes:
+    return codec.encode_fields(1600000000000000, (
+        HEADER_V2,
+        envelope.encode_string("*"),
+        envelope.encode_metadata(METADATA, True),
+        envelope.encode_string(""),
+    ), payload, fingerprint=envelope.FINGERPRINT)
+
+
+def decode_v1(data: bytes):
+    msg, offset = codec.decode_header(data)
+    return codec.decode_body(data, msg, offset)
+
+
+NAMES = {envelope.short_id(GROUP): GROUP, envelope.short_id(ORIGIN): ORIGIN}
+
+
+def decode_v2(data: bytes):
+    msg, offset, _ = envelope.decode_header(data, NAMES)
+    return envelope.decode_body(data, msg, offset)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="Iterations per measurement")
+    parsed = parser.parse_args()
+    n = parsed.number
+    # ---
+    print(f"{'payload':>8} | {'envelope':>8} | {'size':>7} | {'overhead':>8} | "
+          f"{'encode':>10} | {'decode':>10}")
+    print("-" * 68)
+    for size in PAYLOAD_SIZES:
+        payload = os.urandom(size)
+        for version, encode, decode in [(1, encode_v1, decode_v1), (2, encode_v2, decode_v2)]:
+            data = encode(payload)
+            msg = decode(data)
+            assert (msg.group, msg.origin, bytes(msg.payload)) == (GROUP, ORIGIN, payload)
+            enc = timeit.timeit(lambda: encode(payload), number=n) / n * 1e6
+            dec = timeit.timeit(lambda: decode(data), number=n) / n * 1e6
+            overhead = (len(data) - size) / len(data) * 100
+            print(f"{size:>8} | {'v' + str(version):>8} | {len(data):>5} B | {overhead:>7.1f}% | "
+                  f"{enc:>7.2f} us | {dec:>7.2f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Measures the memory allocated by a typed publisher for every message it publishes,
+serializing into a new ``BytesIO`` and assembling a new message (the behavior before the
+reusable serialization buffers were introduced) versus publishing through a publisher,
+which serializes into its own buffer and writes the rest of the message around the payload.
+
+Allocations are measured with :py:mod:`tracemalloc` as the peak of the memory allocated
+while publishing, in multiples of the payload size (i.e., how many copies of the payload
+are alive at the same time). Small payloads are dominated by a fixed overhead, timings of
+the publishers include sending the message. The native backend copies the message into its
+datagrams, and reassembles the large messages looping back to the host in the background.
+
+Messages are published with TTL 0, they never leave the host.
+
+Usage:
+
+    python3 benchmarks/dt_communication_utils/bench_publish_alloc.py [--number N]
+"""
+
+import io
+import os
+import sys
+import timeit
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+from dt_communication_utils import DTCommunicationGroup, codec
+
+PAYLOAD_SIZES = [64, 1024, 16 * 1024, 256 * 1024, 1024 * 1024]
+
+
+def make_message_type():
+    try:
+        from sensor_msgs.msg import CompressedImage
+        return CompressedImage, lambda data: CompressedImage(format="jpeg", data=data)
+    except ImportError:
+        from genpy import Message
+
+        class Blob(Message):
+            __slots__ = ["data"]
+            _slot_types = ["uint8[]"]
+
+            def __init__(self, data: bytes = b""):
+                self.data = data
+
+            def serialize(self, buff):
+                buff.write(len(self.data).to_bytes(4, "little"))
+                buff.write(self.data)
+
+        return Blob, Blob
+
+
+def publish_before(group, message):
+    # what every publish used to allocate
+    buff = io.BytesIO()
+    message.serialize(buff)
+    return codec.encode_fields(
+        1600000000000000,
+        (group.encoded_header, codec.encode_string("*"), group.encoded_metadata,
+         codec.encode_string("")),
+        buff.getvalue()
+    )
+
+
+def peak(fn, size: int, n: int) -> float:
+    # warm up (steady state)
+    fn()
+    worst = 0
+    tracemalloc.start()
+    try:
+        for _ in range(n):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            fn()
+            worst = max(worst, tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return worst / size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200, help="Iterations per measurement")
+    parsed = parser.parse_args()
+    n = parsed.number
+    # ---
+    msg_type, make = make_message_type()
+    lcm_group = DTCommunicationGroup("/benchmark/publish/lcm", msg_type, ttl=0)
+    native_group = DTCommunicationGroup("/benchmark/publish/native", msg_type, ttl=0,
+                                        batched_io=True)
+    lcm_pub, native_pub = lcm_group.Publisher(), native_group.Publisher()
+    print(f"message type: {msg_type.__name__}")
+    print(f"{'payload':>10} | {'before':>19} | {'publisher (lcm)':>19} | "
+          f"{'publisher (native)':>19}")
+    print("-" * 78)
+    try:
+        for size in PAYLOAD_SIZES:
+            message = make(os.urandom(size))
+            results = []
+            for fn in [lambda: publish_before(lcm_group, message),
+                       lambda: lcm_pub.publish(message),
+                       lambda: native_pub.publish(message)]:
+                copies = peak(fn, size, n)
+                took = timeit.timeit(fn, number=n) / n * 1e6
+                results.append(f"{copies:>5.2f}x {took:>9.2f} us")
+            print(f"{size:>10} | " + " | ".join(results))
+    finally:
+        lcm_group.shutdown()
+        native_group.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compares JSON (``json.dumps`` + :py:class:`DTRawCommunicationGroup`, what most publishers
+of dictionaries do) against :py:class:`DTStructuredCommunicationGroup` (CBOR), with and
+without a shared key dictionary, on typical telemetry payloads: encode time, decode time
+and size of the payload on the wire.
+
+Payloads are encoded and decoded by the groups directly, no network traffic is generated.
+
+Usage:
+
+    python3 benchmarks/dt_communication_utils/bench_structured.py [--number N]
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+from dt_communication_utils import DTStructuredCommunicationGroup
+
+KEYS = ["robot", "timestamp", "battery", "voltage", "charging", "temperature", "pose", "x",
+        "y", "theta", "velocity", "linear", "angular", "wheels", "left", "right",
+        "detections", "tag_id", "center", "distance", "confidence"]
+
+
+def status():
+    return {
+        "robot": "autobot01",
+        "timestamp": 1600000000.123456,
+        "battery": 87.5,
+        "voltage": 4.95,
+        "charging": False,
+        "temperature": 48.2,
+    }
+
+
+def odometry():
+    return {
+        "robot": "autobot01",
+        "timestamp": 1600000000.123456,
+        "pose": {"x": 1.2345, "y": -0.5432, "theta": 1.5707},
+        "velocity": {"linear": 0.25, "angular": -0.1},
+        "wheels": {"left": 1523, "right": 1498},
+    }
+
+
+def detections():
+    return {
+        "robot": "watchtower01",
+        "timestamp": 1600000000.123456,
+        "detections": [
+            {"tag_id": i, "center": [320.5 + i, 240.25 - i], "distance": 0.5 + i / 10,
+             "confidence": 0.9}
+            for i in range(20)
+        ],
+    }
+
+
+PAYLOADS = {"status": status(), "odometry": odometry(), "detections": detections()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000, help="Iterations per measurement")
+    parsed = parser.parse_args()
+    n = parsed.number
+    # ---
+    cbor = DTStructuredCommunicationGroup("/benchmark/structured/cbor")
+    keyed = DTStructuredCommunicationGroup("/benchmark/structured/keys", keys=KEYS)
+    print(f"{'payload':>10} | {'format':>11} | {'encode':>10} | {'decode':>10} | {'size':>7}")
+    print("-" * 62)
+    try:
+        for name, payload in PAYLOADS.items():
+            candidates = [
+                ("json", lambda p: json.dumps(p).encode("utf-8"), lambda d: json.loads(d)),
+                ("cbor", cbor.encode, lambda d: cbor.decode(d, cbor.metadata)),
+                ("cbor+keys", keyed.encode, lambda d: keyed.decode(d, keyed.metadata)),
+            ]
+            for fmt, encode, decode in candidates:
+                data = encode(payload)
+                assert decode(data) == payload
+                enc = timeit.timeit(lambda: encode(payload), number=n) / n * 1e6
+                dec = timeit.timeit(lambda: decode(data), number=n) / n * 1e6
+                print(f"{name:>10} | {fmt:>11} | {enc:>7.2f} us | {dec:>7.2f} us | "
+                      f"{len(data):>5} B")
+    finally:
+        cbor.shutdown()
+        keyed.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,81 @@ from .communication import \
     DTCommunicationMessageHeader, \
     ANYBODY_BUT_ME
 
+from .delivery import \
+    DTDeliveryOptions, \
+    DTDeliveryStats, \
+    DTOverflowPolicy
+
+from .fragmentation import \
+    DTFragmentationOptions, \
+    DTFragmentationStats
+
+from .fec import \
+    DTFecOptions, \
+    DTFecStats
+
+from .compression import \
+    DTCompressionOptions, \
+    DTCompressionStats
+
+from .batching import \
+    DTBatchingOptions
+
+from .addressing import \
+    DTAddressingOptions, \
+    DTForeignTrafficStats
+
+from .envelope import \
+    DTEnvelopeOptions
+
+from .delta import \
+    DTDeltaOptions, \
+    DTDeltaStats
+
+from .ratelimit import \
+    DTRateLimitOptions, \
+    DTRateLimitStats
+
+from .lazy import \
+    DTLazyMessage
+
+from .arrays import \
+    DTArrayCommunicationGroup
+
+from .structured import \
+    DTStructuredCommunicationGroup
+
+from .sharding import \
+    DTRawShardedCommunicationGroup, \
+    DTShardedCommunicationGroup
+
 __all__ = [
     'DTRawCommunicationGroup',
     'DTCommunicationGroup',
     'DTCommunicationPublisher',
     'DTCommunicationSubscriber',
     'DTCommunicationMessageHeader',
-    'ANYBODY_BUT_ME'
+    'ANYBODY_BUT_ME',
+    'DTDeliveryOptions',
+    'DTDeliveryStats',
+    'DTOverflowPolicy',
+    'DTFragmentationOptions',
+    'DTFragmentationStats',
+    'DTFecOptions',
+    'DTFecStats',
+    'DTCompressionOptions',
+    'DTCompressionStats',
+    'DTBatchingOptions',
+    'DTAddressingOptions',
+    'DTForeignTrafficStats',
+    'DTEnvelopeOptions',
+    'DTDeltaOptions',
+    'DTDeltaStats',
+    'DTRateLimitOptions',
+    'DTRateLimitStats',
+    'DTLazyMessage',
+    'DTArrayCommunicationGroup',
+    'DTStructuredCommunicationGroup',
+    'DTRawShardedCommunicationGroup',
+    'DTShardedCommunicationGroup'
 ]
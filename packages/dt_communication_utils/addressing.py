@@ -0,0 +1,171 @@
+"""
+Multicast addressing of the communication groups.
+
+The address of a group is derived from the SHA-256 hash of its name: the hash (modulo the
+size of the pool) picks the IP address within the pool, the rest of the hash picks the
+port within the port range. With the defaults (a /20 pool and a single port) this is the
+historical scheme, extending the port range makes collisions much less likely, and groups
+that do not share both IP address and port never receive each other's traffic.
+
+Colliding groups can be remapped by probing. Every group announces its name on its address
+(see :py:mod:`dt_communication_utils.envelope`), a group created with `probe` enabled
+listens for these announcements before joining, at the addresses of a fixed sequence
+obtained by re-hashing its name with a salt (0, 1, 2, ...). Addresses are probed in batches
+(all the addresses of a batch at once), the group joins the address where its peers are
+already announced, wherever it is in the batch, or, if none, the first address where no
+other group is. Peers are always looked for first: when the group that made the peers
+move away leaves, its address is free again, but newcomers still join their peers further
+down the sequence. The sequence only depends on the name of the group and every host hears
+the same announcements, so the hosts agree on the address without sharing any state.
+Groups that meet a newcomer on their address keep it, only the groups created afterwards
+move away.
+"""
+
+import threading
+import dataclasses
+from hashlib import sha256
+from dataclasses import dataclass, field
+from ipaddress import IPv4Address, IPv4Network
+from typing import Tuple, Dict, Set, Callable, List
+
+# maximum number of salted addresses tried before giving up on finding a free one
+_MAX_SALT = 64
+# number of salted addresses probed at once
+_PROBE_BATCH = 16
+
+
+@dataclass
+class DTAddressingOptions(object):
+    """
+    Configures how the multicast address (IP and port) of a group is derived from its name.
+    All the peers of a group must use the same options.
+
+    Parameters
+
+    - network:      (:obj:`str`): pool of multicast IP addresses
+    - port:         (:obj:`int`): first port of the port range
+    - port_range:   (:obj:`int`): number of ports in the port range
+    - probe:        (:obj:`float`): time (in seconds) spent listening for the announcements of
+                    the other groups at each candidate address before joining, `0` (default)
+                    disables remapping
+    """
+    network: str = "239.255.0.0/20"
+    port: int = 7667
+    port_range: int = 1
+    probe: float = 0.0
+
+    def __post_init__(self):
+        try:
+            network = IPv4Network(self.network)
+        except ValueError:
+            raise ValueError(f"Field `network` must be an IPv4 network, "
+                             f"got `{self.network}` instead.")
+        if not network.is_multicast:
+            raise ValueError(f"Field `network` must be a multicast network, "
+                             f"got `{self.network}` instead.")
+        if not 1 <= self.port <= 65535:
+            raise ValueError(f"Field `port` must be a valid port number, "
+                             f"got {self.port} instead.")
+        if self.port_range < 1 or self.port + self.port_range - 1 > 65535:
+            raise ValueError(f"Field `port_range` must be a positive integer and the port "
+                             f"range must not go past port 65535, "
+                             f"got {self.port_range} instead.")
+        if self.probe < 0:
+            raise ValueError(f"Field `probe` must be a non-negative number, "
+                             f"got {self.probe} instead.")
+
+
+@dataclass
+class DTForeignTrafficStats(object):
+    """
+    Traffic received by a group from other groups sharing its address (i.e., collisions).
+    Such traffic is dropped as soon as its header is decoded.
+
+    Parameters
+
+    - messages:     (:obj:`int`): foreign messages dropped
+    - bytes:        (:obj:`int`): foreign bytes dropped
+    - groups:       (:obj:`dict`): foreign messages dropped, by group name
+    """
+    messages: int = 0
+    bytes: int = 0
+    groups: Dict[str, int] = field(default_factory=dict)
+
+
+def group_address(name: str, options: DTAddressingOptions, salt: int = 0) \
+        -> Tuple[IPv4Address, int]:
+    """
+    Derives the address of a group from its name.
+
+    :param name:    (:obj:`str`):                   Name of the group.
+    :param options: (:obj:`DTAddressingOptions`):   Addressing options.
+    :param salt:    (:obj:`int`):                   Salt, used to remap colliding groups.
+    :return:        IP address and port.
+    :rtype:         Tuple[IPv4Address, int]
+    """
+    key = name if salt == 0 else f"{name}#{salt}"
+    digest = int(sha256(key.encode('utf-8')).hexdigest(), 16)
+    network = IPv4Network(options.network)
+    size = network.num_addresses
+    return network.network_address + digest % size, \
+        options.port + (digest // size) % options.port_range
+
+
+def remap(name: str, options: DTAddressingOptions,
+          probe: Callable[[List[Tuple[IPv4Address, int]]], List[Set[str]]]) \
+        -> Tuple[IPv4Address, int]:
+    """
+    Finds the address of a group by probing the addresses of its sequence.
+    See :py:mod:`dt_communication_utils.addressing`.
+
+    :param name:    (:obj:`str`):                   Name of the group.
+    :param options: (:obj:`DTAddressingOptions`):   Addressing options.
+    :param probe:   (:obj:`Callable`):              Returns the names of the groups announced
+                                                    at each of the given addresses, probed
+                                                    at once.
+    :return:        IP address and port.
+    :rtype:         Tuple[IPv4Address, int]
+    """
+    free = None
+    for first in range(0, _MAX_SALT, _PROBE_BATCH):
+        addresses = [group_address(name, options, salt)
+                     for salt in range(first, min(first + _PROBE_BATCH, _MAX_SALT))]
+        for address, groups in zip(addresses, probe(addresses)):
+            # our peers win over any free address
+            if name in groups:
+                return address
+            if free is None and not groups:
+                free = address
+        if free is not None:
+            return free
+    # the pool is (almost) full, live with the collision
+    return group_address(name, options)
+
+
+class DTForeignTraffic(object):
+    """
+    Counts the messages received from other groups sharing the address of a group.
+
+    :meta private:
+    """
+
+    def __init__(self):
+        self._stats = DTForeignTrafficStats()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> DTForeignTrafficStats:
+        """
+        A snapshot of the foreign traffic statistics.
+
+        :return: Foreign traffic statistics.
+        :rtype:  DTForeignTrafficStats
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats, groups=dict(self._stats.groups))
+
+    def add(self, group: str, size: int):
+        with self._lock:
+            self._stats.messages += 1
+            self._stats.bytes += size
+            self._stats.groups[group] = self._stats.groups.get(group, 0) + 1
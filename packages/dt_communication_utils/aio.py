@@ -0,0 +1,508 @@
+"""
+Asyncio counterpart of the communication groups.
+
+Async groups register the file descriptors of their LCM handler (and shared memory
+transport) directly on the running event loop, messages are not delivered by the mailman
+thread. Their periodic tasks (e.g., announcements, batches) run on the event loop too. Messages published in the same process by other threads (with `local_delivery`)
+are handed over to the event loop as well. Subscribers are asynchronous iterators with
+a bounded queue, when a subscriber falls behind the group stops reading from the
+network until the subscriber catches up (backpressure).
+
+.. code-block:: python
+
+    async def main():
+        group = DTAsyncCommunicationGroup('my_group', String)
+        publisher = group.Publisher()
+        subscriber = group.Subscriber()
+        await publisher.publish(String(data="Hello!"))
+        async for message, header in subscriber:
+            print(message)
+"""
+
+import asyncio
+import logging
+import threading
+import dataclasses
+from collections import deque
+from typing import Optional, Iterable, Callable, Any, Tuple, Set, Union, List
+
+from genpy import Message as GenericROSMessage
+
+from .constants import ANYBODY
+from .header import DTCommunicationMessageHeader
+from .delivery import DTDeliveryStats
+from .compression import DTCompressionOptions
+from .batching import DTBatchingOptions
+from .delta import DTDeltaOptions
+from .ratelimit import DTRateLimitOptions
+from .mailman import _DTMailmanTimer
+from .communication import \
+    DTRawCommunicationGroup, \
+    DTCommunicationPublisher, \
+    DTCommunicationSubscriber, \
+    _DTRawCommunicationSubGroup, \
+    _TypedCommunicationGroup
+
+DEFAULT_QUEUE_SIZE = 32
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.get_event_loop()
+
+
+class _DTLoopTimer(_DTMailmanTimer):
+    """
+    A periodic timer run by an event loop.
+
+    :meta private:
+    """
+
+    def __init__(self, period: float, callback: Callable[[], None]):
+        super(_DTLoopTimer, self).__init__(period, callback)
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class _DTLoopTimers(object):
+    """
+    Runs the periodic tasks of an async group on its event loop, so that async groups do not
+    need the mailman thread. Same interface as the timers of
+    :py:class:`dt_communication_utils.mailman.DTCommunicationMailman`.
+
+    Args:
+        loop        (:obj:`asyncio.AbstractEventLoop`): the event loop of the group
+        logger      (:obj:`logging.Logger`): logger used to report errors
+
+    :meta private:
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, logger: logging.Logger):
+        self._loop = loop
+        self._logger = logger
+
+    def every(self, period: float, callback: Callable[[], None]) -> _DTLoopTimer:
+        """
+        Calls the given function every `period` seconds from the event loop. The first call
+        happens after `period` seconds.
+
+        :param period:      (:obj:`float`):     Period in seconds.
+        :param callback:    (:obj:`Callable`):  Function to call.
+        :return:            A timer, cancel it with :py:meth:`cancel`.
+        :rtype:             _DTLoopTimer
+        """
+        timer = _DTLoopTimer(period, callback)
+        self._on_loop(self._schedule, timer)
+        return timer
+
+    def cancel(self, timer: _DTLoopTimer):
+        """
+        Cancels a timer created with :py:meth:`every`.
+
+        :param timer:       (:obj:`_DTLoopTimer`):  Timer to cancel.
+        """
+        timer.cancelled = True
+        self._on_loop(self._unschedule, timer)
+
+    def _on_loop(self, callback: Callable[[_DTLoopTimer], None], timer: _DTLoopTimer):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback(timer)
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback, timer)
+        except RuntimeError:
+            # the event loop is closed, the timer will never run anyway
+            pass
+
+    def _schedule(self, timer: _DTLoopTimer):
+        if not timer.cancelled:
+            timer.handle = self._loop.call_later(timer.period, self._run, timer)
+
+    @staticmethod
+    def _unschedule(timer: _DTLoopTimer):
+        if timer.handle is not None:
+            timer.handle.cancel()
+
+    def _run(self, timer: _DTLoopTimer):
+        if timer.cancelled:
+            return
+        try:
+            timer.callback()
+        except Exception:
+            self._logger.exception("An error occurred while running a timer.")
+        # the timer might have been cancelled by its own callback
+        self._schedule(timer)
+
+
+class DTAsyncCommunicationPublisher(DTCommunicationPublisher):
+
+    async def publish(self, data: Any, destination: str = ANYBODY, txt: str = None):
+        """
+        Publishes a new message.
+
+        :param data:            (:obj:`Any`):   Message to publish.
+        :param destination:     (:obj:`str`):   (Optional) Destination of this message. Used
+                                                to send private messages within a group.
+        :param txt:             (:obj:`str`)    (Optional) JSON-encoded string of user metadata.
+
+        :raises ValueError:     A given argument is of the wrong type.
+        """
+        super(DTAsyncCommunicationPublisher, self).publish(data, destination, txt)
+        # give the receiving side (and everybody else) a chance to run
+        await asyncio.sleep(0)
+
+    async def publish_serialized(self, data: bytes, msg_type: str, md5sum: str,
+                                 destination: str = ANYBODY, txt: str = None):
+        """
+        Publishes a message that is already serialized as is, see
+        :py:meth:`dt_communication_utils.DTCommunicationPublisher.publish_serialized`.
+
+        :raises ValueError:     A given argument is of the wrong type, or the type of the
+                                message does not match the type of the group.
+        """
+        super(DTAsyncCommunicationPublisher, self).publish_serialized(
+            data, msg_type, md5sum, destination, txt)
+        await asyncio.sleep(0)
+
+
+class DTAsyncCommunicationSubscriber(DTCommunicationSubscriber):
+
+    def __init__(self, group: Union['DTAsyncRawCommunicationGroup',
+                                    '_DTAsyncRawCommunicationSubGroup'],
+                 topic: str, filters: Iterable[Callable] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        (For internal use only)
+        Creates a new asynchronous Subscriber for a Group or Subgroup.
+
+        Args:
+            group:  (:obj:`Union[DTAsyncRawCommunicationGroup, _DTAsyncRawCommunicationSubGroup]`):
+                    Underlying group/subgroup.
+            topic:  (:obj:`str`):   Topic name.
+            filters:  (:obj:`Iterable[Callable]`):   Predicates on the message header.
+            queue_size:  (:obj:`int`):   Number of messages buffered before applying
+                         backpressure.
+
+        :meta private:
+        """
+        if queue_size < 1:
+            raise ValueError(f"Field `queue_size` must be a positive integer, "
+                             f"got {queue_size} instead.")
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._waiter: Optional[asyncio.Future] = None
+        self._is_shutdown = False
+        self._async_stats = DTDeliveryStats()
+        super(DTAsyncCommunicationSubscriber, self).__init__(group, topic, None, filters)
+
+    @property
+    def stats(self) -> DTDeliveryStats:
+        return dataclasses.replace(self._async_stats, queued=len(self._queue))
+
+    def deliver(self, payload: Any, header: DTCommunicationMessageHeader):
+        self._async_stats.received += 1
+        self._queue.append((payload, header))
+        # too many messages waiting, stop reading from the network
+        if len(self._queue) >= self._queue_size:
+            self._group.pause(self)
+        self._wakeup()
+
+    def deliver_many(self, messages: List[Tuple[Any, DTCommunicationMessageHeader]]):
+        self._async_stats.received += len(messages)
+        self._queue.extend(messages)
+        if len(self._queue) >= self._queue_size:
+            self._group.pause(self)
+        self._wakeup()
+
+    async def recv(self) -> Optional[Tuple[Any, DTCommunicationMessageHeader]]:
+        """
+        Waits for the next message.
+
+        :return: The pair (`message`, `header`), or `None` if the subscriber was shut down.
+        :rtype:  :obj:`Optional[Tuple[Any, DTCommunicationMessageHeader]]`
+        """
+        while not self._queue:
+            if self._is_shutdown:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        item = self._queue.popleft()
+        self._async_stats.delivered += 1
+        if len(self._queue) < self._queue_size:
+            self._group.resume(self)
+        return item
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Tuple[Any, DTCommunicationMessageHeader]:
+        item = await self.recv()
+        if item is None:
+            raise StopAsyncIteration
+        return item
+
+    def shutdown(self):
+        """
+        Shuts down the subscriber, pending iterations terminate.
+        """
+        self._is_shutdown = True
+        super(DTAsyncCommunicationSubscriber, self).shutdown()
+        self._group.resume(self)
+        self._wakeup()
+
+    def _wakeup(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class _DTAsyncGroup(object):
+    """
+    Creates asynchronous publishers and subscribers on a group or subgroup.
+
+    :meta private:
+    """
+
+    def Publisher(self, compression: DTCompressionOptions = None,
+                  batching: DTBatchingOptions = None,
+                  delta: DTDeltaOptions = None,
+                  rate_limit: DTRateLimitOptions = None) -> DTAsyncCommunicationPublisher:
+        """
+        Creates a Publisher object on this group.
+
+        :param compression: (:obj:`DTCompressionOptions`): (Optional) Compression of the
+                                                payloads sent by this publisher, defaults to
+                                                the compression of the group.
+        :param batching:    (:obj:`DTBatchingOptions`): (Optional) Send small messages in
+                                                batches rather than one at a time.
+        :param delta:       (:obj:`DTDeltaOptions`): (Optional) Send only what changed since
+                                                the last keyframe, see
+                                                :py:mod:`dt_communication_utils.delta`.
+        :param rate_limit:  (:obj:`DTRateLimitOptions`): (Optional) Conflate the messages
+                                                published faster than a maximum rate and/or
+                                                pace the bytes sent over the network.
+        :return: A new Publisher.
+        :rtype:  :obj:`DTAsyncCommunicationPublisher`
+        """
+        pub = DTAsyncCommunicationPublisher(self, self._topic, compression, batching, delta,
+                                            rate_limit)
+        self.add_publisher(pub)
+        return pub
+
+    def Subscriber(self, filters: Iterable[Callable] = None,
+                   queue_size: int = DEFAULT_QUEUE_SIZE) -> DTAsyncCommunicationSubscriber:
+        """
+        Creates a Subscriber object on this group.
+
+        Iterate over the subscriber (``async for message, header in subscriber``) to receive
+        the messages.
+
+        :param filters:     (:obj:`Iterable[Callable]`):    (Optional) Predicates on the header
+                                                of the incoming messages.
+                                                See :py:mod:`dt_communication_utils.filters`.
+        :param queue_size:  (:obj:`int`):   Number of messages buffered before the group stops
+                                            reading from the network.
+        :return: A new Subscriber.
+        :rtype:  :obj:`DTAsyncCommunicationSubscriber`
+        """
+        sub = DTAsyncCommunicationSubscriber(self, self._topic, filters, queue_size)
+        self.add_subscriber(sub)
+        return sub
+
+
+class DTAsyncRawCommunicationGroup(_DTAsyncGroup, DTRawCommunicationGroup):
+    """
+    Asynchronous version of :py:class:`dt_communication_utils.DTRawCommunicationGroup`.
+
+    Args:
+        name        (:obj:`str`): the name of the group
+        ttl         (:obj:`int`): (Time to live) the number of hops the message can do throughout
+                    the network before it is discarded.
+                    See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
+        loglevel    (:obj:`int`): Logger's level of verbosity
+        loop        (:obj:`asyncio.AbstractEventLoop`): event loop, defaults to the running loop
+        kwargs      (:obj:`dict`): other options, see :py:class:`DTRawCommunicationGroup`
+
+    """
+
+    # maximum number of messages processed before giving control back to the event loop
+    MAX_MESSAGES_PER_WAKEUP = 64
+
+    def __init__(self, name: str, ttl: int = 1, loglevel: int = logging.WARNING,
+                 loop: asyncio.AbstractEventLoop = None, **kwargs):
+        self._loop = loop or _get_loop()
+        self._reading = False
+        self._paused_by: Set[DTAsyncCommunicationSubscriber] = set()
+        DTRawCommunicationGroup.__init__(self, name, ttl, loglevel, **kwargs)
+
+    def Subgroup(self, name: str, loglevel: int = None) -> '_DTAsyncRawCommunicationSubGroup':
+        """
+        Creates a Communication Subgroup from this group.
+
+        :param name:        (:obj:`str`): Name of the subgroup (unique within this group).
+        :param loglevel:    (:obj:`int`): Logger's level of verbosity.
+        :return: :obj:`_DTAsyncRawCommunicationSubGroup`
+        """
+        if loglevel is None:
+            loglevel = self._logger.level
+        return _DTAsyncRawCommunicationSubGroup(self, name, loglevel)
+
+    def pause(self, subscriber: DTAsyncCommunicationSubscriber):
+        """
+        Stops reading from the network until the given subscriber catches up.
+
+        :param subscriber:  (:obj:`DTAsyncCommunicationSubscriber`): A subscriber falling behind.
+
+        :meta private:
+        """
+        self._paused_by.add(subscriber)
+        self._update_reader()
+
+    def resume(self, subscriber: DTAsyncCommunicationSubscriber):
+        """
+        Resumes reading from the network if no other subscriber is falling behind.
+
+        :param subscriber:  (:obj:`DTAsyncCommunicationSubscriber`): A subscriber that
+                            caught up.
+
+        :meta private:
+        """
+        self._paused_by.discard(subscriber)
+        self._update_reader()
+
+    def _delivery_lock(self) -> threading.RLock:
+        # messages are delivered by the event loop, the lock is never contended
+        return threading.RLock()
+
+    def _timer_scheduler(self) -> _DTLoopTimers:
+        # periodic tasks (e.g., announcements) run on the event loop, not on the mailman
+        return _DTLoopTimers(self._loop, self._logger)
+
+    def _delivery_scheduler(self) -> Callable[[Callable[[], None]], None]:
+        # messages published by other threads are delivered by the event loop too
+        return self._run_on_loop
+
+    def _run_on_loop(self, callback: Callable[[], None]):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            callback()
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            self._logger.warning("The event loop is closed, local message dropped.")
+
+    def _attach(self):
+        self._update_reader()
+
+    def _detach(self):
+        self._update_reader()
+
+    def _update_reader(self):
+        reading = not self.is_shutdown and not self._paused_by
+        if reading == self._reading:
+            return
+        for handler in self._handlers():
+            if reading:
+                self._loop.add_reader(handler.fileno(), self._on_readable, handler)
+            else:
+                self._loop.remove_reader(handler.fileno())
+        self._reading = reading
+
+    def _on_readable(self, handler):
+        for _ in range(self.MAX_MESSAGES_PER_WAKEUP):
+            # a subscriber might have asked us to stop
+            if not self._reading or handler.handle_timeout(0) <= 0:
+                break
+
+
+class DTAsyncCommunicationGroup(_TypedCommunicationGroup, DTAsyncRawCommunicationGroup):
+    """
+    Asynchronous version of :py:class:`dt_communication_utils.DTCommunicationGroup`.
+
+    Args:
+        name        (:obj:`str`): the name of the group
+        msg_type    (:obj:`GenericROSMessage`): type of message exchanged in this group.
+        ttl         (:obj:`int`): (Time to live) the number of hops the message can do throughout
+                    the network before it is discarded.
+                    See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
+        loglevel    (:obj:`int`): Logger's level of verbosity
+        loop        (:obj:`asyncio.AbstractEventLoop`): event loop, defaults to the running loop
+        lazy        (:obj:`bool`): deliver proxies that deserialize the messages only when
+                    their fields are accessed, see :py:mod:`dt_communication_utils.lazy`
+        numpy       (:obj:`bool`): deserialize arrays of numbers into numpy arrays
+                    (i.e., `deserialize_numpy`), for the types that have them
+        serialized  (:obj:`bool`): deliver the serialized messages (:obj:`bytes`) instead of
+                    ROS messages, e.g., to republish them on ROS as they are
+        kwargs      (:obj:`dict`): other options, see :py:class:`DTRawCommunicationGroup`
+
+    """
+
+    def __init__(self, name: str, msg_type: GenericROSMessage, ttl: int = 1,
+                 loglevel: int = logging.WARNING, loop: asyncio.AbstractEventLoop = None,
+                 lazy: bool = False, numpy: bool = False, serialized: bool = False,
+                 **kwargs):
+        # call super constructors
+        _TypedCommunicationGroup.__init__(self, msg_type, lazy, numpy, serialized)
+        DTAsyncRawCommunicationGroup.__init__(self, name, ttl, loglevel, loop, **kwargs)
+        self._metadata = {
+            "msg_type": msg_type.__name__
+        }
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    def Subgroup(self, name: str, msg_type: GenericROSMessage, loglevel: int = None) \
+            -> '_DTAsyncCommunicationSubGroup':
+        """
+        Creates a Communication Subgroup from this group.
+
+        :param name:        (:obj:`str`): Name of the subgroup (unique within this group).
+        :param msg_type:    (:obj:`GenericROSMessage`): type of message exchanged in this subgroup.
+        :param loglevel:    (:obj:`int`): Logger's level of verbosity.
+        :return: :obj:`_DTAsyncCommunicationSubGroup`
+        """
+        if loglevel is None:
+            loglevel = self._logger.level
+        return _DTAsyncCommunicationSubGroup(self, name, msg_type, loglevel)
+
+
+class _DTAsyncRawCommunicationSubGroup(_DTAsyncGroup, _DTRawCommunicationSubGroup):
+
+    def pause(self, subscriber: DTAsyncCommunicationSubscriber):
+        self._group.pause(subscriber)
+
+    def resume(self, subscriber: DTAsyncCommunicationSubscriber):
+        self._group.resume(subscriber)
+
+
+class _DTAsyncCommunicationSubGroup(_TypedCommunicationGroup, _DTAsyncRawCommunicationSubGroup):
+
+    def __init__(self, group: DTAsyncCommunicationGroup, name: str,
+                 msg_type: GenericROSMessage, loglevel: int = logging.WARNING):
+        # call super constructors
+        _TypedCommunicationGroup.__init__(self, msg_type, group.lazy, group.numpy,
+                                          group.serialized)
+        _DTAsyncRawCommunicationSubGroup.__init__(self, group, name, loglevel)
+        self._metadata = {
+            "msg_type": msg_type.__name__
+        }
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    @property
+    def metadata(self):
+        return self._metadata
@@ -0,0 +1,199 @@
+"""
+Communication groups exchanging NumPy arrays.
+
+The layout of an array (dtype, shape and strides) travels in the metadata of the message,
+the payload is the memory of the array itself, so arrays are neither serialized nor
+copied before being encapsulated into the LCM message:
+
+.. code-block:: python
+
+    group = DTArrayCommunicationGroup('point_clouds')
+    group.Publisher().publish(points)
+
+    def callback(points: numpy.ndarray, header):
+        # a read-only view over the received message
+        print(points.shape)
+
+    group.Subscriber(callback)
+
+Received arrays are views over the received payload (no copies). Groups created with
+``receive_arrays=N`` copy the incoming payloads into N preallocated arrays instead (per
+dtype and shape), used in a round-robin fashion, so that the arrays are writable and
+steady-state reception does not allocate new arrays. Callbacks (and queues) must be done
+with an array before N more messages are received.
+
+Arrays of Python objects cannot be exchanged.
+"""
+
+import json
+import logging
+import threading
+from functools import lru_cache
+from typing import Optional, Tuple, Dict, List, Any
+
+try:
+    import numpy
+    from numpy.lib.format import dtype_to_descr, descr_to_dtype
+except ImportError:
+    numpy = None
+
+from . import codec
+from .communication import DTRawCommunicationGroup
+
+# maximum number of (dtype, shape) pairs with preallocated arrays
+_MAX_LAYOUTS = 16
+
+
+@lru_cache(maxsize=256)
+def _layout(descr: str, shape: Tuple[int, ...], strides: Tuple[int, ...]) -> dict:
+    # arrays with the same layout share the same (constant) metadata
+    return {"dtype": json.loads(descr), "shape": list(shape), "strides": list(strides)}
+
+
+@lru_cache(maxsize=256)
+def _dtype(descr: str) -> 'numpy.dtype':
+    descr = json.loads(descr)
+    if isinstance(descr, list):
+        # JSON has no tuples, fields are (name, type[, shape]) tuples
+        descr = [tuple(field) for field in descr]
+    return descr_to_dtype(descr)
+
+
+def _contiguous_strides(shape: Tuple[int, ...], itemsize: int) -> Tuple[int, ...]:
+    strides, stride = [], itemsize
+    for dim in reversed(shape):
+        strides.insert(0, stride)
+        stride *= max(dim, 1)
+    return tuple(strides)
+
+
+class DTArrayCommunicationGroup(DTRawCommunicationGroup):
+    """
+    Communication Group allowing processes to exchange NumPy arrays over the network.
+    See :py:mod:`dt_communication_utils.arrays`.
+
+    Args:
+        name        (:obj:`str`): the name of the group
+        ttl         (:obj:`int`): (Time to live) the number of hops the message can do throughout
+                    the network before it is discarded.
+                    See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
+        loglevel    (:obj:`int`): Logger's level of verbosity
+        receive_arrays  (:obj:`int`): number of preallocated arrays (per dtype and shape) the
+                        incoming payloads are copied into, `None` (default) delivers views
+                        over the received payloads
+        kwargs      (:obj:`dict`): other options, see :py:class:`DTRawCommunicationGroup`
+
+    """
+
+    def __init__(self, name: str, ttl: int = 1, loglevel: int = logging.WARNING,
+                 receive_arrays: Optional[int] = None, **kwargs):
+        if numpy is None:
+            raise ValueError("Array groups are not available, install the package `numpy`.")
+        if receive_arrays is not None and receive_arrays < 1:
+            raise ValueError(f"Field `receive_arrays` must be a positive integer, "
+                             f"got {receive_arrays} instead.")
+        self._receive_arrays = receive_arrays
+        # (dtype, shape) -> [next, arrays]
+        self._arrays: Dict[Any, List[Any]] = {}
+        self._arrays_lock = threading.Lock()
+        super(DTArrayCommunicationGroup, self).__init__(name, ttl, loglevel, **kwargs)
+        self._metadata = {
+            "msg_type": "ndarray"
+        }
+
+    @property
+    def receive_arrays(self) -> Optional[int]:
+        """
+        Number of preallocated arrays the incoming payloads are copied into.
+
+        :return: Number of preallocated arrays, `None` if views are delivered instead.
+        :rtype:  Optional[int]
+        """
+        return self._receive_arrays
+
+    def _decoding_state(self) -> dict:
+        return {
+            **super(DTArrayCommunicationGroup, self)._decoding_state(),
+            "_receive_arrays": self._receive_arrays,
+        }
+
+    def _restore_decoding(self):
+        # decoders have their own preallocated arrays
+        self._arrays = {}
+        self._arrays_lock = threading.Lock()
+
+    def encode(self, msg: 'numpy.ndarray', _: codec.DTEncodingBuffer = None) \
+            -> Optional[memoryview]:
+        """
+        Returns the memory of an array, copied only if it is not contiguous.
+
+        :param msg:     (:obj:`numpy.ndarray`):     Array to encode.
+        :param _:       (:obj:`DTEncodingBuffer`):  Reusable buffer (unused).
+        :return:        Memory of the array.
+        :rtype:         :obj:`memoryview`
+
+        :meta private:
+        """
+        if not isinstance(msg, numpy.ndarray) or msg.dtype.hasobject:
+            self._logger.warning(f"Expected a NumPy array (not of objects), "
+                                 f"got `{msg.__class__.__name__}` instead.")
+            return None
+        if not (msg.flags.c_contiguous or msg.flags.f_contiguous):
+            msg = numpy.ascontiguousarray(msg)
+        # the memory of the array as it is laid out (no copies)
+        return memoryview(msg.reshape(-1, order="A").view(numpy.uint8))
+
+    def describe(self, msg: 'numpy.ndarray') -> Optional[dict]:
+        """
+        Returns the layout of an array (dtype, shape and strides), added to its metadata.
+
+        :param msg:     (:obj:`numpy.ndarray`):     Array to describe.
+        :return:        Layout of the array.
+        :rtype:         dict
+
+        :meta private:
+        """
+        if msg.flags.c_contiguous or msg.flags.f_contiguous:
+            strides = msg.strides
+        else:
+            # sent as a C-contiguous copy, see encode()
+            strides = _contiguous_strides(msg.shape, msg.itemsize)
+        return _layout(json.dumps(dtype_to_descr(msg.dtype)), msg.shape, strides)
+
+    def decode(self, data: codec.BytesLike, metadata: dict) -> Optional['numpy.ndarray']:
+        """
+        Rebuilds an array from its memory and layout.
+
+        :param data:        (:obj:`BytesLike`):  Payload.
+        :param metadata:    (:obj:`dict`):  Message metadata.
+        :return:            A view over the payload, or a preallocated array.
+        :rtype:             :obj:`numpy.ndarray`
+
+        :meta private:
+        """
+        if metadata.get('msg_type') != "ndarray":
+            self._logger.warning(f"Expected a NumPy array, "
+                                 f"got `{metadata.get('msg_type')}` instead.")
+            return None
+        try:
+            dtype = _dtype(json.dumps(metadata["dtype"]))
+            shape, strides = tuple(metadata["shape"]), tuple(metadata["strides"])
+            array = numpy.ndarray(shape, dtype, buffer=data, strides=strides)
+        except (KeyError, TypeError, ValueError):
+            self._logger.warning("Received an array with an invalid layout, dropped.")
+            return None
+        if self._receive_arrays is None:
+            return array
+        # copy into the next preallocated array
+        key = (dtype, shape, strides)
+        with self._arrays_lock:
+            arrays = self._arrays.get(key)
+            if arrays is None:
+                if len(self._arrays) >= _MAX_LAYOUTS:
+                    self._arrays.clear()
+                arrays = self._arrays[key] = \
+                    [0, [numpy.empty_like(array) for _ in range(self._receive_arrays)]]
+            out = arrays[1][arrays[0]]
+            arrays[0] = (arrays[0] + 1) % self._receive_arrays
+        numpy.copyto(out, array)
+        return out
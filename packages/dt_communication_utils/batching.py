@@ -0,0 +1,175 @@
+"""
+Batching of small messages.
+
+Publishers with batching enabled do not send small messages right away, they collect them
+for a short time and send them together as the payload of a single message (a batch),
+which saves one header, one metadata string and one datagram per message.
+Each message in a batch keeps its own timestamp, destination and user metadata (`txt`).
+
+Receivers always unpack batches, batching only needs to be enabled on the publishers.
+"""
+
+import time
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Iterator, Callable
+
+from .codec import BytesLike
+from .mailman import DTCommunicationMailman
+
+# metadata of the messages carrying a batch
+BATCH = {"batch": 1}
+
+# timestamp, length of the destination, length of txt, length of the payload
+_ENTRY = struct.Struct(">qHHI")
+
+
+@dataclass
+class DTBatchingOptions(object):
+    """
+    Configures how small messages are batched by a publisher.
+
+    Parameters
+
+    - max_delay:    (:obj:`float`): maximum time (in seconds) a message waits to be sent
+    - max_size:     (:obj:`int`): a batch is sent as soon as it reaches `max_size` bytes,
+                    larger messages are never batched. Keep it below the MTU of your links
+                    minus the size of the message header (about 200 bytes).
+    - max_messages: (:obj:`int`): maximum number of messages in a batch
+    """
+    max_delay: float = 0.01
+    max_size: int = 1200
+    max_messages: int = 64
+
+    def __post_init__(self):
+        if self.max_delay <= 0:
+            raise ValueError(f"Field `max_delay` must be a positive number, "
+                             f"got {self.max_delay} instead.")
+        if self.max_size < 1:
+            raise ValueError(f"Field `max_size` must be a positive integer, "
+                             f"got {self.max_size} instead.")
+        if self.max_messages < 1:
+            raise ValueError(f"Field `max_messages` must be a positive integer, "
+                             f"got {self.max_messages} instead.")
+
+
+def encode_entry(timestamp: int, destination: str, txt: Optional[str], data: bytes) -> bytes:
+    """
+    Encodes a message as an entry of a batch.
+
+    :param timestamp:   (:obj:`int`):   Timestamp of the message (microseconds).
+    :param destination: (:obj:`str`):   Destination of the message.
+    :param txt:         (:obj:`str`):   User metadata.
+    :param data:        (:obj:`bytes`): Payload.
+    :return:            Encoded entry.
+    :rtype:             bytes
+    """
+    destination = destination.encode("utf-8")
+    txt = (txt or "").encode("utf-8")
+    return b"".join((_ENTRY.pack(timestamp, len(destination), len(txt), len(data)),
+                     destination, txt, data))
+
+
+def decode_batch(payload: BytesLike) -> Iterator[Tuple[int, str, Optional[str], memoryview]]:
+    """
+    Decodes the entries of a batch, payloads are not copied.
+
+    :param payload: (:obj:`BytesLike`): Payload of a batch.
+    :return:        The entries as (timestamp, destination, txt, payload) tuples.
+    :rtype:         Iterator[Tuple[int, str, Optional[str], memoryview]]
+
+    :raises ValueError: The batch is malformed.
+    """
+    view = memoryview(payload)
+    offset, size = 0, view.nbytes
+    while offset < size:
+        try:
+            timestamp, dlen, tlen, plen = _ENTRY.unpack_from(view, offset)
+        except struct.error:
+            raise ValueError("Truncated batch entry.")
+        offset += _ENTRY.size
+        end = offset + dlen + tlen + plen
+        if end > size:
+            raise ValueError("Truncated batch entry.")
+        destination = bytes(view[offset:offset + dlen]).decode("utf-8")
+        offset += dlen
+        txt = bytes(view[offset:offset + tlen]).decode("utf-8") or None
+        offset += tlen
+        yield timestamp, destination, txt, view[offset:end]
+        offset = end
+
+
+class DTBatcher(object):
+    """
+    Collects the messages of a publisher and sends them in batches.
+
+    Args:
+        options     (:obj:`DTBatchingOptions`): batching options
+        send        (:obj:`Callable`): sends the payload of a batch, called with the
+                    per-message fields of the batch (e.g., the peers on shared memory)
+        timers      (:obj:`DTCommunicationMailman`): sends the late batches, defaults to the
+                    mailman
+
+    :meta private:
+    """
+
+    def __init__(self, options: DTBatchingOptions, send: Callable[[bytes, Optional[dict]], None],
+                 timers: DTCommunicationMailman = None):
+        self._options = options
+        self._timers = timers or DTCommunicationMailman.get_instance()
+        self._send = send
+        self._lock = threading.Lock()
+        self._entries: List[bytes] = []
+        self._size = 0
+        # messages in a batch must share the same per-message fields
+        self._extra: Optional[dict] = None
+        self._timer = self._timers.every(options.max_delay, self.flush)
+
+    def add(self, extra: Optional[dict], timestamp: int, destination: str,
+            txt: Optional[str], data: bytes) -> bool:
+        """
+        Adds a message to the current batch.
+
+        :param extra:       (:obj:`dict`):  Per-message fields (never modified once given).
+        :param timestamp:   (:obj:`int`):   Timestamp of the message (microseconds).
+        :param destination: (:obj:`str`):   Destination of the message.
+        :param txt:         (:obj:`str`):   User metadata.
+        :param data:        (:obj:`bytes`): Payload.
+        :return:            Whether the message was added, large messages are not batched.
+        :rtype:             bool
+        """
+        entry = encode_entry(timestamp, destination, txt, data)
+        if len(entry) > self._options.max_size:
+            # send what we have first, so that messages are not reordered
+            self.flush()
+            return False
+        with self._lock:
+            if extra is not self._extra or self._size + len(entry) > self._options.max_size:
+                self._flush()
+            self._extra = extra
+            self._entries.append(entry)
+            self._size += len(entry)
+            if len(self._entries) >= self._options.max_messages:
+                self._flush()
+        return True
+
+    def flush(self):
+        """
+        Sends the current batch (if any).
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """
+        Sends the current batch and stops the timer.
+        """
+        self._timers.cancel(self._timer)
+        self.flush()
+
+    def _flush(self):
+        if not self._entries:
+            return
+        entries, self._entries, self._size = self._entries, [], 0
+        self._send(b"".join(entries), self._extra)
@@ -0,0 +1,346 @@
+"""
+Fast, wire-compatible codec for :py:class:`dt_communication_msg_t`.
+
+The LCM-generated class creates a new ``BytesIO`` for every message, packs one field
+at a time and copies the payload multiple times on both encode and decode.
+This module uses precompiled :py:class:`struct.Struct` objects, assembles the whole message
+with a single allocation (or packs it into a reusable buffer) and decodes the payload as a
+:py:class:`memoryview` over the received datagram, so that the payload is never copied.
+"""
+
+import struct
+from functools import lru_cache
+from typing import Union, Sequence, Tuple
+
+from .dt_communication_msg_t import dt_communication_msg_t
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+FINGERPRINT = dt_communication_msg_t._get_packed_fingerprint()
+
+# fingerprint + timestamp
+_PREAMBLE = struct.Struct(">8sq")
+# length of a string field (includes the null terminator)
+_STRING_LENGTH = struct.Struct(">I")
+# length of the payload
+_PAYLOAD_LENGTH = struct.Struct(">i")
+
+
+@lru_cache(maxsize=256)
+def encode_string(value: str) -> bytes:
+    """
+    Encodes a string field the way LCM does, i.e., length-prefixed and null-terminated.
+
+    Recently encoded strings are cached. Encoded strings can also be cached by the caller
+    and passed to :py:func:`encode_fields` and :py:func:`encode_into`.
+
+    :param value:   (:obj:`str`):   String to encode.
+    :return:        Encoded string field.
+    :rtype:         :obj:`bytes`
+    """
+    data = value.encode('utf-8')
+    return _STRING_LENGTH.pack(len(data) + 1) + data + b"\0"
+
+
+def payload_length(payload: BytesLike) -> int:
+    """
+    Returns the length of a payload in bytes.
+
+    :param payload: (:obj:`BytesLike`):     Payload.
+    :return:        Length in bytes.
+    :rtype:         :obj:`int`
+    """
+    return payload.nbytes if isinstance(payload, memoryview) else len(payload)
+
+
+def encoded_size(strings: Sequence[bytes], payload: BytesLike) -> int:
+    """
+    Returns the size of a message once encoded.
+
+    :param strings: (:obj:`Sequence[bytes]`):   Encoded string fields (see :py:func:`encode_string`).
+    :param payload: (:obj:`BytesLike`):         Payload.
+    :return:        Size of the encoded message in bytes.
+    :rtype:         :obj:`int`
+    """
+    return _PREAMBLE.size + sum(map(len, strings)) + _PAYLOAD_LENGTH.size + \
+        payload_length(payload)
+
+
+def encode_into(buffer: bytearray, timestamp: int, strings: Sequence[bytes],
+                payload: BytesLike) -> int:
+    """
+    Encodes a message into the given buffer, growing it if needed.
+
+    The buffer can be reused across calls, in steady state no memory is allocated.
+
+    :param buffer:      (:obj:`bytearray`):         Destination buffer.
+    :param timestamp:   (:obj:`int`):               Timestamp of the message in microseconds.
+    :param strings:     (:obj:`Sequence[bytes]`):   Encoded string fields `group`, `origin`,
+                                                    `destination`, `metadata` and `txt`,
+                                                    in this order. Consecutive fields can
+                                                    be passed already concatenated.
+    :param payload:     (:obj:`BytesLike`):         Payload.
+    :return:            Number of bytes written in the buffer.
+    :rtype:             :obj:`int`
+    """
+    length = payload_length(payload)
+    size = encoded_size(strings, payload)
+    # make sure the buffer is big enough
+    if len(buffer) < size:
+        buffer.extend(bytes(size - len(buffer)))
+    # fingerprint and timestamp
+    _PREAMBLE.pack_into(buffer, 0, FINGERPRINT, timestamp)
+    offset = _PREAMBLE.size
+    # string fields
+    for string in strings:
+        end = offset + len(string)
+        buffer[offset:end] = string
+        offset = end
+    # payload
+    _PAYLOAD_LENGTH.pack_into(buffer, offset, length)
+    offset += _PAYLOAD_LENGTH.size
+    with memoryview(buffer) as view:
+        view[offset:offset + length] = payload
+    return size
+
+
+def encode_fields(timestamp: int, strings: Sequence[bytes], payload: BytesLike,
+                  prefix: bytes = b"", fingerprint: bytes = FINGERPRINT) -> bytes:
+    """
+    Encodes a message from its (pre-encoded) fields.
+
+    LCM only accepts read-only buffers, so the message is assembled directly into the
+    final :py:class:`bytes` object. This is the only allocation and the only copy of
+    the payload made on the publish path.
+
+    :param timestamp:   (:obj:`int`):               Timestamp of the message in microseconds.
+    :param strings:     (:obj:`Sequence[bytes]`):   Encoded string fields (see :py:func:`encode_into`).
+    :param payload:     (:obj:`BytesLike`):         Payload.
+    :param prefix:      (:obj:`bytes`):             (Optional) Bytes prepended to the payload
+                                                    (e.g., a framing header).
+    :param fingerprint: (:obj:`bytes`):             (Optional) Fingerprint of the envelope
+                                                    (e.g., of the compact envelope).
+    :return:            Encoded message.
+    :rtype:             :obj:`bytes`
+    """
+    return b"".join((
+        _PREAMBLE.pack(fingerprint, timestamp),
+        *strings,
+        _PAYLOAD_LENGTH.pack(len(prefix) + payload_length(payload)),
+        prefix,
+        payload
+    ))
+
+
+class DTEncodingBuffer(object):
+    """
+    Reusable buffer messages are serialized into (it is file-like, see :py:meth:`write`),
+    with room in front of the payload for the rest of the message, which is then written
+    in place (see :py:meth:`envelope`). In steady state, no memory is allocated.
+
+    Args:
+        size        (:obj:`int`): initial size of the buffer (it grows when needed)
+
+    :meta private:
+    """
+
+    # room in front of the payload, grows to fit the largest envelope seen
+    HEADROOM = 256
+
+    def __init__(self, size: int = 4096):
+        self._headroom = self.HEADROOM
+        self._buffer = bytearray(self._headroom + size)
+        self._position = self._headroom
+
+    @property
+    def payload_size(self) -> int:
+        """
+        Size of the payload written since the last :py:meth:`reset`.
+
+        :return: Size of the payload in bytes.
+        :rtype:  int
+        """
+        return self._position - self._headroom
+
+    def reset(self):
+        """
+        Discards the payload, the next :py:meth:`write` starts a new one.
+        """
+        self._position = self._headroom
+
+    def write(self, data: BytesLike):
+        """
+        Appends data to the payload.
+
+        :param data:    (:obj:`BytesLike`): Data to append.
+        """
+        end = self._position + payload_length(data)
+        if end > len(self._buffer):
+            # grow (at least) geometrically
+            self._buffer.extend(bytes(max(end - len(self._buffer), len(self._buffer))))
+        self._buffer[self._position:end] = data
+        self._position = end
+
+    def payload(self) -> bytes:
+        """
+        Returns a copy of the payload.
+
+        :return: Payload.
+        :rtype:  :obj:`bytes`
+        """
+        with memoryview(self._buffer) as view:
+            return bytes(view[self._headroom:self._position])
+
+    def envelope(self, timestamp: int, strings: Sequence[bytes],
+                 fingerprint: bytes = FINGERPRINT) -> memoryview:
+        """
+        Writes the rest of the message in front of the payload.
+
+        The returned view must be released (e.g., using a ``with`` block) before the buffer
+        is used again.
+
+        :param timestamp:   (:obj:`int`):               Timestamp of the message in microseconds.
+        :param strings:     (:obj:`Sequence[bytes]`):   Encoded string fields (see :py:func:`encode_into`).
+        :param fingerprint: (:obj:`bytes`):             (Optional) Fingerprint of the envelope.
+        :return:            Encoded message.
+        :rtype:             :obj:`memoryview`
+        """
+        size = _PREAMBLE.size + sum(map(len, strings)) + _PAYLOAD_LENGTH.size
+        if size > self._headroom:
+            # make room in front of the payload, once
+            grow = size - self._headroom
+            self._buffer[0:0] = bytes(grow)
+            self._headroom += grow
+            self._position += grow
+        offset = self._headroom - size
+        start = offset
+        _PREAMBLE.pack_into(self._buffer, offset, fingerprint, timestamp)
+        offset += _PREAMBLE.size
+        for string in strings:
+            end = offset + len(string)
+            self._buffer[offset:end] = string
+            offset = end
+        _PAYLOAD_LENGTH.pack_into(self._buffer, offset, self.payload_size)
+        return memoryview(self._buffer)[start:self._position]
+
+
+def encode(msg: dt_communication_msg_t) -> bytes:
+    """
+    Drop-in replacement for :py:meth:`dt_communication_msg_t.encode`.
+
+    :param msg:     (:obj:`dt_communication_msg_t`):    Message to encode.
+    :return:        Encoded message.
+    :rtype:         :obj:`bytes`
+    """
+    strings = (
+        encode_string(msg.group),
+        encode_string(msg.origin),
+        encode_string(msg.destination),
+        encode_string(msg.metadata),
+        encode_string(msg.txt),
+    )
+    payload = msg.payload
+    if payload_length(payload) != msg.length:
+        payload = memoryview(payload)[:msg.length]
+    return encode_fields(msg.timestamp, strings, payload)
+
+
+def _decode_string(data: BytesLike, offset: int) -> Tuple[str, int]:
+    """
+    Decodes the string field starting at the given offset.
+
+    :param data:    (:obj:`BytesLike`):     Encoded message.
+    :param offset:  (:obj:`int`):           Offset of the length of the field.
+    :return:        Decoded string and offset of the next field.
+    :rtype:         :obj:`Tuple[str, int]`
+
+    :raises ValueError:     The field is truncated or malformed.
+    """
+    try:
+        length = _STRING_LENGTH.unpack_from(data, offset)[0]
+    except struct.error:
+        raise ValueError(f"Truncated message, expected a string field at offset {offset} "
+                         f"but the message is {len(data)} bytes long")
+    start = offset + _STRING_LENGTH.size
+    end = start + length
+    if length < 1 or end > len(data):
+        raise ValueError(f"Truncated message, the string field at offset {offset} declares "
+                         f"{length} bytes but the message is {len(data)} bytes long")
+    return str(data[start:end - 1], 'utf-8', 'replace'), end
+
+
+def decode_header(data: BytesLike) -> Tuple[dt_communication_msg_t, int]:
+    """
+    Decodes only the fields `timestamp`, `group`, `origin` and `destination` of a message.
+
+    This is enough to decide whether a message is meant for us, the rest of the message
+    can then be decoded using :py:func:`decode_body`.
+
+    :param data:    (:obj:`BytesLike`):     Encoded message.
+    :return:        Partially decoded message and offset of the remaining fields.
+    :rtype:         :obj:`Tuple[dt_communication_msg_t, int]`
+
+    :raises ValueError:     The given data is not a valid message (e.g., it is truncated).
+    """
+    try:
+        fingerprint, timestamp = _PREAMBLE.unpack_from(data, 0)
+    except struct.error:
+        raise ValueError(f"Truncated message, {len(data)} bytes are too few for a message")
+    if fingerprint != FINGERPRINT:
+        raise ValueError("Decode error")
+    # skip the (useless) default initialization of the fields
+    msg = dt_communication_msg_t.__new__(dt_communication_msg_t)
+    msg.timestamp = timestamp
+    msg.group, end = _decode_string(data, _PREAMBLE.size)
+    msg.origin, end = _decode_string(data, end)
+    msg.destination, end = _decode_string(data, end)
+    return msg, end
+
+
+def decode_body(data: BytesLike, msg: dt_communication_msg_t, offset: int) \
+        -> dt_communication_msg_t:
+    """
+    Decodes the fields `metadata`, `txt` and `payload` of a message whose header was
+    decoded using :py:func:`decode_header`.
+
+    The field `payload` of the returned message is a :py:class:`memoryview` over `data`.
+
+    :param data:    (:obj:`BytesLike`):                 Encoded message.
+    :param msg:     (:obj:`dt_communication_msg_t`):    Partially decoded message.
+    :param offset:  (:obj:`int`):                       Offset returned by :py:func:`decode_header`.
+    :return:        Decoded message (same object as `msg`).
+    :rtype:         :obj:`dt_communication_msg_t`
+
+    :raises ValueError:     The given data is not a valid message (e.g., it is truncated).
+    """
+    msg.metadata, end = _decode_string(data, offset)
+    msg.txt, end = _decode_string(data, end)
+    # payload
+    try:
+        length = _PAYLOAD_LENGTH.unpack_from(data, end)[0]
+    except struct.error:
+        raise ValueError(f"Truncated message, expected the payload length at offset {end} "
+                         f"but the message is {len(data)} bytes long")
+    offset = end + _PAYLOAD_LENGTH.size
+    if length < 0 or offset + length > len(data):
+        raise ValueError(f"Truncated message, the payload declares {length} bytes but only "
+                         f"{len(data) - offset} are left")
+    msg.length = length
+    msg.payload = memoryview(data)[offset:offset + length]
+    return msg
+
+
+def decode(data: BytesLike) -> dt_communication_msg_t:
+    """
+    Drop-in replacement for :py:meth:`dt_communication_msg_t.decode`.
+
+    The field `payload` of the returned message is a :py:class:`memoryview` over `data`.
+
+    :param data:    (:obj:`BytesLike`):     Encoded message.
+    :return:        Decoded message.
+    :rtype:         :obj:`dt_communication_msg_t`
+
+    :raises ValueError:     The given data is not a valid message.
+    """
+    msg, offset = decode_header(data)
+    return decode_body(data, msg, offset)
@@ -3,58 +3,192 @@ import json
 from abc import abstractmethod
 
 import copy
+import functools
 import time
-import socket
 import inspect
 import logging
 import threading
-from hashlib import sha256
-from ipaddress import IPv4Address
-from typing import Callable, Union, Optional, Any
-from dataclasses import dataclass
+from ipaddress import IPv4Address, IPv4Network
+from typing import Callable, Union, Optional, Any, Iterable, List, Tuple, Set
 
 import lcm
 from genpy import Message as GenericROSMessage
 
-from .dt_communication_msg_t import dt_communication_msg_t
+from . import codec
+from . import envelope as compact
+from .constants import HOSTNAME, ANYBODY, ANYBODY_BUT_ME, PROCESS_ID
+from .header import DTCommunicationMessageHeader
+from .dispatcher import DTCommunicationDispatcher, is_for_me
+from .mailman import DTCommunicationMailman
+from .delivery import DTDelivery, DTDeliveryOptions, DTDeliveryStats
+from .shm import DTSharedMemoryTransport
+from .fragmentation import FRAGMENT, DTFragmentation, DTFragmentationOptions, \
+    DTFragmentationStats
+from .fec import FEC_DATA, FEC_PARITY, DTFec, DTFecOptions, DTFecStats
+from .compression import DTCompression, DTCompressionOptions, DTCompressionStats
+from .batching import BATCH, DTBatcher, DTBatchingOptions
+from .delta import DELTA, DTDelta, DTDeltaOptions, DTDeltaStats
+from .ratelimit import DTRateLimit, DTRateLimitOptions, DTRateLimitStats
+from .udpm import DTUDPMulticastHandler
+from .addressing import DTAddressingOptions, DTForeignTrafficStats, remap, \
+    group_address
+from .lazy import DTLazyMessage, deserialize, is_array_heavy
+from .envelope import DTEnvelopeOptions, DTEnvelopeNegotiator
 
 logging.basicConfig()
 
-HOSTNAME = socket.gethostname()
-ANYBODY = "*"
-ANYBODY_BUT_ME = f"~{HOSTNAME}"
 
+class _MetadataCache(object):
+    """
+    Keeps the LCM-encoded version of a metadata dictionary and rebuilds it only when the
+    content of the dictionary changes.
+
+    Messages can carry additional per-message fields (e.g., added by a transport), those
+    are given as dictionaries that are never modified, a new dictionary is used when the
+    fields change.
 
-@dataclass
-class DTCommunicationMessageHeader(object):
+    Args:
+        extra       (:obj:`dict`): (Optional) constant fields added to the metadata
     """
-    Models the header of a Communication Group Message.
 
-    Parameters
+    # maximum number of encoded versions kept
+    SIZE = 8
+
+    def __init__(self, extra: dict = None):
+        self._extra = extra or {}
+        self._metadata = None
+        # id(extra) -> (extra, encoded)
+        self._encoded = {}
+
+    def get(self, metadata: dict, *extras: Optional[dict]) -> bytes:
+        if metadata != self._metadata:
+            self._metadata = copy.deepcopy(metadata)
+            self._encoded = {}
+        key = tuple(map(id, extras))
+        cached = self._encoded.get(key)
+        # we keep a reference to the extras, so their ids cannot be reused while cached
+        if cached is None or any(a is not b for a, b in zip(cached[0], extras)):
+            if len(self._encoded) >= self.SIZE:
+                self._encoded.clear()
+            full = {**metadata, **self._extra}
+            for extra in extras:
+                full.update(extra or {})
+            cached = self._encoded[key] = (extras, codec.encode_string(json.dumps(full)))
+        return cached[1]
+
+
+class _DTDecoder(object):
+    """
+    Decodes the payloads of a group outside of it (e.g., in worker processes). Decoders
+    can be pickled, a detached copy of the group is rebuilt from the state it needs to
+    decode payloads (see :py:meth:`DTRawCommunicationGroup._decoding_state`).
 
-    - timestamp:      (:obj:`int`): the timestamp the message was generated in microseconds
-    - origin:         (:obj:`str`): the hostname of the origin machine
-    - destination:    (:obj:`str`): the hostname of the destination machine
-    - txt:            (:obj:`str`): extra data encoded as JSON attached to the message
+    :meta private:
     """
-    timestamp: Optional[int]
-    origin: str
-    destination: Optional[str]
-    txt: Optional[str]
 
-    def i_sent_this(self):
-        return self.origin == HOSTNAME
+    def __init__(self, cls: type, state: dict):
+        self._cls = cls
+        self._state = state
+        self._group = None
+
+    def __getstate__(self) -> dict:
+        return {"_cls": self._cls, "_state": self._state, "_group": None}
+
+    def __call__(self, data: codec.BytesLike, metadata: dict) -> Any:
+        if self._group is None:
+            group = self._cls.__new__(self._cls)
+            group.__dict__.update(self._state)
+            # state that cannot be pickled (e.g., locks)
+            restore = getattr(group, "_restore_decoding", None)
+            if restore is not None:
+                restore()
+            self._group = group
+        return self._group.decode(data, metadata)
+
+
+def _decoding_key(group: Any) -> Any:
+    """
+    Groups sharing the same decoding key decode the same payload into equivalent objects.
+    """
+    root = getattr(group, 'root', group)
+    return type(group), type(root), getattr(group, 'MsgClass', None), \
+        getattr(group, 'lazy', False), getattr(group, 'numpy', False), \
+        getattr(group, 'serialized', False), getattr(root, 'receive_arrays', None), \
+        getattr(root, 'schema', None)
 
 
 class _TypedCommunicationGroup(object):
 
-    def __init__(self, msg_type: GenericROSMessage):
+    def __init__(self, msg_type: GenericROSMessage, lazy: bool = False, numpy: bool = False,
+                 serialized: bool = False):
         # check msg_type
         if not inspect.isclass(msg_type):
             raise ValueError(f"Field `msg_type` expected to be of type `class`, "
                              f"got {msg_type.__class__.__name__} instead.")
+        if lazy and serialized:
+            raise ValueError("Fields `lazy` and `serialized` cannot be both enabled.")
         # ---
         self.MsgClass = msg_type
+        self._lazy = lazy
+        self._numpy = numpy
+        self._serialized = serialized
+        # numpy only makes a difference for types with arrays of numbers
+        self._use_numpy = numpy and is_array_heavy(msg_type)
+
+    @property
+    def lazy(self) -> bool:
+        """
+        Whether incoming messages are deserialized lazily, see
+        :py:mod:`dt_communication_utils.lazy`.
+
+        :return: Whether incoming messages are deserialized lazily.
+        :rtype:  bool
+        """
+        return self._lazy
+
+    @property
+    def numpy(self) -> bool:
+        """
+        Whether arrays of numbers are deserialized into numpy arrays.
+
+        :return: Whether arrays of numbers are deserialized into numpy arrays.
+        :rtype:  bool
+        """
+        return self._numpy
+
+    @property
+    def serialized(self) -> bool:
+        """
+        Whether subscribers receive the serialized messages (:obj:`bytes`) instead of ROS
+        messages.
+
+        :return: Whether subscribers receive the serialized messages.
+        :rtype:  bool
+        """
+        return self._serialized
+
+    @property
+    def decoder(self) -> Callable[[codec.BytesLike, dict], Any]:
+        """
+        A picklable function decoding the payloads of this group (e.g., in worker processes).
+
+        :return: Decoder.
+        :rtype:  Callable[[BytesLike, dict], Any]
+
+        :meta private:
+        """
+        return _DTDecoder(type(self), self._decoding_state())
+
+    def _decoding_state(self) -> dict:
+        # what decode() needs
+        return {
+            "MsgClass": self.MsgClass,
+            "_lazy": self._lazy,
+            "_numpy": self._numpy,
+            "_serialized": self._serialized,
+            "_use_numpy": self._use_numpy,
+            "_logger": self.logger,
+        }
 
     @property
     @abstractmethod
@@ -69,12 +203,44 @@ class _TypedCommunicationGroup(object):
         """
         pass
 
-    def encode(self, msg: Any) -> Optional[bytes]:
+    def wrap_serialized(self, data: bytes, msg_type: str, md5sum: str) -> DTLazyMessage:
+        """
+        Wraps a serialized message, after checking that its type matches the type of the
+        group, so that it can be published as is.
+
+        :param data:        (:obj:`bytes`): Serialized message.
+        :param msg_type:    (:obj:`str`):   Type of the message (e.g., `std_msgs/String`).
+        :param md5sum:      (:obj:`str`):   MD5 sum of the message definition.
+        :return:            Message that is published without being serialized again.
+        :rtype:             :obj:`DTLazyMessage`
+
+        :raises ValueError: The type of the message does not match the type of the group.
+
+        :meta private:
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise ValueError(f'Field `data` must be of type `bytes`, '
+                             f'given `{str(type(data))}` instead.')
+        expected = getattr(self.MsgClass, '_type', self.MsgClass.__name__)
+        if msg_type != expected:
+            raise ValueError(f"Expected message of type `{expected}`, "
+                             f"got `{msg_type}` instead.")
+        expected = getattr(self.MsgClass, '_md5sum', None)
+        if expected is not None and md5sum != expected:
+            raise ValueError(f"The definition of the message type `{msg_type}` does not "
+                             f"match the one of the group (md5sum `{md5sum}` instead of "
+                             f"`{expected}`).")
+        return DTLazyMessage(self.MsgClass, bytes(data), self._use_numpy)
+
+    def encode(self, msg: Any, buffer: codec.DTEncodingBuffer = None) \
+            -> Union[bytes, codec.DTEncodingBuffer, None]:
         """
         Encodes a ROS message before it is encapsulated into the LCM message.
 
         :param msg:     (:obj:`Any`):  Message to encode.
-        :return:        Encoded message.
+        :param buffer:  (:obj:`DTEncodingBuffer`):  (Optional) Reusable buffer to serialize
+                                                    the message into.
+        :return:        Encoded message, or `buffer` if the message was serialized into it.
         :rtype:         :obj:`bytes`
 
         :meta private:
@@ -84,31 +250,47 @@ class _TypedCommunicationGroup(object):
             self.logger.warning(f"Expected message of type `{self.MsgClass.__name__}`, "
                                  f"got `{msg.__class__.__name__}` instead.")
             return None
+        # lazy messages that were never deserialized are forwarded as they were received
+        if type(msg) is DTLazyMessage and not msg.is_decoded:
+            return msg.raw
         # ---
+        if buffer is not None:
+            buffer.reset()
+            msg.serialize(buffer)
+            return buffer
         buff = io.BytesIO()
         msg.serialize(buff)
         return buff.getvalue()
 
-    def decode(self, data: bytes, metadata: dict) -> Optional[GenericROSMessage]:
+    def decode(self, data: codec.BytesLike, metadata: dict) -> Optional[GenericROSMessage]:
         """
         Decodes a payload right after it comes out of the LCM message.
 
-        :param data:        (:obj:`bytes`):  Message to payload.
+        :param data:        (:obj:`BytesLike`):  Message to payload.
         :param metadata:    (:obj:`dict`):  Message metadata.
         :return:            Decoded message.
         :rtype:             :obj:`GenericROSMessage`
 
         :meta private:
         """
-        # make sure the content type matches
-        if metadata['msg_type'] != self.MsgClass.__name__:
+        # make sure the content type matches (compact envelopes carry the MD5 sum instead)
+        md5sum = metadata.get('md5sum')
+        if md5sum is not None:
+            expected = getattr(self.MsgClass, '_md5sum', md5sum)
+            if md5sum != expected:
+                self.logger.warning(f"Expected message of type `{self.MsgClass.__name__}` "
+                                     f"(md5sum `{expected}`), got md5sum `{md5sum}` instead.")
+                return None
+        elif metadata['msg_type'] != self.MsgClass.__name__:
             self.logger.warning(f"Expected message of type `{self.MsgClass.__name__}`, "
                                  f"got `{metadata['msg_type']}` instead.")
             return None
-        # decode
-        msg = self.MsgClass()
-        msg.deserialize(data)
-        return msg
+        # decode (ROS messages cannot be deserialized from a memoryview)
+        if self._serialized:
+            return bytes(data)
+        if self._lazy:
+            return DTLazyMessage(self.MsgClass, bytes(data), self._use_numpy)
+        return deserialize(self.MsgClass, bytes(data), self._use_numpy)
 
 
 class DTRawCommunicationGroup(object):
@@ -127,30 +309,103 @@ class DTRawCommunicationGroup(object):
                     the network before it is discarded.
                     See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
         loglevel    (:obj:`int`): Logger's level of verbosity
+        local_delivery  (:obj:`bool`): deliver the messages published by this group directly
+                        to the subscribers living in the same process, without going through
+                        the network. Messages are still sent to the network for remote peers.
+        local_copy  (:obj:`bool`): give local subscribers a (deep) copy of the published message
+                    rather than the message itself. Only used with `local_delivery`.
+        shared_memory   (:obj:`bool`): exchange messages with the processes on the same host
+                        through shared memory. Messages are still sent over multicast, for
+                        the peers that do not use shared memory (see `shm_exclusive`).
+        shm_size    (:obj:`int`): size (in bytes) of the shared memory buffer of this group.
+                    Messages larger than a quarter of the buffer are sent over the network.
+        shm_exclusive   (:obj:`bool`): all the peers of the group (on every host) enable
+                        shared memory, messages are sent over multicast only when a peer that
+                        is not served through shared memory subscribes to their topic. Peers
+                        that do not enable shared memory stop receiving messages.
+        fragmentation   (:obj:`DTFragmentationOptions`): split large payloads into fragments
+                        and configure how incoming fragments are reassembled.
+        fec         (:obj:`DTFecOptions`): protect the messages sent over the network with
+                    parity messages, so that receivers can rebuild the lost ones.
+        compression (:obj:`DTCompressionOptions`): compress the payloads sent over the network
+                    by the publishers of this group (publishers can override it).
+        batched_io  (:obj:`bool`): use the native UDP multicast backend, which receives and
+                    sends datagrams in batches (``recvmmsg``/``sendmmsg``) instead of
+                    going through the LCM binding. It talks to plain LCM peers.
+        socket_buffer_size  (:obj:`int`): size (in bytes) of the kernel's receive and send
+                            buffers. Only used with `batched_io`.
+        addressing  (:obj:`DTAddressingOptions`): how the multicast address and port of the
+                    group are derived from its name, all the peers must use the same options.
+        envelope    (:obj:`DTEnvelopeOptions`): let the publishers send messages in the compact
+                    envelope while all the peers understand it,
+                    see :py:mod:`dt_communication_utils.envelope`.
 
     """
 
     IP_NETWORK = "239.255.0.0/20"
     DEFAULT_PORT = 7667
     DEFAULT_CHANNEL = "/__default__"
-    LCM_HEARTBEAT_HZ = 1
 
-    def __init__(self, name: str, ttl: int = 1, loglevel: int = logging.WARNING):
+    def __init__(self, name: str, ttl: int = 1, loglevel: int = logging.WARNING,
+                 local_delivery: bool = False, local_copy: bool = False,
+                 shared_memory: bool = False, shm_size: int = DTSharedMemoryTransport.DEFAULT_SIZE,
+                 fragmentation: DTFragmentationOptions = None, fec: DTFecOptions = None,
+                 compression: DTCompressionOptions = None, batched_io: bool = False,
+                 socket_buffer_size: int = DTUDPMulticastHandler.DEFAULT_BUFFER_SIZE,
+                 addressing: DTAddressingOptions = None, envelope: DTEnvelopeOptions = None,
+                 shm_exclusive: bool = False):
         self._name = name
         self._ttl = ttl
+        self._local_delivery = local_delivery
+        self._local_copy = local_copy
+        self._topic = self.DEFAULT_CHANNEL
+        self._addressing = addressing or DTAddressingOptions(self.IP_NETWORK, self.DEFAULT_PORT)
+        self._batched_io = batched_io
+        self._socket_buffer_size = socket_buffer_size
+        self._ip, self._port = self._get_group_address()
         self._id = self._get_group_id()
-        self._url = self._get_url(self.DEFAULT_PORT)
+        self._url = self._get_url(self._port)
         self._is_shutdown = False
         self._logger = logging.getLogger(f'CommGroup[#{self._id}]')
         self._logger.setLevel(loglevel)
         self._publishers = set()
         self._subscribers = set()
         self._metadata = {}
+        # messages delivered in-process are marked so that we can ignore them when they loop back
+        self._metadata_extra = {"sender": PROCESS_ID} if local_delivery else {}
+        self._metadata_cache = _MetadataCache(self._metadata_extra)
+        self._encoded_header = codec.encode_string(self._name) + codec.encode_string(HOSTNAME)
+        self._compact_header = compact.encode_header(
+            self._name, HOSTNAME, getattr(getattr(self, 'MsgClass', None), '_md5sum', None))
         # create LCM handler
         self._logger.info(f'Creating LCM handler on URL: `{self._url}`')
-        self._lcm = lcm.LCM(self._url)
-        self._mailman = threading.Thread(target=self._spin)
-        self._mailman.start()
+        self._lcm = self._create_handler(self._url)
+        # other groups announced on our address, see _on_collision()
+        self._collisions = set()
+        lock = self._delivery_lock()
+        self._timers = self._timer_scheduler()
+        self._fragmentation = DTFragmentation(fragmentation or DTFragmentationOptions())
+        self._fec = DTFec(fec)
+        # decompressed payloads (and deltas) are bounded like reassembled ones
+        max_size = self._fragmentation.options.max_pending_bytes
+        self._compression = DTCompression(compression, max_size)
+        self._delta = DTDelta(max_size)
+        self._rate_limit = DTRateLimit(self._logger)
+        # every group announces the envelopes it understands, publishers use version 1 unless
+        # asked otherwise
+        self._negotiator = DTEnvelopeNegotiator(
+            envelope or DTEnvelopeOptions(version=1), self._lcm, self._logger, lock,
+            self._name, self._on_collision, f"{self._ip}:{self._port}", self._timers)
+        self._dispatcher = DTCommunicationDispatcher(
+            self._name, self._lcm, self._logger, lock, self._fragmentation, self._fec,
+            self._compression, None, self._negotiator.names,
+            self._delta, self._delivery_scheduler())
+        # peers on the same host are reached through shared memory
+        self._transport = None
+        if shared_memory:
+            self._transport = DTSharedMemoryTransport(self, shm_size, lock, shm_exclusive,
+                                                      self._timers)
+        self._attach()
 
     @property
     def id(self) -> int:
@@ -206,6 +461,221 @@ class DTRawCommunicationGroup(object):
         """
         return self._lcm
 
+    @property
+    def local_delivery(self) -> bool:
+        """
+        Whether messages published by this group are delivered in-process to local subscribers.
+
+        :return: Whether local delivery is enabled.
+        :rtype:  bool
+        """
+        return self._local_delivery
+
+    @property
+    def local_copy(self) -> bool:
+        """
+        Whether local subscribers receive a copy of the published messages.
+
+        :return: Whether local subscribers receive a copy.
+        :rtype:  bool
+
+        :meta private:
+        """
+        return self._local_copy
+
+    @property
+    def root(self) -> 'DTRawCommunicationGroup':
+        """
+        The group at the root of this group/subgroup hierarchy, i.e., the group itself.
+
+        :return: The group.
+        :rtype:  DTRawCommunicationGroup
+
+        :meta private:
+        """
+        return self
+
+    @property
+    def dispatcher(self) -> DTCommunicationDispatcher:
+        """
+        Dispatcher routing the incoming messages to the subscribers of this group.
+
+        :return: Dispatcher.
+        :rtype:  DTCommunicationDispatcher
+
+        :meta private:
+        """
+        return self._dispatcher
+
+    @property
+    def transport(self) -> Optional[DTSharedMemoryTransport]:
+        """
+        Shared memory transport used to reach the peers on the same host (if enabled).
+
+        :return: Shared memory transport.
+        :rtype:  DTSharedMemoryTransport
+
+        :meta private:
+        """
+        return self._transport
+
+    @property
+    def fragmentation(self) -> DTFragmentation:
+        """
+        Splits outgoing payloads and reassembles incoming ones.
+
+        :return: Fragmentation handler.
+        :rtype:  DTFragmentation
+
+        :meta private:
+        """
+        return self._fragmentation
+
+    @property
+    def fragmentation_stats(self) -> DTFragmentationStats:
+        """
+        Fragmentation statistics of this group (e.g., how many incomplete messages were
+        dropped).
+
+        :return: A snapshot of the fragmentation statistics.
+        :rtype:  DTFragmentationStats
+        """
+        return self._fragmentation.stats
+
+    @property
+    def fec(self) -> DTFec:
+        """
+        Forward error correction of the messages of this group.
+
+        :return: FEC handler.
+        :rtype:  DTFec
+
+        :meta private:
+        """
+        return self._fec
+
+    @property
+    def fec_stats(self) -> DTFecStats:
+        """
+        Forward error correction statistics of this group (e.g., how many lost messages were
+        rebuilt).
+
+        :return: A snapshot of the FEC statistics.
+        :rtype:  DTFecStats
+        """
+        return self._fec.stats
+
+    @property
+    def compression(self) -> DTCompression:
+        """
+        Compression of the payloads of this group.
+
+        :return: Compression handler.
+        :rtype:  DTCompression
+
+        :meta private:
+        """
+        return self._compression
+
+    @property
+    def compression_stats(self) -> DTCompressionStats:
+        """
+        Compression statistics of this group (e.g., compression ratio and time spent).
+
+        :return: A snapshot of the compression statistics.
+        :rtype:  DTCompressionStats
+        """
+        return self._compression.stats
+
+    @property
+    def delta(self) -> DTDelta:
+        """
+        Delta encoding of the payloads of this group.
+
+        :return: Delta encoding handler.
+        :rtype:  DTDelta
+
+        :meta private:
+        """
+        return self._delta
+
+    @property
+    def delta_stats(self) -> DTDeltaStats:
+        """
+        Delta encoding statistics of this group (e.g., keyframes and deltas sent).
+
+        :return: A snapshot of the delta encoding statistics.
+        :rtype:  DTDeltaStats
+        """
+        return self._delta.stats
+
+    @property
+    def rate_limit(self) -> DTRateLimit:
+        """
+        Rate limiting of the publishers of this group.
+
+        :return: Rate limiting handler.
+        :rtype:  DTRateLimit
+
+        :meta private:
+        """
+        return self._rate_limit
+
+    @property
+    def timers(self) -> DTCommunicationMailman:
+        """
+        Runs the periodic tasks of this group (e.g., announcements, batches).
+
+        :return: Timer scheduler (see :py:meth:`DTCommunicationMailman.every`).
+        :rtype:  DTCommunicationMailman
+
+        :meta private:
+        """
+        return self._timers
+
+    @property
+    def rate_limit_stats(self) -> DTRateLimitStats:
+        """
+        Rate limiting statistics of this group (e.g., messages conflated and paced).
+
+        :return: A snapshot of the rate limiting statistics.
+        :rtype:  DTRateLimitStats
+        """
+        return self._rate_limit.stats
+
+    @property
+    def foreign_traffic(self) -> DTForeignTrafficStats:
+        """
+        Traffic received from other groups sharing the address of this group, and dropped.
+
+        :return: A snapshot of the foreign traffic statistics.
+        :rtype:  DTForeignTrafficStats
+        """
+        return self._dispatcher.foreign_traffic
+
+    @property
+    def envelope(self) -> DTEnvelopeNegotiator:
+        """
+        Negotiates the envelope of the messages sent by this group.
+
+        :return: The envelope negotiator.
+        :rtype:  DTEnvelopeNegotiator
+
+        :meta private:
+        """
+        return self._negotiator
+
+    @property
+    def envelope_version(self) -> int:
+        """
+        Version of the envelope the publishers of this group currently use, `2` when they
+        use the compact envelope.
+
+        :return: Envelope version.
+        :rtype:  int
+        """
+        return self._negotiator.version
+
     @property
     def is_shutdown(self) -> bool:
         """
@@ -228,6 +698,29 @@ class DTRawCommunicationGroup(object):
         """
         return self._logger
 
+    @property
+    def decoder(self) -> Callable[[codec.BytesLike, dict], Any]:
+        """
+        A picklable function decoding the payloads of this group (e.g., in worker processes).
+
+        :return: Decoder.
+        :rtype:  Callable[[BytesLike, dict], Any]
+
+        :meta private:
+        """
+        return _DTDecoder(type(self), self._decoding_state())
+
+    def _decoding_state(self) -> dict:
+        """
+        The attributes :py:meth:`decode` needs, they must be picklable. Groups with state
+        that cannot be pickled (e.g., locks) rebuild it in `_restore_decoding()`.
+
+        :meta private:
+        """
+        return {
+            "_logger": self._logger,
+        }
+
     @property
     def metadata(self) -> dict:
         """
@@ -240,6 +733,56 @@ class DTRawCommunicationGroup(object):
         """
         return self._metadata
 
+    @property
+    def encoded_metadata(self) -> bytes:
+        """
+        Metadata to append to each message leaving this group handler, LCM-encoded.
+        The encoded value is cached and rebuilt only when the metadata changes.
+
+        :return: Encoded metadata.
+        :rtype:  bytes
+
+        :meta private:
+        """
+        return self._metadata_cache.get(self.metadata)
+
+    def encode_metadata(self, *extras: Optional[dict]) -> bytes:
+        """
+        LCM-encodes the metadata of this group together with per-message fields.
+
+        :param extras:  (:obj:`dict`):  Additional fields (never modified once given).
+        :return:        Encoded metadata.
+        :rtype:         bytes
+
+        :meta private:
+        """
+        return self._metadata_cache.get(self.metadata, *extras)
+
+    @property
+    def encoded_header(self) -> bytes:
+        """
+        Pre-encoded `group` and `origin` fields of the messages leaving this group handler.
+
+        :return: Encoded header fields.
+        :rtype:  bytes
+
+        :meta private:
+        """
+        return self._encoded_header
+
+    @property
+    def compact_header(self) -> bytes:
+        """
+        Pre-encoded `group`, `origin` and `flags` fields of the compact envelope of the
+        messages leaving this group handler.
+
+        :return: Encoded header fields.
+        :rtype:  bytes
+
+        :meta private:
+        """
+        return self._compact_header
+
     def Subgroup(self, name: str, loglevel: int = None) -> '_DTRawCommunicationSubGroup':
         """
         Creates a Communication Subgroup from this group.
@@ -252,18 +795,34 @@ class DTRawCommunicationGroup(object):
             loglevel = self._logger.level
         return _DTRawCommunicationSubGroup(self, name, loglevel)
 
-    def Publisher(self) -> 'DTCommunicationPublisher':
+    def Publisher(self, compression: DTCompressionOptions = None,
+                  batching: DTBatchingOptions = None,
+                  delta: DTDeltaOptions = None,
+                  rate_limit: DTRateLimitOptions = None) -> 'DTCommunicationPublisher':
         """
         Creates a Publisher object on this group.
 
+        :param compression: (:obj:`DTCompressionOptions`): (Optional) Compression of the
+                                                payloads sent by this publisher, defaults to
+                                                the compression of the group.
+        :param batching:    (:obj:`DTBatchingOptions`): (Optional) Send small messages in
+                                                batches rather than one at a time.
+        :param delta:       (:obj:`DTDeltaOptions`): (Optional) Send only what changed since
+                                                the last keyframe, see
+                                                :py:mod:`dt_communication_utils.delta`.
+        :param rate_limit:  (:obj:`DTRateLimitOptions`): (Optional) Conflate the messages
+                                                published faster than a maximum rate and/or
+                                                pace the bytes sent over the network.
         :return: A new Publisher.
         :rtype:  :obj:`DTCommunicationPublisher`
         """
-        pub = DTCommunicationPublisher(self, self.DEFAULT_CHANNEL)
+        pub = DTCommunicationPublisher(self, self._topic, compression, batching, delta,
+                                       rate_limit)
         self.add_publisher(pub)
         return pub
 
-    def Subscriber(self, callback: Callable) -> 'DTCommunicationSubscriber':
+    def Subscriber(self, callback: Callable, filters: Iterable[Callable] = None,
+                   delivery: DTDeliveryOptions = None) -> 'DTCommunicationSubscriber':
         """
         Creates a Subscriber object on this group.
 
@@ -272,10 +831,18 @@ class DTRawCommunicationGroup(object):
                                                 arguments, `payload` (:obj:`bytes`) and
                                                 `header` (:obj:`DTCommunicationMessageHeader`:),
                                                 in this order.
+        :param filters:     (:obj:`Iterable[Callable]`):    (Optional) Predicates on the header
+                                                (:obj:`DTCommunicationMessageHeader`) of the
+                                                incoming messages. Messages are decoded and
+                                                delivered only if all predicates return `True`.
+                                                See :py:mod:`dt_communication_utils.filters`.
+        :param delivery:    (:obj:`DTDeliveryOptions`): (Optional) How messages are delivered
+                                                to the callback (e.g., through a bounded
+                                                queue and worker threads).
         :return: A new Subscriber.
         :rtype:  :obj:`DTCommunicationPublisher`
         """
-        sub = DTCommunicationSubscriber(self, self.DEFAULT_CHANNEL, callback)
+        sub = DTCommunicationSubscriber(self, self._topic, callback, filters, delivery)
         self.add_subscriber(sub)
         return sub
 
@@ -320,11 +887,12 @@ class DTRawCommunicationGroup(object):
         self._subscribers.remove(subscriber)
 
     @staticmethod
-    def encode(msg: bytes) -> bytes:
+    def encode(msg: bytes, _: codec.DTEncodingBuffer = None) -> bytes:
         """
         Encodes a message before it is encapsulated into the LCM message.
 
         :param msg:    (:obj:`bytes`):  Message to encode.
+        :param _:      (:obj:`DTEncodingBuffer`):  Reusable buffer (unused).
         :return:    Encoded message.
         :rtype:     :obj:`bytes`
 
@@ -333,18 +901,33 @@ class DTRawCommunicationGroup(object):
         return msg
 
     @staticmethod
-    def decode(data: bytes, _: dict) -> bytes:
+    def describe(_: Any) -> Optional[dict]:
+        """
+        Returns the fields added to the metadata of a message, e.g., the layout of an array.
+        The same (constant) object must be returned for messages that share the same fields,
+        see :py:meth:`encode_metadata`.
+
+        :param _:       (:obj:`Any`):   Message to describe.
+        :return:        Fields added to the metadata, `None` if no fields are added.
+        :rtype:         Optional[dict]
+
+        :meta private:
+        """
+        return None
+
+    @staticmethod
+    def decode(data: codec.BytesLike, _: dict) -> bytes:
         """
         Decodes a payload right after it comes out of the LCM message.
 
-        :param data:    (:obj:`bytes`):  Message to payload.
+        :param data:    (:obj:`BytesLike`):  Message to payload.
         :param _:       (:obj:`dict`):  Message metadata.
         :return:        Decoded message.
         :rtype:         :obj:`bytes`
 
         :meta private:
         """
-        return data
+        return bytes(data)
 
     def shutdown(self):
         """
@@ -352,35 +935,136 @@ class DTRawCommunicationGroup(object):
         """
         # mark it as shutdown
         self._is_shutdown = True
-        # wait for the mailman to return
-        self._mailman.join()
+        # stop receiving messages
+        self._detach()
+        self._dispatcher.close()
+        self._negotiator.close()
+        if self._transport is not None:
+            self._transport.close()
         # shutdown all publishers
         for pub in copy.copy(self._publishers):
             pub.shutdown()
         # shutdown all subscribers
         for sub in copy.copy(self._subscribers):
             sub.shutdown()
+        # the native backend owns its sockets
+        if isinstance(self._lcm, DTUDPMulticastHandler):
+            self._lcm.close()
+
+    def _delivery_lock(self) -> threading.RLock:
+        """
+        Returns the lock held while messages received by this group are being delivered.
+
+        :return:        Delivery lock.
+        :rtype:         threading.RLock
+        """
+        return DTCommunicationMailman.get_instance().lock
+
+    def _timer_scheduler(self) -> DTCommunicationMailman:
+        """
+        Returns the object running the periodic tasks of this group, it exposes the
+        methods `every()` and `cancel()` of :py:class:`DTCommunicationMailman`.
+
+        :return:        Timer scheduler.
+        :rtype:         DTCommunicationMailman
+        """
+        return DTCommunicationMailman.get_instance()
+
+    def _delivery_scheduler(self) -> Optional[Callable[[Callable[[], None]], None]]:
+        """
+        Returns the function running the deliveries of the messages published in this
+        process, `None` if they run on the publishing thread.
+
+        :return:        Scheduler.
+        :rtype:         Optional[Callable]
+        """
+        return None
 
-    def _get_url(self, port: int) -> str:
+    def _handlers(self) -> tuple:
+        """
+        Returns the objects messages are received from (LCM handler and transports).
+
+        :return:        Handlers.
+        :rtype:         tuple
+        """
+        if self._transport is None:
+            return self._lcm,
+        return self._lcm, self._transport
+
+    def _attach(self):
+        """
+        Starts receiving messages, the process-wide mailman delivers them.
+        """
+        for handler in self._handlers():
+            DTCommunicationMailman.get_instance().attach(handler)
+
+    def _detach(self):
+        """
+        Stops receiving messages, returns as soon as the mailman is done with us.
+        """
+        for handler in self._handlers():
+            DTCommunicationMailman.get_instance().detach(handler)
+
+    def _get_url(self, port: int, ip: IPv4Address = None) -> str:
         """
         Returns the UDPm URL for this group.
 
         :param port:    (:obj:`int`)    Port number.
+        :param ip:      (:obj:`IPv4Address`)    IP address, defaults to the group's address.
         :return:        UDPm URL.
         :rtype:         str
         """
-        return f"udpm://{self._get_group_ip()}:{port}?ttl={self.ttl}"
+        return f"udpm://{ip or self._get_group_ip()}:{port}?ttl={self.ttl}"
+
+    def _create_handler(self, url: str):
+        """
+        Creates a handler (LCM or native backend) sending and receiving on the given URL.
+
+        :param url:     (:obj:`str`)    UDPm URL.
+        :return:        Handler.
+        :rtype:         Union[lcm.LCM, DTUDPMulticastHandler]
+        """
+        if self._batched_io:
+            return DTUDPMulticastHandler(url, self._socket_buffer_size)
+        return lcm.LCM(url)
+
+    def _get_group_address(self) -> Tuple[IPv4Address, int]:
+        """
+        Returns the group's IP address and port, computed from the group's name (and
+        remapped away from the other groups if probing is enabled).
+
+        :return:        Group's IP address and port.
+        :rtype:         Tuple[IPv4Address, int]
+        """
+        if not self._addressing.probe:
+            return group_address(self.name, self._addressing)
+        return remap(self.name, self._addressing, self._probe)
+
+    def _probe(self, addresses: List[Tuple[IPv4Address, int]]) -> List[Set[str]]:
+        """
+        Returns the names of the groups announced at each of the given addresses.
+        """
+        handlers = {}
+        try:
+            for ip, port in addresses:
+                if f"{ip}:{port}" not in handlers:
+                    handlers[f"{ip}:{port}"] = self._create_handler(self._get_url(port, ip))
+            groups = compact.probe(handlers, self.name, self._addressing.probe)
+            return [groups[f"{ip}:{port}"] for ip, port in addresses]
+        finally:
+            for handler in handlers.values():
+                if isinstance(handler, DTUDPMulticastHandler):
+                    handler.close()
 
     def _get_group_id(self) -> int:
         """
-        Returns the group's ID computed from the group's name.
+        Returns the group's ID, i.e., the index of the group's IP address within the pool.
 
         :return:        Group's ID.
         :rtype:         int
         """
-        _, masklen = self.IP_NETWORK.split('/')
-        range_len = 2 ** (32 - int(masklen))
-        return int(sha256(self.name.encode('utf-8')).hexdigest(), 16) % range_len
+        base_ip = IPv4Network(self._addressing.network).network_address
+        return int(self._ip) - int(base_ip)
 
     def _get_group_ip(self) -> IPv4Address:
         """
@@ -389,22 +1073,19 @@ class DTRawCommunicationGroup(object):
         :return:    Group's address.
         :rtype:     IPv4Address
         """
-        base_ip, _ = self.IP_NETWORK.split('/')
-        base_ip = IPv4Address(base_ip)
-        ip_id = self._get_group_id()
-        group_ip = base_ip + ip_id
-        return group_ip
+        return self._ip
 
-    def _spin(self):
+    def _on_collision(self, group: str):
         """
-        Keeps the LCM handler spinning.
+        Called when another group announces itself on our address, whatever the channels
+        (i.e., subgroups) either group uses.
         """
-        period = (1.0 / self.LCM_HEARTBEAT_HZ) * 1000
-        try:
-            while not self.is_shutdown:
-                self._lcm.handle_timeout(period)
-        except KeyboardInterrupt:
-            pass
+        if group in self._collisions:
+            return
+        self._collisions.add(group)
+        self._logger.warning(f"The group `{group}` shares the address of this group. Groups "
+                             f"created with `DTAddressingOptions(probe=...)` move away from "
+                             f"it, their peers already running keep the address.")
 
 
 class DTCommunicationGroup(_TypedCommunicationGroup, DTRawCommunicationGroup):
@@ -418,14 +1099,22 @@ class DTCommunicationGroup(_TypedCommunicationGroup, DTRawCommunicationGroup):
                     the network before it is discarded.
                     See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
         loglevel    (:obj:`int`): Logger's level of verbosity
+        lazy        (:obj:`bool`): deliver proxies that deserialize the messages only when
+                    their fields are accessed, see :py:mod:`dt_communication_utils.lazy`
+        numpy       (:obj:`bool`): deserialize arrays of numbers into numpy arrays
+                    (i.e., `deserialize_numpy`), for the types that have them
+        serialized  (:obj:`bool`): deliver the serialized messages (:obj:`bytes`) instead of
+                    ROS messages, e.g., to republish them on ROS as they are
+        kwargs      (:obj:`dict`): other options, see :py:class:`DTRawCommunicationGroup`
 
     """
 
     def __init__(self, name: str, msg_type: GenericROSMessage, ttl: int = 1,
-                 loglevel: int = logging.WARNING):
+                 loglevel: int = logging.WARNING, lazy: bool = False, numpy: bool = False,
+                 serialized: bool = False, **kwargs):
         # call super constructors
-        _TypedCommunicationGroup.__init__(self, msg_type)
-        DTRawCommunicationGroup.__init__(self, name, ttl, loglevel)
+        _TypedCommunicationGroup.__init__(self, msg_type, lazy, numpy, serialized)
+        DTRawCommunicationGroup.__init__(self, name, ttl, loglevel, **kwargs)
         self._metadata = {
             "msg_type": msg_type.__name__
         }
@@ -448,7 +1137,8 @@ class DTCommunicationGroup(_TypedCommunicationGroup, DTRawCommunicationGroup):
             loglevel = self._logger.level
         return _DTCommunicationSubGroup(self, name, msg_type, loglevel)
 
-    def Subscriber(self, callback: Callable) -> 'DTCommunicationSubscriber':
+    def Subscriber(self, callback: Callable, filters: Iterable[Callable] = None,
+                   delivery: DTDeliveryOptions = None) -> 'DTCommunicationSubscriber':
         """
         Creates a Subscriber object on this group.
 
@@ -457,10 +1147,18 @@ class DTCommunicationGroup(_TypedCommunicationGroup, DTRawCommunicationGroup):
                                                 arguments, `message` (:obj:`GenericROSMessage`) and
                                                 `header` (:obj:`DTCommunicationMessageHeader`),
                                                 in this order.
+        :param filters:     (:obj:`Iterable[Callable]`):    (Optional) Predicates on the header
+                                                (:obj:`DTCommunicationMessageHeader`) of the
+                                                incoming messages. Messages are decoded and
+                                                delivered only if all predicates return `True`.
+                                                See :py:mod:`dt_communication_utils.filters`.
+        :param delivery:    (:obj:`DTDeliveryOptions`): (Optional) How messages are delivered
+                                                to the callback (e.g., through a bounded
+                                                queue and worker threads).
         :return: A new Subscriber.
         :rtype:  :obj:`DTCommunicationPublisher`
         """
-        return super(DTCommunicationGroup, self).Subscriber(callback)
+        return super(DTCommunicationGroup, self).Subscriber(callback, filters, delivery)
 
 
 class _DTRawCommunicationSubGroup(object):
@@ -484,6 +1182,10 @@ class _DTRawCommunicationSubGroup(object):
         self._logger.setLevel(loglevel)
         self._publishers = set()
         self._subscribers = set()
+        self._metadata_cache = _MetadataCache(group._metadata_extra)
+        self._encoded_header = codec.encode_string(self._name) + codec.encode_string(HOSTNAME)
+        self._compact_header = compact.encode_header(
+            self._name, HOSTNAME, getattr(getattr(self, 'MsgClass', None), '_md5sum', None))
 
     @property
     def name(self) -> str:
@@ -507,6 +1209,220 @@ class _DTRawCommunicationSubGroup(object):
         """
         return self._group.handler
 
+    @property
+    def local_delivery(self) -> bool:
+        """
+        Whether messages published by this subgroup are delivered in-process to local
+        subscribers (inherited from the group).
+
+        :return: Whether local delivery is enabled.
+        :rtype:  bool
+        """
+        return self._group.local_delivery
+
+    @property
+    def local_copy(self) -> bool:
+        """
+        Whether local subscribers receive a copy of the published messages.
+
+        :return: Whether local subscribers receive a copy.
+        :rtype:  bool
+
+        :meta private:
+        """
+        return self._group.local_copy
+
+    @property
+    def root(self) -> DTRawCommunicationGroup:
+        """
+        The group this subgroup belongs to.
+
+        :return: The group.
+        :rtype:  DTRawCommunicationGroup
+
+        :meta private:
+        """
+        return self._group
+
+    @property
+    def transport(self) -> Optional[DTSharedMemoryTransport]:
+        """
+        Shared memory transport used to reach the peers on the same host (if enabled).
+
+        :return: Shared memory transport.
+        :rtype:  DTSharedMemoryTransport
+
+        :meta private:
+        """
+        return self._group.transport
+
+    @property
+    def fragmentation(self) -> DTFragmentation:
+        """
+        Splits outgoing payloads and reassembles incoming ones (shared with the group).
+
+        :return: Fragmentation handler.
+        :rtype:  DTFragmentation
+
+        :meta private:
+        """
+        return self._group.fragmentation
+
+    @property
+    def fragmentation_stats(self) -> DTFragmentationStats:
+        """
+        Fragmentation statistics of the group this subgroup belongs to.
+
+        :return: A snapshot of the fragmentation statistics.
+        :rtype:  DTFragmentationStats
+        """
+        return self._group.fragmentation_stats
+
+    @property
+    def fec(self) -> DTFec:
+        """
+        Forward error correction of the messages of this subgroup (shared with the group).
+
+        :return: FEC handler.
+        :rtype:  DTFec
+
+        :meta private:
+        """
+        return self._group.fec
+
+    @property
+    def fec_stats(self) -> DTFecStats:
+        """
+        Forward error correction statistics of the group this subgroup belongs to.
+
+        :return: A snapshot of the FEC statistics.
+        :rtype:  DTFecStats
+        """
+        return self._group.fec_stats
+
+    @property
+    def compression(self) -> DTCompression:
+        """
+        Compression of the payloads of this subgroup (shared with the group).
+
+        :return: Compression handler.
+        :rtype:  DTCompression
+
+        :meta private:
+        """
+        return self._group.compression
+
+    @property
+    def compression_stats(self) -> DTCompressionStats:
+        """
+        Compression statistics of the group this subgroup belongs to.
+
+        :return: A snapshot of the compression statistics.
+        :rtype:  DTCompressionStats
+        """
+        return self._group.compression_stats
+
+    @property
+    def delta(self) -> DTDelta:
+        """
+        Delta encoding of the payloads of this subgroup (shared with the group).
+
+        :return: Delta encoding handler.
+        :rtype:  DTDelta
+
+        :meta private:
+        """
+        return self._group.delta
+
+    @property
+    def delta_stats(self) -> DTDeltaStats:
+        """
+        Delta encoding statistics of the group this subgroup belongs to.
+
+        :return: A snapshot of the delta encoding statistics.
+        :rtype:  DTDeltaStats
+        """
+        return self._group.delta_stats
+
+    @property
+    def rate_limit(self) -> DTRateLimit:
+        """
+        Rate limiting of the publishers of this subgroup (shared with the group).
+
+        :return: Rate limiting handler.
+        :rtype:  DTRateLimit
+
+        :meta private:
+        """
+        return self._group.rate_limit
+
+    @property
+    def timers(self) -> DTCommunicationMailman:
+        """
+        Runs the periodic tasks of the group this subgroup belongs to.
+
+        :return: Timer scheduler (see :py:meth:`DTCommunicationMailman.every`).
+        :rtype:  DTCommunicationMailman
+
+        :meta private:
+        """
+        return self._group.timers
+
+    @property
+    def rate_limit_stats(self) -> DTRateLimitStats:
+        """
+        Rate limiting statistics of the group this subgroup belongs to.
+
+        :return: A snapshot of the rate limiting statistics.
+        :rtype:  DTRateLimitStats
+        """
+        return self._group.rate_limit_stats
+
+    @property
+    def foreign_traffic(self) -> DTForeignTrafficStats:
+        """
+        Traffic received from other groups sharing the address of the group this subgroup
+        belongs to, and dropped.
+
+        :return: A snapshot of the foreign traffic statistics.
+        :rtype:  DTForeignTrafficStats
+        """
+        return self._group.foreign_traffic
+
+    @property
+    def envelope(self) -> DTEnvelopeNegotiator:
+        """
+        Negotiates the envelope of the messages sent by the group this subgroup belongs to.
+
+        :return: The envelope negotiator.
+        :rtype:  DTEnvelopeNegotiator
+
+        :meta private:
+        """
+        return self._group.envelope
+
+    @property
+    def envelope_version(self) -> int:
+        """
+        Version of the envelope the publishers of this subgroup currently use.
+
+        :return: Envelope version.
+        :rtype:  int
+        """
+        return self._group.envelope_version
+
+    @property
+    def dispatcher(self) -> DTCommunicationDispatcher:
+        """
+        Dispatcher routing the incoming messages to the subscribers of this subgroup.
+
+        :return: Dispatcher.
+        :rtype:  DTCommunicationDispatcher
+
+        :meta private:
+        """
+        return self._group.dispatcher
+
     @property
     def is_shutdown(self) -> bool:
         """
@@ -529,6 +1445,19 @@ class _DTRawCommunicationSubGroup(object):
         """
         return self._logger
 
+    @property
+    def decoder(self) -> Callable[[codec.BytesLike, dict], Any]:
+        """
+        A picklable function decoding the payloads of this subgroup (e.g., in worker
+        processes).
+
+        :return: Decoder.
+        :rtype:  Callable[[BytesLike, dict], Any]
+
+        :meta private:
+        """
+        return self._group.decoder
+
     @property
     def metadata(self) -> dict:
         """
@@ -541,18 +1470,84 @@ class _DTRawCommunicationSubGroup(object):
         """
         return self._group.metadata
 
-    def Publisher(self) -> 'DTCommunicationPublisher':
+    @property
+    def encoded_metadata(self) -> bytes:
+        """
+        Metadata to append to each message leaving this subgroup, LCM-encoded.
+        The encoded value is cached and rebuilt only when the metadata changes.
+
+        :return: Encoded metadata.
+        :rtype:  bytes
+
+        :meta private:
+        """
+        return self._metadata_cache.get(self.metadata)
+
+    def encode_metadata(self, *extras: Optional[dict]) -> bytes:
+        """
+        LCM-encodes the metadata of this subgroup together with per-message fields.
+
+        :param extras:  (:obj:`dict`):  Additional fields (never modified once given).
+        :return:        Encoded metadata.
+        :rtype:         bytes
+
+        :meta private:
+        """
+        return self._metadata_cache.get(self.metadata, *extras)
+
+    @property
+    def encoded_header(self) -> bytes:
+        """
+        Pre-encoded `group` and `origin` fields of the messages leaving this subgroup.
+
+        :return: Encoded header fields.
+        :rtype:  bytes
+
+        :meta private:
+        """
+        return self._encoded_header
+
+    @property
+    def compact_header(self) -> bytes:
+        """
+        Pre-encoded `group`, `origin` and `flags` fields of the compact envelope of the
+        messages leaving this subgroup.
+
+        :return: Encoded header fields.
+        :rtype:  bytes
+
+        :meta private:
+        """
+        return self._compact_header
+
+    def Publisher(self, compression: DTCompressionOptions = None,
+                  batching: DTBatchingOptions = None,
+                  delta: DTDeltaOptions = None,
+                  rate_limit: DTRateLimitOptions = None) -> 'DTCommunicationPublisher':
         """
         Creates a Publisher object on this subgroup.
 
+        :param compression: (:obj:`DTCompressionOptions`): (Optional) Compression of the
+                                                payloads sent by this publisher, defaults to
+                                                the compression of the group.
+        :param batching:    (:obj:`DTBatchingOptions`): (Optional) Send small messages in
+                                                batches rather than one at a time.
+        :param delta:       (:obj:`DTDeltaOptions`): (Optional) Send only what changed since
+                                                the last keyframe, see
+                                                :py:mod:`dt_communication_utils.delta`.
+        :param rate_limit:  (:obj:`DTRateLimitOptions`): (Optional) Conflate the messages
+                                                published faster than a maximum rate and/or
+                                                pace the bytes sent over the network.
         :return: A new Publisher.
         :rtype:  :obj:`DTCommunicationPublisher`
         """
-        pub = DTCommunicationPublisher(self, self._topic)
+        pub = DTCommunicationPublisher(self, self._topic, compression, batching, delta,
+                                       rate_limit)
         self.add_publisher(pub)
         return pub
 
-    def Subscriber(self, callback: Callable) -> 'DTCommunicationSubscriber':
+    def Subscriber(self, callback: Callable, filters: Iterable[Callable] = None,
+                   delivery: DTDeliveryOptions = None) -> 'DTCommunicationSubscriber':
         """
         Creates a Subscriber object on this group.
 
@@ -561,10 +1556,18 @@ class _DTRawCommunicationSubGroup(object):
                                                 arguments `payload` (:obj:`bytes`) and
                                                 `header` (:obj:`DTCommunicationMessageHeader`),
                                                 in this order.
+        :param filters:     (:obj:`Iterable[Callable]`):    (Optional) Predicates on the header
+                                                (:obj:`DTCommunicationMessageHeader`) of the
+                                                incoming messages. Messages are decoded and
+                                                delivered only if all predicates return `True`.
+                                                See :py:mod:`dt_communication_utils.filters`.
+        :param delivery:    (:obj:`DTDeliveryOptions`): (Optional) How messages are delivered
+                                                to the callback (e.g., through a bounded
+                                                queue and worker threads).
         :return: A new Subscriber.
         :rtype:  :obj:`DTCommunicationPublisher`
         """
-        sub = DTCommunicationSubscriber(self, self._topic, callback)
+        sub = DTCommunicationSubscriber(self, self._topic, callback, filters, delivery)
         self.add_subscriber(sub)
         return sub
 
@@ -612,17 +1615,31 @@ class _DTRawCommunicationSubGroup(object):
         self._subscribers.remove(subscriber)
         self._group.remove_subscriber(subscriber)
 
-    def encode(self, msg: bytes) -> bytes:
+    def encode(self, msg: bytes, buffer: codec.DTEncodingBuffer = None) -> bytes:
         """
         Encodes a message before it is encapsulated into the LCM message.
 
         :param msg:    (:obj:`bytes`):  Message to encode.
+        :param buffer: (:obj:`DTEncodingBuffer`):  (Optional) Reusable buffer.
         :return:    Encoded message.
         :rtype:     :obj:`bytes`
 
         :meta private:
         """
-        return self._group.encode(msg)
+        return self._group.encode(msg, buffer)
+
+    def describe(self, msg: Any) -> Optional[dict]:
+        """
+        Returns the fields added to the metadata of a message, see
+        :py:meth:`DTRawCommunicationGroup.describe`.
+
+        :param msg:     (:obj:`Any`):   Message to describe.
+        :return:        Fields added to the metadata, `None` if no fields are added.
+        :rtype:         Optional[dict]
+
+        :meta private:
+        """
+        return self._group.describe(msg)
 
     def decode(self, data: bytes, metadata: dict) -> bytes:
         """
@@ -643,25 +1660,9 @@ class _DTRawCommunicationSubGroup(object):
         """
         # mark it as shutdown
         self._is_shutdown = True
-        # TODO: this has the potential of SegFault-ing the process. It goes like this:
-        #       .
-        #       There is an LCM handler that is used by two threads in Python.
-        #       One is called the "mailman", which is basically taking care of processing the
-        #       messages coming in and then the main application thread, which consumes messages
-        #       that the mailman puts in a queue.
-        #       .
-        #       The app thread is the one deciding when the whole process should terminate.
-        #       So, the app thread initializes a `shutdown()` sequence and starts detaching
-        #       publishers/subscribers from the handler, with the idea being that once the
-        #       mailman returns, it never goes out again to deliver messages.
-        #       .
-        #       On the C side of the handler, though, when the mailman returns with a message,
-        #       it tries to look up the corresponding subscriber and its callbacks,
-        #       but those were already destroyed by the app thread, hence the SegFault.
-        #       .
-        #       While this can be solved in a `CommunicationGroup` by waiting for the mailman to
-        #       return, it is not as easy in a `SubGroup`, where the mailman is shared across
-        #       subgroups.
+        # NOTE: the mailman is shared across subgroups, so we cannot wait for it to return.
+        #       Subscriptions are only removed while holding the mailman's lock, so they
+        #       are never destroyed while the mailman is delivering a message to them.
         #
         # shutdown all publishers
         for pub in copy.copy(self._publishers):
@@ -674,7 +1675,9 @@ class _DTRawCommunicationSubGroup(object):
 class DTCommunicationPublisher(object):
 
     def __init__(self, group: Union[DTRawCommunicationGroup, _DTRawCommunicationSubGroup],
-                 topic: str):
+                 topic: str, compression: DTCompressionOptions = None,
+                 batching: DTBatchingOptions = None, delta: DTDeltaOptions = None,
+                 rate_limit: DTRateLimitOptions = None):
         """
         (For internal use only)
         Creates a new Publisher for a Group or Subgroup.
@@ -683,11 +1686,33 @@ class DTCommunicationPublisher(object):
             group:  (:obj:`Union[DTRawCommunicationGroup, _DTRawCommunicationSubGroup]`):
                     Underlying group/subgroup.
             topic:  (:obj:`str`):   Topic name.
+            compression:  (:obj:`DTCompressionOptions`):   Compression options.
+            batching:  (:obj:`DTBatchingOptions`):   Batching options.
+            delta:  (:obj:`DTDeltaOptions`):   Delta encoding options.
+            rate_limit:  (:obj:`DTRateLimitOptions`):   Rate limiting options.
 
         :meta private:
         """
+        # batches only carry the metadata of the group
+        if batching is not None and delta is not None:
+            raise ValueError("Fields `batching` and `delta` cannot be both enabled.")
         self._group = group
         self._topic = topic
+        self._fec = group.fec.encoder()
+        self._compressor = group.compression.compressor(compression)
+        self._delta = group.delta.encoder(delta)
+        self._limiter = group.rate_limit.limiter(rate_limit, self._publish_now)
+        self._batcher = None
+        if batching is not None:
+            self._batcher = DTBatcher(batching, self._send_batch, group.timers)
+        # ROS messages are serialized into a reusable buffer, one thread at a time
+        self._buffer = None
+        self._buffer_lock = threading.Lock()
+        if isinstance(group, _TypedCommunicationGroup):
+            self._buffer = codec.DTEncodingBuffer()
+        self._negotiator = group.envelope
+        self._negotiator.watch(topic, group.name, self._compressor is not None)
+        self._typed = compact.is_typed(group.compact_header)
 
     def publish(self, data: Any, destination: str = ANYBODY, txt: str = None):
         """
@@ -700,12 +1725,31 @@ class DTCommunicationPublisher(object):
 
         :raises ValueError:     A given argument is of the wrong type.
         """
+        # messages published faster than the maximum rate are conflated (if enabled)
+        if self._limiter is not None and not self._limiter.admit(data, destination, txt):
+            return
+        self._publish_now(data, destination, txt)
+
+    def _publish_now(self, data: Any, destination: str, txt: Optional[str]):
+        # the buffer might be in use by another thread, allocate a new one then
+        if self._buffer is None or not self._buffer_lock.acquire(blocking=False):
+            self._publish(data, destination, txt, None)
+            return
+        try:
+            self._publish(data, destination, txt, self._buffer)
+        finally:
+            self._buffer_lock.release()
+
+    def _publish(self, data: Any, destination: str, txt: Optional[str],
+                 buffer: Optional[codec.DTEncodingBuffer]):
+        message = data
         # let the group encode the data first
-        data = self._group.encode(data)
+        data = self._group.encode(data, buffer)
         if data is None:
             return
         # check input (data)
-        if not isinstance(data, bytes):
+        if data is not buffer and not isinstance(data, bytes) and \
+                not (isinstance(data, memoryview) and data.format == "B"):
             raise ValueError(f'Field `data` must be of type `bytes`, '
                              f'given `{str(type(data))}` instead.')
         # check input (destination)
@@ -716,32 +1760,260 @@ class DTCommunicationPublisher(object):
         if txt is not None and not isinstance(txt, str):
             raise ValueError(f'Field `txt` must be of type `str`, '
                              f'given `{str(type(txt))}` instead.')
-        # create empty message
-        msg = dt_communication_msg_t()
-        # populate message
-        msg.timestamp = time.time_ns() // 1000
-        msg.group = self._group.name
-        msg.origin = HOSTNAME
-        msg.destination = (destination or ANYBODY).strip()
-        msg.metadata = json.dumps(self._group.metadata)
-        msg.txt = txt or ""
-        msg.length = len(data)
-        msg.payload = data
-        # publish message
-        msg = msg.encode()
-        self._group.handler.publish(self._topic, msg)
+        timestamp = time.time_ns() // 1000
+        destination = (destination or ANYBODY).strip()
+        if data is buffer:
+            # the rest of the message is written around the payload, when nothing else needs it
+            if self._in_place(buffer.payload_size):
+                self._send_in_place(timestamp, destination, txt, buffer)
+                return
+            data = buffer.payload()
+        # per-message metadata (e.g., the layout of an array)
+        extra = self._group.describe(message)
+        # deliver the message to the subscribers living in this process
+        if self._group.local_delivery:
+            self._deliver_local(message, data, timestamp, destination, txt, extra)
+        # only what changed since the last keyframe is sent (if enabled), to everybody
+        delta = None
+        if self._delta is not None and destination == ANYBODY:
+            data, delta = self._delta.encode(data), DELTA
+        # peers on the same host might read the message from shared memory
+        transport = self._group.transport
+        shm, network = None, True
+        if transport is not None:
+            shm, network = transport.route(self._topic)
+        msg = None
+        if shm is not None:
+            msg = self._encode(timestamp, destination,
+                               self._group.encode_metadata(shm, extra, delta), txt, data)
+            if not transport.write(self._topic, msg):
+                # too big for shared memory, everybody gets it from the network
+                shm, msg, network = None, None, True
+        if not network:
+            return
+        # small messages wait to be sent together (if enabled), batches only carry the
+        # metadata of the group
+        if self._batcher is not None and extra is None and \
+                self._batcher.add(shm, timestamp, destination, txt, data):
+            return
+        self._send(timestamp, destination, txt, data, shm, msg, extra=extra, delta=delta)
+
+    def publish_serialized(self, data: bytes, msg_type: str, md5sum: str,
+                           destination: str = ANYBODY, txt: str = None):
+        """
+        Publishes a message that is already serialized (e.g., the buffer of a
+        :obj:`rospy.AnyMsg`) as is. Only available on groups exchanging ROS messages.
+
+        :param data:            (:obj:`bytes`): Serialized message.
+        :param msg_type:        (:obj:`str`):   Type of the message (e.g., `std_msgs/String`),
+                                                must match the type of the group.
+        :param md5sum:          (:obj:`str`):   MD5 sum of the message definition, must match
+                                                the one of the type of the group.
+        :param destination:     (:obj:`str`):   (Optional) Destination of this message. Used
+                                                to send private messages within a group.
+        :param txt:             (:obj:`str`)    (Optional) JSON-encoded string of user metadata.
+
+        :raises ValueError:     A given argument is of the wrong type, or the type of the
+                                message does not match the type of the group.
+        """
+        if not isinstance(self._group, _TypedCommunicationGroup):
+            raise ValueError("Serialized messages can only be published on groups "
+                             "exchanging ROS messages, use publish() instead.")
+        message = self._group.wrap_serialized(data, msg_type, md5sum)
+        DTCommunicationPublisher.publish(self, message, destination, txt)
+
+    def flush(self):
+        """
+        Sends the messages waiting to be batched right away (if batching is enabled).
+        """
+        if self._batcher is not None:
+            self._batcher.flush()
+
+    def _in_place(self, size: int) -> bool:
+        """
+        Whether a payload of the given size can be sent straight from the reusable buffer.
+        """
+        group = self._group
+        return not group.local_delivery and group.transport is None and \
+            self._batcher is None and self._compressor is None and self._fec is None and \
+            self._delta is None and (self._limiter is None or not self._limiter.paced) and \
+            not group.fragmentation.needs_splitting(size)
+
+    def _send_in_place(self, timestamp: int, destination: str, txt: Optional[str],
+                       buffer: codec.DTEncodingBuffer):
+        """
+        Sends a payload serialized into the reusable buffer, without copying it.
+        """
+        fingerprint, strings = compact.FINGERPRINT, None
+        if self._negotiator.compact:
+            strings = self._compact_strings(destination, self._group.encoded_metadata, txt)
+        if strings is None:
+            fingerprint = codec.FINGERPRINT
+            strings = (
+                self._group.encoded_header,
+                codec.encode_string(destination),
+                self._group.encoded_metadata,
+                codec.encode_string(txt or ""),
+            )
+        handler = self._group.handler
+        with buffer.envelope(timestamp, strings, fingerprint) as msg:
+            if isinstance(handler, DTUDPMulticastHandler):
+                handler.publish(self._topic, msg)
+            else:
+                # LCM only accepts read-only buffers
+                handler.publish(self._topic, bytes(msg))
+
+    def _send_batch(self, data: bytes, shm: Optional[dict]):
+        """
+        Sends a batch of messages over the network.
+        """
+        self._send(time.time_ns() // 1000, ANYBODY, None, data, shm, None, BATCH)
+
+    def _send(self, timestamp: int, destination: str, txt: Optional[str], data: bytes,
+              shm: Optional[dict], msg: Optional[bytes], batch: Optional[dict] = None,
+              extra: Optional[dict] = None, delta: Optional[dict] = None):
+        """
+        Sends a payload over the network, `msg` is the message already encoded for shared
+        memory (if any) and is reused when nothing else needs to be added. `extra` are the
+        per-message metadata fields (see :py:meth:`DTRawCommunicationGroup.describe`),
+        `delta` marks delta-encoded payloads.
+        """
+        # payloads sent over the network are compressed (if enabled) with a codec every peer
+        # can decode
+        compressed_with = None
+        if self._compressor is not None:
+            data, compressed_with = self._compressor.compress(data, self._negotiator.codecs)
+        # large payloads are sent in fragments (if enabled)
+        fragments = self._group.fragmentation.split(data)
+        if fragments is None and self._fec is None and compressed_with is None and \
+                batch is None:
+            if msg is None:
+                metadata = self._group.encoded_metadata if extra is None and delta is None \
+                    else self._group.encode_metadata(extra, delta)
+                msg = self._encode(timestamp, destination, metadata, txt, data)
+            if self._limiter is not None and self._limiter.paced:
+                self._limiter.transmit([msg], functools.partial(self._group.handler.publish,
+                                                                self._topic))
+                return
+            self._group.handler.publish(self._topic, msg)
+            return
+        metadata = self._group.encode_metadata(
+            shm,
+            None if fragments is None else FRAGMENT,
+            None if self._fec is None else FEC_DATA,
+            compressed_with,
+            batch,
+            extra,
+            delta
+        )
+        messages = []
+        for header, chunk in (fragments or [(b"", data)]):
+            messages.extend(self._protect(timestamp, destination, metadata, txt, chunk, header))
+        handler = self._group.handler
+        # paced datagrams are sent one at a time, by the sender thread
+        if self._limiter is not None and self._limiter.paced:
+            self._limiter.transmit(messages, functools.partial(handler.publish, self._topic))
+            return
+        # handlers that can send many datagrams at once get them all together
+        if len(messages) > 1 and isinstance(handler, DTUDPMulticastHandler):
+            handler.publish_many(self._topic, messages)
+            return
+        for msg in messages:
+            handler.publish(self._topic, msg)
+
+    def _protect(self, timestamp: int, destination: str, metadata: bytes, txt: Optional[str],
+                 data: codec.BytesLike, prefix: bytes) -> List[bytes]:
+        """
+        Encodes a message to send over the network, followed by a parity message when FEC
+        is enabled and the message completes a block.
+        """
+        if self._fec is None:
+            return [self._encode(timestamp, destination, metadata, txt, data, prefix)]
+        seq, header = self._fec.header()
+        msg = self._encode(timestamp, destination, metadata, txt, data, header + prefix)
+        parity = self._fec.add(seq, msg)
+        if parity is None:
+            return [msg]
+        metadata = self._group.encode_metadata(FEC_PARITY)
+        return [msg, self._encode(timestamp, ANYBODY, metadata, None, parity)]
+
+    def _encode(self, timestamp: int, destination: str, metadata: bytes, txt: Optional[str],
+                data: codec.BytesLike, prefix: bytes = b"") -> bytes:
+        if self._negotiator.compact:
+            strings = self._compact_strings(destination, metadata, txt)
+            if strings is not None:
+                return codec.encode_fields(timestamp, strings, data, prefix, compact.FINGERPRINT)
+        return codec.encode_fields(
+            timestamp,
+            (
+                self._group.encoded_header,
+                codec.encode_string(destination),
+                metadata,
+                codec.encode_string(txt or ""),
+            ),
+            data,
+            prefix
+        )
+
+    def _compact_strings(self, destination: str, metadata: bytes, txt: Optional[str]) \
+            -> Optional[tuple]:
+        """
+        Returns the string fields of a message in the compact envelope, `None` if they do not
+        fit in it (the message is then sent in the envelope of version 1).
+        """
+        try:
+            return (
+                self._group.compact_header,
+                compact.encode_string(destination),
+                compact.encode_metadata(metadata, self._typed),
+                compact.encode_string(txt or ""),
+            )
+        except ValueError:
+            return None
+
+    def _deliver_local(self, message: Any, data: bytes, timestamp: int, destination: str,
+                       txt: Optional[str], extra: Optional[dict] = None):
+        """
+        Delivers a message to the subscribers living in this process, skipping the network.
+        """
+        if not is_for_me(destination):
+            return
+        header = DTCommunicationMessageHeader(
+            timestamp=timestamp,
+            origin=HOSTNAME,
+            destination=destination,
+            txt=txt or None
+        )
+        if getattr(self._group, 'serialized', False):
+            # local subscribers expect the serialized message as well
+            message = data
+        elif self._group.local_copy:
+            message = copy.deepcopy(message)
+        decoded = {_decoding_key(self._group): message}
+        metadata = self._group.metadata
+        if extra is not None:
+            metadata = {**metadata, **extra}
+        for dispatcher in DTCommunicationDispatcher.local(self._group.root.name):
+            dispatcher.deliver_local(self._topic, self._group.name, header,
+                                     metadata, data, decoded)
 
     def shutdown(self):
         """
         Shuts down the publisher.
         """
+        # the latest conflated message might end up in the last batch
+        if self._limiter is not None:
+            self._limiter.close()
+        if self._batcher is not None:
+            self._batcher.close()
         self._group.remove_publisher(self)
 
 
 class DTCommunicationSubscriber(object):
 
     def __init__(self, group: Union[DTRawCommunicationGroup, _DTRawCommunicationSubGroup],
-                 topic: str, callback: Callable):
+                 topic: str, callback: Callable, filters: Iterable[Callable] = None,
+                 delivery: DTDeliveryOptions = None):
         """
         (For internal use only)
         Creates a new Subscriber for a Group or Subgroup.
@@ -751,74 +2023,143 @@ class DTCommunicationSubscriber(object):
                     Underlying group/subgroup.
             topic:  (:obj:`str`):   Topic name.
             callback:  (:obj:`Callable`):   Callback.
+            filters:  (:obj:`Iterable[Callable]`):   Predicates on the message header.
+            delivery:  (:obj:`DTDeliveryOptions`):   Delivery options.
 
         :meta private:
         """
         self._group = group
         self._topic = topic
         self._callback = callback
-        self._subscription_handler = \
-            self._group.handler.subscribe(self._topic, self.__inner_callback__)
-        self._collisions = set()
+        self._filters = tuple(filters or [])
+        self._delivery = DTDelivery.create(callback, delivery, group.logger, group.decoder)
+        self._group.dispatcher.add(self)
+
+    @property
+    def group(self) -> Union[DTRawCommunicationGroup, _DTRawCommunicationSubGroup]:
+        """
+        The group/subgroup this subscriber belongs to.
+
+        :return: Group/subgroup.
+        :rtype:  :obj:`Union[DTRawCommunicationGroup, _DTRawCommunicationSubGroup]`
+
+        :meta private:
+        """
+        return self._group
+
+    @property
+    def topic(self) -> str:
+        """
+        The topic this subscriber is listening to.
+
+        :return: Topic name.
+        :rtype:  str
+
+        :meta private:
+        """
+        return self._topic
+
+    @property
+    def stats(self) -> DTDeliveryStats:
+        """
+        Delivery statistics of this subscriber (e.g., how many messages were dropped).
+
+        :return: A snapshot of the delivery statistics.
+        :rtype:  :obj:`DTDeliveryStats`
+        """
+        return self._delivery.stats
+
+    @property
+    def decoding_key(self) -> Any:
+        """
+        Subscribers of the same topic with the same decoding key share the decoded payload.
+
+        :return: Decoding key.
+        :rtype:  Any
+
+        :meta private:
+        """
+        return _decoding_key(self._group)
+
+    @property
+    def encoded(self) -> bool:
+        """
+        Whether this subscriber receives encoded payloads, which are decoded elsewhere
+        (e.g., by worker processes).
+
+        :return: Whether this subscriber receives encoded payloads.
+        :rtype:  bool
+
+        :meta private:
+        """
+        return self._delivery.encoded
+
+    def accepts(self, header: DTCommunicationMessageHeader) -> bool:
+        """
+        Checks whether a message with the given header passes all the user filters.
+
+        :param header:  (:obj:`DTCommunicationMessageHeader`):  Message header.
+        :return:        Whether the message should be delivered.
+        :rtype:         bool
+
+        :meta private:
+        """
+        for accept in self._filters:
+            if not accept(header):
+                return False
+        return True
+
+    def deliver(self, payload: Any, header: DTCommunicationMessageHeader):
+        """
+        Delivers a decoded message to the user callback.
+
+        :param payload: (:obj:`Any`):                           Decoded payload.
+        :param header:  (:obj:`DTCommunicationMessageHeader`):  Message header.
+
+        :meta private:
+        """
+        self._delivery.deliver(payload, header)
+
+    def deliver_many(self, messages: List[Tuple[Any, DTCommunicationMessageHeader]]):
+        """
+        Delivers decoded messages received together to the user callback, in order.
+
+        :param messages:    (:obj:`List[Tuple[Any, DTCommunicationMessageHeader]]`):
+                            Decoded payloads and their headers.
+
+        :meta private:
+        """
+        self._delivery.deliver_many(messages)
+
+    def deliver_encoded(self, payload: codec.BytesLike, metadata: dict,
+                        header: DTCommunicationMessageHeader):
+        """
+        Delivers an encoded message, see :py:attr:`encoded`.
+
+        :param payload:     (:obj:`BytesLike`):                     Encoded payload.
+        :param metadata:    (:obj:`dict`):                          Message metadata.
+        :param header:      (:obj:`DTCommunicationMessageHeader`):  Message header.
+
+        :meta private:
+        """
+        self._delivery.deliver_encoded(payload, metadata, header)
 
     def shutdown(self):
         """
         Shuts down the subscriber.
         """
-        self._group.handler.unsubscribe(self._subscription_handler)
+        self._group.dispatcher.remove(self)
+        self._delivery.shutdown()
         self._group.remove_subscriber(self)
 
-    def __inner_callback__(self, _, data):
-        msg = None
-        try:
-            msg = dt_communication_msg_t.decode(data)
-        except ValueError:
-            pass
-        # check if the message was decoded successfully
-        if msg is None:
-            self._group.logger.warning("Received invalid message. Ignoring it.")
-            return
-        # make sure there is no group collision here
-        if msg.group != self._group.name:
-            if msg.group not in self._collisions:
-                self._group.logger.warning(
-                    f"Collision detected between the groups `{msg.group}` "
-                    f"and `{self._group.name}`. If you are the administrator, "
-                    f"we suggest you increase the IP address pool dedicate to "
-                    f"UDP Multicast.")
-                self._collisions.add(msg.group)
-            return
-        # make sure we are not supposed to receive this message
-        if msg.destination == ANYBODY_BUT_ME:
-            return
-        # make sure we are the intended destination of this message
-        if msg.destination != ANYBODY \
-                and not msg.destination.startswith('~') \
-                and msg.destination != HOSTNAME:
-            return
-        # parse metadata
-        metadata = json.loads(msg.metadata)
-        # expose message metadata as a DTCommunicationMessageHeader object
-        header = DTCommunicationMessageHeader(
-            timestamp=msg.timestamp,
-            origin=msg.origin,
-            destination=msg.destination,
-            txt=msg.txt or None
-        )
-        # let the group decode the data first
-        payload = self._group.decode(msg.payload, metadata)
-        if payload is None:
-            return
-        # call user callback
-        self._callback(payload, header)
-
 
 class _DTCommunicationSubGroup(_TypedCommunicationGroup, _DTRawCommunicationSubGroup):
 
     def __init__(self, group: DTCommunicationGroup, name: str, msg_type: GenericROSMessage,
                  loglevel: int = logging.WARNING):
         # call super constructors
-        _TypedCommunicationGroup.__init__(self, msg_type)
+        _TypedCommunicationGroup.__init__(self, msg_type, group.lazy, group.numpy,
+                                          group.serialized)
         _DTRawCommunicationSubGroup.__init__(self, group, name, loglevel)
         self._metadata = {
             "msg_type": msg_type.__name__
@@ -0,0 +1,302 @@
+"""
+Compression of the payloads sent over the network.
+
+Publishers with compression enabled compress the payloads larger than a threshold and
+record the codec in the message metadata (e.g., ``{"codec": "zlib"}``), payloads that
+do not shrink are sent as they are. Receivers decompress every payload carrying a codec
+they know, and pass all the others through unchanged, so peers that do not compress can
+still talk to peers that do.
+
+The codecs are negotiated: every group announces the codecs it can decode along with its
+envelope version (see :py:mod:`dt_communication_utils.envelope`). Publishers use their
+codec only once discovery has settled and while every peer announced it, they fall back
+to `zlib` when every peer knows it, and send the payloads uncompressed otherwise (e.g.,
+when a peer running an older version of this library is heard from). Decompressed
+payloads are bounded in size, like reassembled ones (see
+:py:class:`DTFragmentationOptions`), larger payloads are dropped.
+
+`zlib` is always available, `lz4` and `zstd` are used when the packages ``lz4`` and
+``zstandard`` are installed.
+"""
+
+import time
+import zlib
+import threading
+import dataclasses
+from dataclasses import dataclass
+from typing import Optional, Tuple, Dict, Callable, AbstractSet
+
+from .codec import BytesLike
+
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+
+# decompressed payloads larger than this are dropped, unless told otherwise
+MAX_DECOMPRESSED_SIZE = 32 * 1024 * 1024
+
+
+# decompress functions take the payload and the maximum size of the result
+
+def _zlib_decompress(data: BytesLike, max_size: int) -> bytes:
+    decompressor = zlib.decompressobj()
+    result = decompressor.decompress(data, max_size)
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise ValueError("the payload is too large or truncated")
+    return result
+
+
+def _zlib_codec(level: Optional[int]) -> Tuple[Callable, Callable]:
+    level = -1 if level is None else level
+    return (lambda data: zlib.compress(data, level)), _zlib_decompress
+
+
+def _lz4_decompress(data: BytesLike, max_size: int) -> bytes:
+    decompressor = _lz4.LZ4FrameDecompressor()
+    result = decompressor.decompress(data, max_length=max_size + 1)
+    if len(result) > max_size or not decompressor.eof:
+        raise ValueError("the payload is too large or truncated")
+    return result
+
+
+def _lz4_codec(level: Optional[int]) -> Tuple[Callable, Callable]:
+    level = 0 if level is None else level
+    return (lambda data: _lz4.compress(data, compression_level=level)), _lz4_decompress
+
+
+def _zstd_codec(level: Optional[int]) -> Tuple[Callable, Callable]:
+    compressor = _zstd.ZstdCompressor(level=3 if level is None else level)
+    decompressor = _zstd.ZstdDecompressor()
+    # (de)compressor objects are not thread-safe
+    lock = threading.Lock()
+
+    def compress(data):
+        with lock:
+            return compressor.compress(data)
+
+    def decompress(data, max_size):
+        # the size written in the frame header is not trusted, the output is read in chunks
+        with lock, decompressor.stream_reader(data) as reader:
+            result = reader.read(max_size + 1)
+        if len(result) > max_size:
+            raise ValueError("the payload is too large")
+        return result
+
+    return compress, decompress
+
+
+# codec name -> factory of (compress, decompress) functions, for the codecs installed
+CODECS: Dict[str, Callable[[Optional[int]], Tuple[Callable, Callable]]] = {
+    "zlib": _zlib_codec,
+    **({"lz4": _lz4_codec} if _lz4 is not None else {}),
+    **({"zstd": _zstd_codec} if _zstd is not None else {}),
+}
+
+# metadata of the compressed messages (one constant dictionary per codec)
+_METADATA = {name: {"codec": name} for name in ("zlib", "lz4", "zstd")}
+
+
+@dataclass
+class DTCompressionOptions(object):
+    """
+    Configures the compression of the payloads sent over the network.
+
+    Parameters
+
+    - codec:        (:obj:`str`): one of `zlib`, `lz4` and `zstd`. `lz4` and `zstd` require
+                    the packages ``lz4`` and ``zstandard`` respectively.
+    - level:        (:obj:`int`): compression level, `None` uses the default level of the codec
+    - threshold:    (:obj:`int`): payloads smaller than `threshold` bytes are not compressed
+    """
+    codec: str = "zlib"
+    level: Optional[int] = None
+    threshold: int = 256
+
+    def __post_init__(self):
+        if self.codec not in _METADATA:
+            raise ValueError(f"Field `codec` must be one of {list(_METADATA)}, "
+                             f"got `{self.codec}` instead.")
+        if self.codec not in CODECS:
+            raise ValueError(f"The codec `{self.codec}` is not available, install the "
+                             f"package `{'lz4' if self.codec == 'lz4' else 'zstandard'}` "
+                             f"to use it.")
+        if self.threshold < 0:
+            raise ValueError(f"Field `threshold` must be a non-negative integer, "
+                             f"got {self.threshold} instead.")
+
+
+@dataclass
+class DTCompressionStats(object):
+    """
+    Compression statistics of a group.
+
+    Parameters
+
+    - messages_compressed:      (:obj:`int`): payloads sent compressed
+    - messages_skipped:         (:obj:`int`): payloads sent uncompressed because too small
+                                or because they did not shrink
+    - bytes_in:                 (:obj:`int`): size of the payloads before compression
+    - bytes_out:                (:obj:`int`): size of the payloads after compression
+    - compress_time:            (:obj:`float`): seconds spent compressing
+    - messages_decompressed:    (:obj:`int`): payloads received compressed
+    - decompress_time:          (:obj:`float`): seconds spent decompressing
+    - errors:                   (:obj:`int`): payloads received that could not be decompressed
+    - fallbacks:                (:obj:`int`): payloads sent with `zlib` or uncompressed
+                                because some peers cannot decode the codec of the publisher
+    """
+    messages_compressed: int = 0
+    messages_skipped: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    compress_time: float = 0.0
+    messages_decompressed: int = 0
+    decompress_time: float = 0.0
+    errors: int = 0
+    fallbacks: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """
+        Size of the compressed payloads over their original size (lower is better).
+        """
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+
+class DTCompressor(object):
+    """
+    Compresses the payloads sent by a publisher.
+
+    :meta private:
+    """
+
+    def __init__(self, compression: 'DTCompression', options: DTCompressionOptions):
+        self._compression = compression
+        self._options = options
+        self._compress, _ = CODECS[options.codec](options.level)
+        self._metadata = _METADATA[options.codec]
+        # used when some peers do not know the codec of the publisher
+        self._fallback, _ = CODECS["zlib"](None)
+
+    def compress(self, data: bytes, accepted: AbstractSet[str]) -> Tuple[bytes, Optional[dict]]:
+        """
+        Compresses a payload.
+
+        :param data:        (:obj:`bytes`): Payload.
+        :param accepted:    (:obj:`AbstractSet[str]`): Codecs every peer can decode.
+        :return:            The payload to send and the metadata recording the codec, `None`
+                            if the payload was not compressed.
+        :rtype:             Tuple[bytes, Optional[dict]]
+        """
+        if len(data) < self._options.threshold:
+            self._compression.on_compressed(len(data), len(data), 0.0)
+            return data, None
+        compress, metadata = self._compress, self._metadata
+        if self._options.codec not in accepted:
+            self._compression.on_fallback()
+            if "zlib" not in accepted:
+                self._compression.on_compressed(len(data), len(data), 0.0)
+                return data, None
+            compress, metadata = self._fallback, _METADATA["zlib"]
+        start = time.perf_counter()
+        compressed = compress(data)
+        elapsed = time.perf_counter() - start
+        if len(compressed) >= len(data):
+            self._compression.on_compressed(len(data), len(data), elapsed)
+            return data, None
+        self._compression.on_compressed(len(data), len(compressed), elapsed)
+        return compressed, metadata
+
+
+class DTCompression(object):
+    """
+    Compression of a group: creates the publishers' compressors and decompresses the
+    incoming payloads.
+
+    Args:
+        options     (:obj:`DTCompressionOptions`): compression options, `None` disables
+                    compression on the sending side
+        max_size    (:obj:`int`): maximum size of a decompressed payload
+
+    :meta private:
+    """
+
+    def __init__(self, options: Optional[DTCompressionOptions],
+                 max_size: int = MAX_DECOMPRESSED_SIZE):
+        self._options = options
+        self._max_size = max_size
+        self._stats = DTCompressionStats()
+        self._lock = threading.Lock()
+        self._decompress = {name: factory(None)[1] for name, factory in CODECS.items()}
+
+    @property
+    def options(self) -> Optional[DTCompressionOptions]:
+        return self._options
+
+    @property
+    def stats(self) -> DTCompressionStats:
+        """
+        A snapshot of the compression statistics.
+
+        :return: Compression statistics.
+        :rtype:  DTCompressionStats
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def compressor(self, options: DTCompressionOptions = None) -> Optional[DTCompressor]:
+        """
+        Creates a compressor for a new publisher.
+
+        :param options: (:obj:`DTCompressionOptions`): Options of the publisher, defaults to
+                        the options of the group.
+        :return:        A compressor, `None` if compression is disabled.
+        :rtype:         Optional[DTCompressor]
+        """
+        options = options or self._options
+        return None if options is None else DTCompressor(self, options)
+
+    def on_compressed(self, size: int, compressed: int, elapsed: float):
+        with self._lock:
+            if compressed < size:
+                self._stats.messages_compressed += 1
+            else:
+                self._stats.messages_skipped += 1
+            self._stats.bytes_in += size
+            self._stats.bytes_out += compressed
+            self._stats.compress_time += elapsed
+
+    def on_fallback(self):
+        with self._lock:
+            self._stats.fallbacks += 1
+
+    def decompress(self, codec: str, payload: BytesLike) -> Optional[bytes]:
+        """
+        Decompresses a payload.
+
+        :param codec:   (:obj:`str`):       Codec recorded in the message metadata.
+        :param payload: (:obj:`BytesLike`): Compressed payload.
+        :return:        The original payload, `None` if the codec is not available, the
+                        payload is corrupted or too large once decompressed.
+        :rtype:         Optional[bytes]
+        """
+        decompress = self._decompress.get(codec)
+        start = time.perf_counter()
+        try:
+            data = None if decompress is None else decompress(payload, self._max_size)
+        except Exception:
+            data = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if data is None:
+                self._stats.errors += 1
+            else:
+                self._stats.messages_decompressed += 1
+                self._stats.decompress_time += elapsed
+        return data
@@ -0,0 +1,9 @@
+import uuid
+import socket
+
+HOSTNAME = socket.gethostname()
+ANYBODY = "*"
+ANYBODY_BUT_ME = f"~{HOSTNAME}"
+
+# unique identifier of this process, used to recognize our own messages when they loop back
+PROCESS_ID = uuid.uuid4().hex[:16]
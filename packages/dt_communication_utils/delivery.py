@@ -0,0 +1,289 @@
+import time
+import logging
+import threading
+import dataclasses
+from enum import Enum
+from collections import deque, OrderedDict
+from typing import Callable, Optional, Any, List, Tuple
+from dataclasses import dataclass
+
+from .header import DTCommunicationMessageHeader
+
+
+class DTOverflowPolicy(Enum):
+    """
+    What to do when a message arrives and the delivery queue of a subscriber is full.
+
+    - DROP_OLDEST:              the oldest message in the queue is dropped
+    - DROP_NEWEST:              the incoming message is dropped
+    - KEEP_LATEST_PER_ORIGIN:   only the latest message from each origin is kept in the queue,
+                                the oldest message is dropped when the queue is full
+    """
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+    KEEP_LATEST_PER_ORIGIN = "keep-latest-per-origin"
+
+
+@dataclass
+class DTDeliveryOptions(object):
+    """
+    Configures how messages are delivered to a subscriber.
+
+    By default, callbacks are called directly by the thread receiving the messages, a slow
+    callback delays the delivery of the messages to all the other subscribers. When
+    `queue_size` is given, messages are put in a bounded queue and delivered by a pool of
+    `workers` threads instead. When `processes` is given, messages are decoded and passed to
+    the callback by a pool of worker processes instead, which is not limited by the GIL.
+
+    Parameters
+
+    - queue_size:   (:obj:`int`): size of the delivery queue, `None` means no queue
+    - workers:      (:obj:`int`): number of threads calling the callback (only used with a queue)
+    - overflow:     (:obj:`DTOverflowPolicy`): what to do when the queue is full
+    - max_age:      (:obj:`float`): messages generated more than `max_age` seconds before they
+                    are delivered are dropped, `None` means no limit
+    - processes:    (:obj:`int`): number of worker processes decoding the messages and calling
+                    the callback, `None` means no worker processes. `queue_size` is then the
+                    number of messages waiting for each process, when a process falls behind
+                    the incoming messages are dropped (`overflow` is ignored). The callback
+                    must be picklable (e.g., a function defined at the top level of a module).
+    - ordered:      (:obj:`bool`): messages from the same origin are handled by the same process,
+                    in order (only used with `processes`)
+    """
+    queue_size: Optional[int] = None
+    workers: int = 1
+    overflow: DTOverflowPolicy = DTOverflowPolicy.DROP_OLDEST
+    max_age: Optional[float] = None
+    processes: Optional[int] = None
+    ordered: bool = False
+
+    def __post_init__(self):
+        if self.queue_size is not None and self.queue_size < 1:
+            raise ValueError(f"Field `queue_size` must be a positive integer, "
+                             f"got {self.queue_size} instead.")
+        if self.workers < 1:
+            raise ValueError(f"Field `workers` must be a positive integer, "
+                             f"got {self.workers} instead.")
+        if not isinstance(self.overflow, DTOverflowPolicy):
+            raise ValueError(f"Field `overflow` must be of type `DTOverflowPolicy`, "
+                             f"got `{self.overflow.__class__.__name__}` instead.")
+        if self.processes is not None and self.processes < 1:
+            raise ValueError(f"Field `processes` must be a positive integer, "
+                             f"got {self.processes} instead.")
+
+
+@dataclass
+class DTDeliveryStats(object):
+    """
+    Delivery statistics of a subscriber.
+
+    Parameters
+
+    - received:         (:obj:`int`): messages handed to the subscriber
+    - delivered:        (:obj:`int`): messages passed to the callback
+    - dropped_overflow: (:obj:`int`): messages dropped because the queue was full
+    - dropped_replaced: (:obj:`int`): messages replaced by a newer one from the same origin
+    - dropped_expired:  (:obj:`int`): messages dropped because older than `max_age`
+    - queued:           (:obj:`int`): messages currently waiting in the queue
+    """
+    received: int = 0
+    delivered: int = 0
+    dropped_overflow: int = 0
+    dropped_replaced: int = 0
+    dropped_expired: int = 0
+    queued: int = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.dropped_overflow + self.dropped_replaced + self.dropped_expired
+
+
+class DTDelivery(object):
+    """
+    Delivers messages to a callback directly.
+
+    Args:
+        callback    (:obj:`Callable`): the user callback
+        options     (:obj:`DTDeliveryOptions`): delivery options
+        logger      (:obj:`logging.Logger`): logger used to report errors
+
+    :meta private:
+    """
+
+    # whether messages are delivered encoded (see deliver_encoded())
+    encoded = False
+
+    def __init__(self, callback: Callable, options: DTDeliveryOptions, logger: logging.Logger):
+        self._callback = callback
+        self._options = options
+        self._logger = logger
+        self._stats = DTDeliveryStats()
+        # protects the statistics (and the queue of the subclasses)
+        self._lock = threading.Condition()
+        self._max_age_us = None if options.max_age is None else int(options.max_age * 1e6)
+
+    @staticmethod
+    def create(callback: Callable, options: Optional[DTDeliveryOptions],
+               logger: logging.Logger, decode: Callable[[Any, dict], Any] = None) -> 'DTDelivery':
+        """
+        Creates the right delivery object for the given options.
+
+        :param callback:    (:obj:`Callable`):          The user callback.
+        :param options:     (:obj:`DTDeliveryOptions`): Delivery options.
+        :param logger:      (:obj:`logging.Logger`):    Logger used to report errors.
+        :param decode:      (:obj:`Callable`):          Decodes a payload given its metadata,
+                                                        used by worker processes.
+        :return:            A delivery object.
+        :rtype:             DTDelivery
+        """
+        options = options or DTDeliveryOptions()
+        if options.processes is not None:
+            from .pool import DTProcessDelivery
+            return DTProcessDelivery(callback, options, logger, decode)
+        if options.queue_size is None:
+            return DTDelivery(callback, options, logger)
+        return _DTQueuedDelivery(callback, options, logger)
+
+    @property
+    def stats(self) -> DTDeliveryStats:
+        """
+        A snapshot of the delivery statistics.
+
+        :return: Delivery statistics.
+        :rtype:  DTDeliveryStats
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def deliver_encoded(self, payload: Any, metadata: dict,
+                        header: DTCommunicationMessageHeader):
+        raise RuntimeError("This delivery only accepts decoded messages.")
+
+    def deliver(self, payload: Any, header: DTCommunicationMessageHeader):
+        with self._lock:
+            self._stats.received += 1
+            if self._is_expired(header):
+                self._stats.dropped_expired += 1
+                return
+        # the callback is called without holding the lock, it can take its time
+        self._callback(payload, header)
+        with self._lock:
+            self._stats.delivered += 1
+
+    def deliver_many(self, messages: List[Tuple[Any, DTCommunicationMessageHeader]]):
+        fresh = [message for message in messages if not self._is_expired(message[1])]
+        with self._lock:
+            self._stats.received += len(messages)
+            self._stats.dropped_expired += len(messages) - len(fresh)
+        delivered = 0
+        for payload, header in fresh:
+            # one faulty message should not prevent the others from being delivered
+            try:
+                self._callback(payload, header)
+                delivered += 1
+            except Exception:
+                self._logger.exception("An error occurred while delivering a message.")
+        with self._lock:
+            self._stats.delivered += delivered
+
+    def shutdown(self):
+        pass
+
+    def _is_expired(self, header: DTCommunicationMessageHeader) -> bool:
+        if self._max_age_us is None or header.timestamp is None:
+            return False
+        return (time.time_ns() // 1000) - header.timestamp > self._max_age_us
+
+
+class _DTQueuedDelivery(DTDelivery):
+    """
+    Delivers messages to a callback through a bounded queue consumed by worker threads.
+
+    :meta private:
+    """
+
+    def __init__(self, callback: Callable, options: DTDeliveryOptions, logger: logging.Logger):
+        super(_DTQueuedDelivery, self).__init__(callback, options, logger)
+        self._by_origin = options.overflow == DTOverflowPolicy.KEEP_LATEST_PER_ORIGIN
+        self._queue = OrderedDict() if self._by_origin else deque()
+        self._is_shutdown = False
+        self._workers: List[threading.Thread] = []
+        for i in range(options.workers):
+            worker = threading.Thread(target=self._work, name=f"CommDelivery-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def stats(self) -> DTDeliveryStats:
+        with self._lock:
+            return dataclasses.replace(self._stats, queued=len(self._queue))
+
+    def deliver(self, payload: Any, header: DTCommunicationMessageHeader):
+        with self._lock:
+            if self._enqueue(payload, header):
+                self._lock.notify()
+
+    def _enqueue(self, payload: Any, header: DTCommunicationMessageHeader) -> bool:
+        # the caller holds the lock, returns whether the message was queued
+        self._stats.received += 1
+        if self._is_expired(header):
+            self._stats.dropped_expired += 1
+            return False
+        full = len(self._queue) >= self._options.queue_size
+        # keep only the latest message per origin
+        if self._by_origin:
+            if header.origin in self._queue:
+                self._stats.dropped_replaced += 1
+                del self._queue[header.origin]
+            elif full:
+                self._stats.dropped_overflow += 1
+                self._queue.popitem(last=False)
+            self._queue[header.origin] = (payload, header)
+        # queue is full
+        elif full:
+            self._stats.dropped_overflow += 1
+            if self._options.overflow == DTOverflowPolicy.DROP_NEWEST:
+                return False
+            self._queue.popleft()
+            self._queue.append((payload, header))
+        else:
+            self._queue.append((payload, header))
+        return True
+
+    def deliver_many(self, messages: List[Tuple[Any, DTCommunicationMessageHeader]]):
+        with self._lock:
+            for payload, header in messages:
+                self._enqueue(payload, header)
+            self._lock.notify(len(messages))
+
+    def shutdown(self):
+        with self._lock:
+            self._is_shutdown = True
+            self._queue.clear()
+            self._lock.notify_all()
+        # wait for the workers (unless we are one of them, e.g., shutdown from a callback)
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._is_shutdown:
+                    self._lock.wait()
+                if self._is_shutdown:
+                    return
+                if self._by_origin:
+                    _, (payload, header) = self._queue.popitem(last=False)
+                else:
+                    payload, header = self._queue.popleft()
+                # messages can expire while waiting in the queue
+                if self._is_expired(header):
+                    self._stats.dropped_expired += 1
+                    continue
+            try:
+                self._callback(payload, header)
+            except Exception:
+                self._logger.exception("An error occurred while delivering a message.")
+            with self._lock:
+                self._stats.delivered += 1
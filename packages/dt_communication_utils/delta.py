@@ -0,0 +1,263 @@
+"""
+Delta encoding of the payloads of publishers broadcasting a slowly changing state
+(e.g., configuration, battery level, LEDs).
+
+Publishers with delta encoding enabled send a full payload (a keyframe) every
+`keyframe_every` messages or `keyframe_period` seconds, and in between only what changed
+since the last keyframe: the payload is XOR-ed with the keyframe, which leaves zeros
+wherever nothing changed, and compressed. A delta that would not be smaller than the
+payload itself is sent as a new keyframe instead.
+
+Every payload starts with a small header (stream, keyframe id and kind). Receivers keep the
+last keyframe of each stream (i.e., of each publisher) and rebuild the payloads from it.
+Deltas always refer to a keyframe, so losing a delta does not affect the following ones.
+When a keyframe is lost (or a receiver joins late), the deltas referring to it are dropped
+until the next keyframe arrives.
+
+Only the messages sent to everybody are delta-encoded. Receivers always decode deltas,
+delta encoding only needs to be enabled on the publishers. Peers running older versions of
+this library cannot decode deltas.
+"""
+
+import time
+import zlib
+import random
+import struct
+import threading
+import dataclasses
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Hashable
+
+from .codec import BytesLike, payload_length
+from .compression import MAX_DECOMPRESSED_SIZE
+
+# metadata of the delta-encoded messages
+DELTA = {"delta": 1}
+
+# stream, keyframe id, kind
+_HEADER = struct.Struct(">IIB")
+_KEYFRAME = 0
+_DELTA = 1
+
+
+@dataclass
+class DTDeltaOptions(object):
+    """
+    Configures the delta encoding of the payloads sent by a publisher.
+
+    Parameters
+
+    - keyframe_every:   (:obj:`int`): a keyframe is sent every `keyframe_every` messages
+    - keyframe_period:  (:obj:`float`): a keyframe is sent (at least) every `keyframe_period`
+                        seconds, i.e., the longest time a new receiver waits before it can
+                        decode the messages
+    - level:            (:obj:`int`): zlib compression level of the deltas
+    """
+    keyframe_every: int = 10
+    keyframe_period: float = 1.0
+    level: int = 1
+
+    def __post_init__(self):
+        if self.keyframe_every < 1:
+            raise ValueError(f"Field `keyframe_every` must be a positive integer, "
+                             f"got {self.keyframe_every} instead.")
+        if self.keyframe_period <= 0:
+            raise ValueError(f"Field `keyframe_period` must be a positive number, "
+                             f"got {self.keyframe_period} instead.")
+        if not 0 <= self.level <= 9:
+            raise ValueError(f"Field `level` must be an integer between 0 and 9, "
+                             f"got {self.level} instead.")
+
+
+@dataclass
+class DTDeltaStats(object):
+    """
+    Delta encoding statistics of a group.
+
+    Parameters
+
+    - keyframes_sent:       (:obj:`int`): keyframes sent
+    - deltas_sent:          (:obj:`int`): deltas sent
+    - bytes_in:             (:obj:`int`): size of the payloads before delta encoding
+    - bytes_out:            (:obj:`int`): size of the payloads after delta encoding
+    - keyframes_received:   (:obj:`int`): keyframes received
+    - deltas_received:      (:obj:`int`): deltas received and decoded
+    - deltas_dropped:       (:obj:`int`): deltas received without the keyframe they refer to
+    - errors:               (:obj:`int`): payloads received that could not be decoded
+    """
+    keyframes_sent: int = 0
+    deltas_sent: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    keyframes_received: int = 0
+    deltas_received: int = 0
+    deltas_dropped: int = 0
+    errors: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """
+        Size of the payloads sent over their original size (lower is better).
+        """
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+
+def _xor(data: BytesLike, reference: bytes) -> bytes:
+    # the reference is truncated (or padded with zeros) to the size of the data
+    size = payload_length(data)
+    if len(reference) != size:
+        reference = reference[:size].ljust(size, b"\0")
+    return (int.from_bytes(data, "little") ^ int.from_bytes(reference, "little")) \
+        .to_bytes(size, "little")
+
+
+class DTDeltaEncoder(object):
+    """
+    Delta-encodes the payloads sent by a publisher.
+
+    :meta private:
+    """
+
+    def __init__(self, delta: 'DTDelta', options: DTDeltaOptions):
+        self._delta = delta
+        self._options = options
+        self._stream = random.getrandbits(32)
+        self._lock = threading.Lock()
+        self._keyframe: Optional[bytes] = None
+        self._keyframe_id = 0
+        self._keyframe_time = 0.0
+        # messages sent since the last keyframe (included)
+        self._count = 0
+
+    def encode(self, data: BytesLike) -> bytes:
+        """
+        Encodes a payload as a keyframe or as a delta from the last keyframe.
+
+        :param data:    (:obj:`BytesLike`): Payload.
+        :return:        The payload to send.
+        :rtype:         bytes
+        """
+        options = self._options
+        size = payload_length(data)
+        with self._lock:
+            now = time.monotonic()
+            if self._keyframe is not None and self._count < options.keyframe_every and \
+                    now - self._keyframe_time < options.keyframe_period:
+                delta = zlib.compress(_xor(data, self._keyframe), options.level)
+                # a delta that does not save anything starts a new keyframe instead
+                if len(delta) < size:
+                    self._count += 1
+                    self._delta.on_sent(False, size, _HEADER.size + len(delta))
+                    return _HEADER.pack(self._stream, self._keyframe_id, _DELTA) + delta
+            self._keyframe = bytes(data)
+            self._keyframe_id = (self._keyframe_id + 1) & 0xFFFFFFFF
+            self._keyframe_time = now
+            self._count = 1
+            self._delta.on_sent(True, size, _HEADER.size + size)
+            return _HEADER.pack(self._stream, self._keyframe_id, _KEYFRAME) + self._keyframe
+
+
+class DTDelta(object):
+    """
+    Delta encoding of a group: creates the publishers' encoders and rebuilds the incoming
+    payloads from the keyframes of their streams.
+
+    Args:
+        max_size    (:obj:`int`): deltas decompressing to more than `max_size` bytes are
+                    dropped (as errors)
+
+    :meta private:
+    """
+
+    # maximum number of streams whose keyframe is kept, the least recently used are evicted
+    MAX_STREAMS = 256
+
+    def __init__(self, max_size: int = MAX_DECOMPRESSED_SIZE):
+        self._max_size = max_size
+        self._stats = DTDeltaStats()
+        self._lock = threading.Lock()
+        # stream -> (keyframe id, keyframe)
+        self._keyframes: OrderedDict = OrderedDict()
+
+    @property
+    def stats(self) -> DTDeltaStats:
+        """
+        A snapshot of the delta encoding statistics.
+
+        :return: Delta encoding statistics.
+        :rtype:  DTDeltaStats
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def encoder(self, options: Optional[DTDeltaOptions]) -> Optional[DTDeltaEncoder]:
+        """
+        Creates an encoder for a new publisher.
+
+        :param options: (:obj:`DTDeltaOptions`): Options of the publisher.
+        :return:        An encoder, `None` if delta encoding is disabled.
+        :rtype:         Optional[DTDeltaEncoder]
+        """
+        return None if options is None else DTDeltaEncoder(self, options)
+
+    def on_sent(self, keyframe: bool, size: int, encoded: int):
+        with self._lock:
+            if keyframe:
+                self._stats.keyframes_sent += 1
+            else:
+                self._stats.deltas_sent += 1
+            self._stats.bytes_in += size
+            self._stats.bytes_out += encoded
+
+    def decode(self, key: Hashable, payload: BytesLike) -> Optional[bytes]:
+        """
+        Rebuilds a delta-encoded payload.
+
+        :param key:     (:obj:`Hashable`):  Identifies the sender (e.g., topic, group and origin).
+        :param payload: (:obj:`BytesLike`): Payload received.
+        :return:        The original payload, `None` if the keyframe it refers to is unknown
+                        or the payload is corrupted.
+        :rtype:         Optional[bytes]
+        """
+        try:
+            stream, keyframe_id, kind = _HEADER.unpack_from(payload)
+        except struct.error:
+            kind = None
+        if kind not in (_KEYFRAME, _DELTA):
+            with self._lock:
+                self._stats.errors += 1
+            return None
+        key = (key, stream)
+        body = memoryview(payload)[_HEADER.size:]
+        if kind == _KEYFRAME:
+            keyframe = bytes(body)
+            with self._lock:
+                self._keyframes[key] = (keyframe_id, keyframe)
+                self._keyframes.move_to_end(key)
+                while len(self._keyframes) > self.MAX_STREAMS:
+                    self._keyframes.popitem(last=False)
+                self._stats.keyframes_received += 1
+            return keyframe
+        with self._lock:
+            known = self._keyframes.get(key)
+            if known is None or known[0] != keyframe_id:
+                # we missed the keyframe, wait for the next one
+                self._stats.deltas_dropped += 1
+                return None
+            self._keyframes.move_to_end(key)
+        data = None
+        try:
+            # bounded, a small delta must not be able to exhaust our memory
+            decompressor = zlib.decompressobj()
+            delta = decompressor.decompress(body, self._max_size)
+            if decompressor.eof and not decompressor.unconsumed_tail:
+                data = _xor(delta, known[1])
+        except zlib.error:
+            pass
+        with self._lock:
+            if data is None:
+                self._stats.errors += 1
+            else:
+                self._stats.deltas_received += 1
+        return data
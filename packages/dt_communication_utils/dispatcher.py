@@ -0,0 +1,449 @@
+import logging
+import threading
+from typing import Dict, Tuple, Any, Set, List, Optional, Callable
+
+from . import codec, envelope
+from .constants import HOSTNAME, ANYBODY, ANYBODY_BUT_ME, PROCESS_ID
+from .header import DTCommunicationMessageHeader, decode_metadata
+from .fragmentation import DTFragmentation, DTFragmentationOptions
+from .fec import DTFec
+from .compression import DTCompression
+from .batching import decode_batch
+from .delta import DTDelta
+from .addressing import DTForeignTraffic, DTForeignTrafficStats
+from .udpm import DTUDPMulticastHandler
+
+
+class DTCommunicationDispatcher(object):
+    """
+    Receives the messages arriving on an LCM handler, decodes each of them once and routes
+    them by topic to all the local subscribers.
+
+    Subscribers sharing the same topic and payload type receive the very same decoded
+    object, which must be treated as read-only.
+
+    All the dispatchers in the process are registered by group name, so that publishers
+    can deliver messages to subscribers living in the same process directly
+    (see :py:meth:`deliver_local`).
+
+    Args:
+        name        (:obj:`str`): the name of the group owning the handler
+        handler     (:obj:`lcm.LCM`): the LCM handler to receive messages from
+        logger      (:obj:`logging.Logger`): the logger of the group owning the handler
+        lock        (:obj:`threading.RLock`): lock held while messages are being delivered
+        fragmentation   (:obj:`DTFragmentation`): reassembles fragmented payloads
+        fec         (:obj:`DTFec`): rebuilds the messages lost on the network
+        compression (:obj:`DTCompression`): decompresses the incoming payloads
+        on_collision    (:obj:`Callable`): called with the topic and the name of the group
+                        the first time a message from another group is received
+        names       (:obj:`Dict[int, str]`): names of the hosts and groups behind the
+                    identifiers of the compact envelopes (updated in place by the owner)
+        delta       (:obj:`DTDelta`): rebuilds the delta-encoded payloads
+        schedule    (:obj:`Callable`): runs the deliveries of the messages published in this
+                    process on the thread that delivers the messages of this dispatcher
+                    (e.g., an event loop), `None` runs them on the publishing thread
+
+    :meta private:
+    """
+
+    __local__: Dict[str, Set['DTCommunicationDispatcher']] = {}
+    __local_lock__ = threading.Lock()
+
+    def __init__(self, name: str, handler, logger: logging.Logger, lock: threading.RLock,
+                 fragmentation: DTFragmentation = None, fec: DTFec = None,
+                 compression: DTCompression = None,
+                 on_collision: Callable[[str, str], None] = None,
+                 names: Dict[int, str] = None, delta: DTDelta = None,
+                 schedule: Callable[[Callable[[], None]], None] = None):
+        self._name = name
+        self._handler = handler
+        self._logger = logger
+        # (un)subscribing while the handler is delivering a message can crash LCM
+        self._lock = lock
+        # topic -> (LCM subscription, subscribers)
+        self._routes: Dict[str, Tuple[Any, tuple]] = {}
+        self._collisions = set()
+        self._foreign = DTForeignTraffic()
+        self._on_collision_cb = on_collision
+        self._fragmentation = fragmentation or DTFragmentation(DTFragmentationOptions())
+        self._fec = fec or DTFec(None)
+        self._compression = compression or DTCompression(None)
+        self._delta = delta or DTDelta()
+        self._schedule = schedule
+        # topics on which messages protected by FEC were received
+        self._fec_topics: Set[str] = set()
+        # identifier -> name, for the compact envelopes
+        self._names = names if names is not None else {envelope.short_id(HOSTNAME): HOSTNAME}
+        # identifier of the shared memory reader of this group (if any)
+        self._shm_id: Optional[str] = None
+        self._on_topics_change: Optional[Callable[[], None]] = None
+        # register this dispatcher for in-process delivery
+        with DTCommunicationDispatcher.__local_lock__:
+            DTCommunicationDispatcher.__local__.setdefault(name, set()).add(self)
+
+    @staticmethod
+    def local(name: str) -> List['DTCommunicationDispatcher']:
+        """
+        Returns the dispatchers of all the groups with the given name in this process.
+
+        :param name:    (:obj:`str`):   Name of the group.
+        :return:        Dispatchers.
+        :rtype:         List[DTCommunicationDispatcher]
+        """
+        with DTCommunicationDispatcher.__local_lock__:
+            return list(DTCommunicationDispatcher.__local__.get(name, ()))
+
+    def close(self):
+        """
+        Unregisters this dispatcher from in-process delivery.
+        """
+        with DTCommunicationDispatcher.__local_lock__:
+            dispatchers = DTCommunicationDispatcher.__local__.get(self._name, set())
+            dispatchers.discard(self)
+            if not dispatchers:
+                DTCommunicationDispatcher.__local__.pop(self._name, None)
+
+    @property
+    def foreign_traffic(self) -> DTForeignTrafficStats:
+        """
+        Traffic received from other groups sharing our address, and dropped.
+
+        :return: A snapshot of the foreign traffic statistics.
+        :rtype:  DTForeignTrafficStats
+        """
+        return self._foreign.stats
+
+    @property
+    def topics(self) -> Tuple[str, ...]:
+        """
+        Topics with at least one local subscriber.
+
+        :return: Topics.
+        :rtype:  Tuple[str, ...]
+        """
+        return tuple(self._routes.keys())
+
+    def use_shared_memory(self, shm_id: str, on_topics_change: Callable[[], None]):
+        """
+        Tells the dispatcher that messages might also be received through shared memory.
+
+        Messages written to shared memory for the reader `shm_id` are ignored when they
+        arrive from the network, and vice versa.
+
+        :param shm_id:              (:obj:`str`):       Identifier of the shared memory reader.
+        :param on_topics_change:    (:obj:`Callable`):  Called when topics are added/removed.
+        """
+        self._shm_id = shm_id
+        self._on_topics_change = on_topics_change
+
+    def add(self, subscriber: 'DTCommunicationSubscriber'):
+        """
+        Routes the messages arriving on the subscriber's topic to the given subscriber.
+
+        :param subscriber:    (:obj:`DTCommunicationSubscriber`):  Subscriber to add.
+        """
+        with self._lock:
+            topic = subscriber.topic
+            self._names[envelope.short_id(subscriber.group.name)] = subscriber.group.name
+            subscription, subscribers = self._routes.get(topic, (None, ()))
+            if subscription is None:
+                # the native backend hands over the messages it reads in batches
+                if isinstance(self._handler, DTUDPMulticastHandler):
+                    subscription = self._handler.subscribe_many(topic, self.dispatch_many)
+                else:
+                    subscription = self._handler.subscribe(topic, self.dispatch)
+            # routes are replaced (never modified) so that dispatch() does not need the lock
+            self._routes[topic] = (subscription, subscribers + (subscriber,))
+            if not subscribers and self._on_topics_change is not None:
+                self._on_topics_change()
+
+    def remove(self, subscriber: 'DTCommunicationSubscriber'):
+        """
+        Stops routing messages to the given subscriber.
+
+        :param subscriber:    (:obj:`DTCommunicationSubscriber`):  Subscriber to remove.
+        """
+        with self._lock:
+            topic = subscriber.topic
+            if topic not in self._routes:
+                return
+            subscription, subscribers = self._routes[topic]
+            subscribers = tuple(s for s in subscribers if s is not subscriber)
+            if subscribers:
+                self._routes[topic] = (subscription, subscribers)
+                return
+            # nobody is listening to this topic anymore
+            del self._routes[topic]
+            self._handler.unsubscribe(subscription)
+            if self._on_topics_change is not None:
+                self._on_topics_change()
+
+    def dispatch(self, topic: str, data: codec.BytesLike, shm: bool = False):
+        """
+        Decodes a message and delivers it to all the local subscribers of the given topic.
+
+        :param topic:   (:obj:`str`):       Topic the message was received on.
+        :param data:    (:obj:`BytesLike`): Encoded message.
+        :param shm:     (:obj:`bool`):      Whether the message was read from shared memory.
+        """
+        route = self._routes.get(topic)
+        if route is None:
+            return
+        deliveries = []
+        self._receive(topic, route[1], data, shm, False, deliveries)
+        if len(deliveries) == 1:
+            self._deliver(topic, *deliveries[0], {})
+        elif deliveries:
+            self._deliver_many(topic, deliveries)
+
+    def dispatch_many(self, topic: str, messages: List[codec.BytesLike]):
+        """
+        Decodes messages received together on the same topic and delivers them to all the
+        local subscribers of the topic, in order.
+
+        The whole batch is decoded first, then every subscriber is handed all of its
+        messages at once (e.g., a subscriber with a delivery queue takes its lock and wakes
+        up its workers once per batch rather than once per message).
+
+        :param topic:       (:obj:`str`):               Topic the messages were received on.
+        :param messages:    (:obj:`List[BytesLike]`):   Encoded messages.
+        """
+        route = self._routes.get(topic)
+        if route is None:
+            return
+        subscribers = route[1]
+        deliveries = []
+        receive = self._receive
+        for data in messages:
+            receive(topic, subscribers, data, False, False, deliveries)
+        if deliveries:
+            self._deliver_many(topic, deliveries)
+
+    def _receive(self, topic: str, subscribers: tuple, data: codec.BytesLike, shm: bool,
+                 recovered: bool, deliveries: list):
+        # decodes a message, what has to be delivered is appended to `deliveries` as
+        # (recipients, header, metadata, payload).
+        # The header is decoded first, messages from other groups are dropped right away
+        compact = envelope.is_compact(data)
+        md5sum = None
+        try:
+            if compact:
+                msg, offset, md5sum = envelope.decode_header(data, self._names)
+            else:
+                msg, offset = codec.decode_header(data)
+        except ValueError:
+            self._logger.warning("Received invalid message. Ignoring it.")
+            return
+        # make sure there is no group collision here
+        recipients = [s for s in subscribers if s.group.name == msg.group]
+        if not recipients:
+            self._foreign.add(msg.group, codec.payload_length(data))
+            # compact envelopes do not carry the names of the other groups
+            if not compact:
+                self._on_collision(topic, msg.group, subscribers[0].group.name)
+            return
+        # the origin of compact envelopes is known once it announced itself
+        if msg.origin is None:
+            return
+        # messages for somebody else are dropped before decoding the rest, unless they
+        # might be needed to rebuild the lost messages of a FEC stream
+        if topic not in self._fec_topics and not is_for_me(msg.destination):
+            return
+        # decode the rest of the message (the payload is not copied)
+        try:
+            if compact:
+                msg = envelope.decode_body(data, msg, offset)
+            else:
+                msg = codec.decode_body(data, msg, offset)
+        except ValueError:
+            self._logger.warning("Received invalid message. Ignoring it.")
+            return
+        if compact:
+            metadata = envelope.decode_metadata(msg.metadata, md5sum)
+        else:
+            metadata = decode_metadata(msg.metadata)
+        payload = msg.payload
+        # messages protected by FEC help rebuilding the lost ones, even when not for us
+        fec = metadata.get("fec")
+        if fec is not None and not shm:
+            self._fec_topics.add(topic)
+            if recovered:
+                payload = self._fec.strip(payload)
+            else:
+                key = (topic, msg.group, msg.origin)
+                payload, rebuilt = self._fec.receive(key, data, payload, fec == "parity")
+                for message in rebuilt:
+                    self._receive(topic, subscribers, message, False, True, deliveries)
+                if payload is None:
+                    return
+        # make sure we are the intended destination of this message
+        destination = msg.destination
+        if not is_for_me(destination):
+            return
+        # our own message looping back, it was already delivered in-process
+        if not shm and msg.origin == HOSTNAME and metadata.get("sender") == PROCESS_ID:
+            return
+        # messages written to shared memory for us are only delivered from there
+        if (self._shm_id is not None and self._shm_id in metadata.get("shm", ())) != shm:
+            return
+        # large payloads might arrive in fragments
+        if "frag" in metadata:
+            payload = self._fragmentation.reassemble((topic, msg.group, msg.origin), payload)
+            if payload is None:
+                return
+        # compressed payloads record their codec
+        if "codec" in metadata:
+            payload = self._compression.decompress(metadata["codec"], payload)
+            if payload is None:
+                self._logger.warning(f"Received a payload that could not be decompressed "
+                                     f"with the codec `{metadata['codec']}`. Ignoring it.")
+                return
+        # delta-encoded payloads are rebuilt from the last keyframe of their publisher
+        if "delta" in metadata:
+            payload = self._delta.decode((topic, msg.group, msg.origin), payload)
+            if payload is None:
+                return
+        # batches carry several messages, each with its own header
+        if "batch" in metadata:
+            try:
+                entries = list(decode_batch(payload))
+            except ValueError:
+                self._logger.warning("Received invalid batch. Ignoring it.")
+                return
+            for timestamp, destination, txt, entry in entries:
+                if not is_for_me(destination):
+                    continue
+                header = DTCommunicationMessageHeader(
+                    timestamp=timestamp,
+                    origin=msg.origin,
+                    destination=destination,
+                    txt=txt
+                )
+                deliveries.append((recipients, header, metadata, entry))
+            return
+        # expose message metadata as a DTCommunicationMessageHeader object
+        header = DTCommunicationMessageHeader(
+            timestamp=msg.timestamp,
+            origin=msg.origin,
+            destination=destination,
+            txt=msg.txt or None
+        )
+        deliveries.append((recipients, header, metadata, payload))
+
+    def deliver_local(self, topic: str, group: str, header: DTCommunicationMessageHeader,
+                      metadata: dict, payload: codec.BytesLike, decoded: Dict[Any, Any]):
+        """
+        Delivers a message published in this process to the local subscribers of the given
+        topic, without going through the network.
+
+        :param topic:       (:obj:`str`):                       Topic of the message.
+        :param group:       (:obj:`str`):                       Group (or subgroup) of the message.
+        :param header:      (:obj:`DTCommunicationMessageHeader`):  Message header.
+        :param metadata:    (:obj:`dict`):                      Message metadata.
+        :param payload:     (:obj:`BytesLike`):                 Encoded payload.
+        :param decoded:     (:obj:`Dict[Any, Any]`):            Payload already decoded, indexed by
+                                                                decoding key.
+        """
+        route = self._routes.get(topic)
+        if route is None:
+            return
+        recipients = [s for s in route[1] if s.group.name == group]
+        if not recipients:
+            return
+        decoded = dict(decoded)
+        if self._schedule is None:
+            # the recipients are a snapshot of the route, the callbacks run on the publishing
+            # thread without the delivery lock, so a slow local subscriber does not hold up
+            # the messages arriving from the network
+            self._deliver(topic, recipients, header, metadata, payload, decoded)
+            return
+        # the publisher reuses its buffer once this returns
+        if isinstance(payload, memoryview):
+            payload = bytes(payload)
+
+        def deliver():
+            with self._lock:
+                self._deliver(topic, recipients, header, metadata, payload, decoded)
+
+        self._schedule(deliver)
+
+    def _deliver(self, topic: str, recipients: list, header: DTCommunicationMessageHeader,
+                 metadata: dict, payload: codec.BytesLike, decoded: Dict[Any, Any]):
+        # decode the payload once per payload type and deliver it
+        for subscriber in recipients:
+            if not subscriber.accepts(header):
+                continue
+            # one faulty subscriber should not prevent the others from receiving the message
+            try:
+                # some subscribers decode the payload elsewhere (e.g., in worker processes)
+                if subscriber.encoded:
+                    subscriber.deliver_encoded(payload, metadata, header)
+                    continue
+                key = subscriber.decoding_key
+                if key in decoded:
+                    message = decoded[key]
+                else:
+                    message = decoded[key] = subscriber.group.decode(payload, metadata)
+                if message is None:
+                    continue
+                subscriber.deliver(message, header)
+            except Exception:
+                self._logger.exception(f"An error occurred while delivering a message "
+                                       f"on topic `{topic}`.")
+
+    def _deliver_many(self, topic: str, deliveries: list):
+        # decode each payload once per payload type, then hand every subscriber its messages
+        batches: Dict[Any, list] = {}
+        for recipients, header, metadata, payload in deliveries:
+            decoded = {}
+            for subscriber in recipients:
+                if not subscriber.accepts(header):
+                    continue
+                try:
+                    if subscriber.encoded:
+                        subscriber.deliver_encoded(payload, metadata, header)
+                        continue
+                    key = subscriber.decoding_key
+                    if key in decoded:
+                        message = decoded[key]
+                    else:
+                        message = decoded[key] = subscriber.group.decode(payload, metadata)
+                except Exception:
+                    self._logger.exception(f"An error occurred while delivering a message "
+                                           f"on topic `{topic}`.")
+                    continue
+                if message is not None:
+                    batches.setdefault(subscriber, []).append((message, header))
+        for subscriber, messages in batches.items():
+            try:
+                subscriber.deliver_many(messages)
+            except Exception:
+                self._logger.exception(f"An error occurred while delivering messages "
+                                       f"on topic `{topic}`.")
+
+    def _on_collision(self, topic: str, other: str, ours: str):
+        if other in self._collisions:
+            return
+        self._logger.warning(
+            f"Collision detected between the groups `{other}` "
+            f"and `{ours}`. If you are the administrator, "
+            f"we suggest you increase the IP address pool dedicate to "
+            f"UDP Multicast or the port range (see `DTAddressingOptions`).")
+        self._collisions.add(other)
+        if self._on_collision_cb is not None:
+            self._on_collision_cb(topic, other)
+
+
+def is_for_me(destination: str) -> bool:
+    """
+    Checks whether a message with the given destination should be delivered to this host.
+
+    :param destination:     (:obj:`str`):   Destination of the message.
+    :return:                Whether the message is for us.
+    :rtype:                 bool
+    """
+    # make sure we are not supposed to receive this message
+    if destination == ANYBODY_BUT_ME:
+        return False
+    # make sure we are the intended destination of this message
+    return destination == ANYBODY or destination.startswith('~') or destination == HOSTNAME
@@ -0,0 +1,597 @@
+"""
+Compact (version 2) envelope of the messages, and its negotiation between peers.
+
+The envelope of version 1 (:py:class:`dt_communication_msg_t`) carries the name of the
+group, the hostname of the origin, the destination, the metadata (JSON) and the field
+`txt` as length-prefixed, null-terminated strings, which is often more than half of the
+bytes of a small message. The compact envelope looks like this:
+
+.. code-block:: text
+
+    [8s fingerprint][q timestamp][I group][I origin][B flags]([16s md5sum])
+    [H destination][H metadata][H txt][i payload]
+
+- group and origin are short identifiers (a hash of their name, see :py:func:`short_id`).
+  Receivers know the names of the groups they subscribe to, hostnames are announced by
+  the peers (see below);
+- ROS messages are identified by the MD5 sum of their definition (flag ``TYPED``) instead
+  of the name of their class in the metadata, empty metadata is omitted;
+- strings are prefixed by a 16-bit length and are not null-terminated.
+
+Negotiation: groups announce on a reserved channel their hostname and the highest
+envelope version they understand, periodically and whenever they hear from a new peer.
+Only the groups that negotiate something (i.e., allow the compact envelope or have a
+compressing publisher) announce themselves on their own, the others stay silent until a
+peer of the group announces itself, and answer probes. Receivers decode both versions. The publishers of groups created with
+:py:class:`DTEnvelopeOptions` (version 2) use the compact envelope once discovery has
+settled and as long as every peer they hear from understands it: a message of version 1,
+on a topic the group publishes on, coming from a host where nobody announced themselves
+(i.e., a peer running an older version of this library) makes the group fall back to
+version 1 until that host has been quiet for a while. Peers that only subscribe never
+reveal themselves, enable the compact envelope only if the subscribers of the group
+understand it.
+
+Announcements also carry the compression codecs each peer can decode, publishers only use
+the codecs every peer announced (see :py:mod:`dt_communication_utils.compression`), and
+the name of the group, which reveals the other groups sharing our address whatever the
+channel they use (when they announce themselves) (see :py:func:`probe` and :py:mod:`dt_communication_utils.addressing`).
+"""
+
+import json
+import time
+import struct
+import select
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from dataclasses import dataclass
+from typing import Optional, Dict, Tuple, Any, FrozenSet, Set, Callable
+
+from . import codec
+from .codec import BytesLike
+from .constants import HOSTNAME, PROCESS_ID
+from .compression import CODECS
+from .dt_communication_msg_t import dt_communication_msg_t
+from .mailman import DTCommunicationMailman
+
+FINGERPRINT = b"DTCMSGv2"
+# messages carrying the MD5 sum of a ROS message definition
+TYPED = 0x01
+# longest string field
+MAX_STRING_LENGTH = 0xFFFF
+
+# fingerprint + timestamp
+_PREAMBLE = struct.Struct(">8sq")
+# group + origin + flags
+_HEADER = struct.Struct(">IIB")
+_MD5SUM = struct.Struct(">16s")
+_STRING_LENGTH = struct.Struct(">H")
+_PAYLOAD_LENGTH = struct.Struct(">i")
+
+
+@dataclass
+class DTEnvelopeOptions(object):
+    """
+    Configures the envelope of the messages sent by the publishers of a group.
+
+    Parameters
+
+    - version:      (:obj:`int`): highest envelope version used by the publishers, `2`
+                    (compact) is used only while all the peers of the group understand it
+    """
+    version: int = 2
+
+    def __post_init__(self):
+        if self.version not in (1, 2):
+            raise ValueError(f"Field `version` must be either 1 or 2, "
+                             f"got {self.version} instead.")
+
+
+@lru_cache(maxsize=1024)
+def short_id(name: str) -> int:
+    """
+    Returns the short identifier of a group name or hostname in the compact envelope.
+
+    :param name:    (:obj:`str`):   Name.
+    :return:        Identifier (32 bits).
+    :rtype:         :obj:`int`
+    """
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def encode_header(group: str, origin: str, md5sum: Optional[str] = None) -> bytes:
+    """
+    Encodes the fields `group`, `origin` and `flags` (and the MD5 sum, if any) of the
+    messages sent by a group, they never change.
+
+    :param group:   (:obj:`str`):   Name of the group.
+    :param origin:  (:obj:`str`):   Hostname.
+    :param md5sum:  (:obj:`str`):   (Optional) MD5 sum of the ROS messages exchanged.
+    :return:        Encoded fields.
+    :rtype:         :obj:`bytes`
+    """
+    try:
+        md5sum = bytes.fromhex(md5sum or "")
+    except ValueError:
+        md5sum = b""
+    if len(md5sum) != _MD5SUM.size:
+        return _HEADER.pack(short_id(group), short_id(origin), 0)
+    return _HEADER.pack(short_id(group), short_id(origin), TYPED) + md5sum
+
+
+def is_typed(header: bytes) -> bool:
+    """
+    Whether the messages sent with the given header (see :py:func:`encode_header`) are
+    identified by an MD5 sum.
+
+    :param header:  (:obj:`bytes`): Encoded header.
+    :return:        Whether the header carries an MD5 sum.
+    :rtype:         bool
+    """
+    return bool(header[_HEADER.size - 1] & TYPED)
+
+
+@lru_cache(maxsize=256)
+def encode_string(value: str) -> bytes:
+    """
+    Encodes a string field of the compact envelope. Recently encoded strings are cached.
+
+    :param value:   (:obj:`str`):   String to encode.
+    :return:        Encoded string field.
+    :rtype:         :obj:`bytes`
+
+    :raises ValueError:     The string is too long for the compact envelope.
+    """
+    data = value.encode('utf-8')
+    if len(data) > MAX_STRING_LENGTH:
+        raise ValueError(f"String fields cannot be longer than {MAX_STRING_LENGTH} bytes.")
+    return _STRING_LENGTH.pack(len(data)) + data
+
+
+@lru_cache(maxsize=256)
+def encode_metadata(metadata: bytes, typed: bool) -> bytes:
+    """
+    Converts metadata encoded for the envelope of version 1 (see
+    :py:func:`codec.encode_string`) into a string field of the compact envelope.
+    The type of typed messages is dropped, their MD5 sum is in the header.
+
+    :param metadata:    (:obj:`bytes`): Metadata encoded for version 1.
+    :param typed:       (:obj:`bool`):  Whether the header carries an MD5 sum.
+    :return:            Encoded metadata.
+    :rtype:             :obj:`bytes`
+
+    :raises ValueError:     The metadata is too long for the compact envelope.
+    """
+    fields = json.loads(str(metadata[4:-1], 'utf-8'))
+    if typed:
+        fields.pop("msg_type", None)
+    return encode_string(json.dumps(fields, separators=(",", ":")) if fields else "")
+
+
+def is_compact(data: BytesLike) -> bool:
+    """
+    Whether a message uses the compact envelope.
+
+    :param data:    (:obj:`BytesLike`):     Encoded message.
+    :return:        Whether the message uses the compact envelope.
+    :rtype:         bool
+    """
+    return data[:len(FINGERPRINT)] == FINGERPRINT
+
+
+def decode_header(data: BytesLike, names: Dict[int, str]) \
+        -> Tuple[dt_communication_msg_t, int, Optional[str]]:
+    """
+    Compact counterpart of :py:func:`codec.decode_header`.
+
+    Identifiers are resolved using `names`, the field `group` of messages from unknown
+    groups is their identifier (e.g., `#1a2b3c4d`), the field `origin` of messages from
+    unknown hosts is `None`.
+
+    :param data:    (:obj:`BytesLike`):         Encoded message.
+    :param names:   (:obj:`Dict[int, str]`):    Known names, by identifier.
+    :return:        Partially decoded message, offset of the remaining fields and MD5 sum
+                    of the message definition (if any).
+    :rtype:         :obj:`(dt_communication_msg_t, int, Optional[str])`
+
+    :raises ValueError:     The given data is not a valid message.
+    """
+    try:
+        fingerprint, timestamp = _PREAMBLE.unpack_from(data, 0)
+        if fingerprint != FINGERPRINT:
+            raise ValueError("Decode error")
+        group, origin, flags = _HEADER.unpack_from(data, _PREAMBLE.size)
+        offset = _PREAMBLE.size + _HEADER.size
+        md5sum = None
+        if flags & TYPED:
+            md5sum = _MD5SUM.unpack_from(data, offset)[0].hex()
+            offset += _MD5SUM.size
+        end = offset + _STRING_LENGTH.size + _STRING_LENGTH.unpack_from(data, offset)[0]
+        destination = str(data[offset + _STRING_LENGTH.size:end], 'utf-8', 'replace')
+    except struct.error:
+        raise ValueError("Decode error")
+    # skip the (useless) default initialization of the fields
+    msg = dt_communication_msg_t.__new__(dt_communication_msg_t)
+    msg.timestamp = timestamp
+    msg.group = names.get(group) or f"#{group:08x}"
+    msg.origin = names.get(origin)
+    msg.destination = destination
+    return msg, end, md5sum
+
+
+def decode_body(data: BytesLike, msg: dt_communication_msg_t, offset: int) \
+        -> dt_communication_msg_t:
+    """
+    Compact counterpart of :py:func:`codec.decode_body`.
+
+    :param data:    (:obj:`BytesLike`):                 Encoded message.
+    :param msg:     (:obj:`dt_communication_msg_t`):    Partially decoded message.
+    :param offset:  (:obj:`int`):                       Offset returned by :py:func:`decode_header`.
+    :return:        Decoded message (same object as `msg`).
+    :rtype:         :obj:`dt_communication_msg_t`
+
+    :raises ValueError:     The given data is not a valid message.
+    """
+    unpack_length = _STRING_LENGTH.unpack_from
+    end = offset
+    try:
+        # metadata
+        offset = end + _STRING_LENGTH.size
+        end = offset + unpack_length(data, end)[0]
+        msg.metadata = str(data[offset:end], 'utf-8', 'replace')
+        # txt
+        offset = end + _STRING_LENGTH.size
+        end = offset + unpack_length(data, end)[0]
+        msg.txt = str(data[offset:end], 'utf-8', 'replace')
+        # payload
+        length = _PAYLOAD_LENGTH.unpack_from(data, end)[0]
+    except struct.error:
+        raise ValueError("Decode error")
+    offset = end + _PAYLOAD_LENGTH.size
+    if length < 0 or offset + length > len(data):
+        raise ValueError("Decode error")
+    msg.length = length
+    msg.payload = memoryview(data)[offset:offset + length]
+    return msg
+
+
+@lru_cache(maxsize=128)
+def decode_metadata(raw: str, md5sum: Optional[str]) -> dict:
+    """
+    Compact counterpart of :py:func:`header.decode_metadata`, the MD5 sum of typed
+    messages is added to the metadata (as `md5sum`).
+    The returned dictionary is shared and must not be modified.
+    """
+    metadata = json.loads(raw) if raw else {}
+    if md5sum is not None:
+        metadata["md5sum"] = md5sum
+    return metadata
+
+
+def probe(handlers: Dict[str, Any], group: str, duration: float) -> Dict[str, Set[str]]:
+    """
+    Asks the groups listening on the addresses of the given handlers to announce
+    themselves, and collects their names for the given time. All the addresses are probed
+    at once.
+
+    :param handlers:    (:obj:`dict`):      Handlers on the addresses to probe, by address
+                                            (``ip:port``).
+    :param group:       (:obj:`str`):       Name of the group probing.
+    :param duration:    (:obj:`float`):     Time (in seconds) spent listening.
+    :return:            The names of the groups announced, by address.
+    :rtype:             Dict[str, Set[str]]
+    """
+    groups = {address: set() for address in handlers}
+
+    def on_announcement(address: str, data: bytes):
+        try:
+            announcement = json.loads(data)
+            if not announcement.get("probe"):
+                name = str(announcement["group"])
+                # the traffic of other addresses can reach our sockets (e.g., LCM on Linux),
+                # peers tell where they live
+                address = str(announcement.get("address") or address)
+                if address in groups:
+                    groups[address].add(name)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # peers running older versions of this library do not announce their group
+            pass
+
+    subscriptions = []
+    try:
+        request = json.dumps(
+            {"process": PROCESS_ID, "host": HOSTNAME, "group": group, "probe": True})
+        for address, handler in handlers.items():
+            subscriptions.append((handler, handler.subscribe(
+                DTEnvelopeNegotiator.CHANNEL,
+                lambda _, data, address=address: on_announcement(address, data))))
+            handler.publish(DTEnvelopeNegotiator.CHANNEL, request.encode("utf-8"))
+        by_fd = {handler.fileno(): handler for handler in handlers.values()}
+        deadline = time.monotonic() + duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return groups
+            readable, _, _ = select.select(list(by_fd), [], [], remaining)
+            for fd in readable:
+                by_fd[fd].handle_timeout(0)
+    finally:
+        for handler, subscription in subscriptions:
+            handler.unsubscribe(subscription)
+
+
+class DTEnvelopeNegotiator(object):
+    """
+    Announces the envelope versions this group understands, learns the hostnames of the
+    peers and decides which envelope the publishers of the group use.
+    See :py:mod:`dt_communication_utils.envelope`.
+
+    Args:
+        options     (:obj:`DTEnvelopeOptions`): envelope options of the group
+        handler     (:obj:`lcm.LCM`): the LCM handler of the group
+        logger      (:obj:`logging.Logger`): the logger of the group
+        lock        (:obj:`threading.RLock`): lock held while messages are being delivered
+        group       (:obj:`str`): the name of the group
+        on_collision    (:obj:`Callable`): called with the name of the other groups announced
+                        on our address
+        address     (:obj:`str`): the address of the group (``ip:port``), see :py:func:`probe`
+        timers      (:obj:`DTCommunicationMailman`): runs the announcements, defaults to the
+                    mailman
+
+    :meta private:
+    """
+
+    CHANNEL = "/__envelope__"
+    VERSION = 2
+    ANNOUNCE_PERIOD = 1.0
+    PEER_TIMEOUT = 3.5
+    # the compact envelope is not used until discovery has settled
+    SETTLE_TIME = 1.0
+
+    def __init__(self, options: DTEnvelopeOptions, handler, logger: logging.Logger,
+                 lock: threading.RLock, group: str = "",
+                 on_collision: Callable[[str], None] = None, address: str = "",
+                 timers: DTCommunicationMailman = None):
+        self._options = options
+        self._address = address
+        self._timers = timers or DTCommunicationMailman.get_instance()
+        self._group = group
+        self._on_collision = on_collision
+        self._handler = handler
+        self._logger = logger
+        self._delivery_lock = lock
+        self._lock = threading.Lock()
+        # identifier -> name, of the hosts and groups we know
+        self._names: Dict[int, str] = {short_id(HOSTNAME): HOSTNAME}
+        # peers (by process) and hosts that announced themselves -> last seen
+        self._peers: Dict[str, float] = {}
+        self._hosts: Dict[str, float] = {HOSTNAME: float("inf")}
+        # hosts sending messages of version 1 without announcing themselves -> last seen
+        self._legacy: Dict[str, float] = {}
+        # peers (by process) -> compression codecs they decode
+        self._peer_codecs: Dict[str, FrozenSet[str]] = {}
+        self._codecs: FrozenSet[str] = frozenset()
+        # topic -> (group, LCM subscription), see watch()
+        self._watched: Dict[str, Tuple[str, Any]] = {}
+        self._started = time.monotonic()
+        self._compact = False
+        self._active = False
+        self._timer = None
+        self._is_shutdown = False
+        # ---
+        # we always answer the probes and listen to the peers negotiating with us
+        with self._delivery_lock:
+            self._subscription = handler.subscribe(self.CHANNEL, self._on_announcement)
+        if options.version >= 2:
+            self.activate()
+
+    @property
+    def options(self) -> DTEnvelopeOptions:
+        """
+        Envelope options of the group.
+
+        :return: Envelope options.
+        :rtype:  DTEnvelopeOptions
+        """
+        return self._options
+
+    @property
+    def names(self) -> Dict[int, str]:
+        """
+        Names of the hosts and groups we know, by identifier (see :py:func:`short_id`).
+        The dictionary is updated in place.
+
+        :return: Known names.
+        :rtype:  Dict[int, str]
+        """
+        return self._names
+
+    @property
+    def compact(self) -> bool:
+        """
+        Whether publishers should use the compact envelope.
+
+        :return: Whether publishers should use the compact envelope.
+        :rtype:  bool
+        """
+        return self._compact
+
+    @property
+    def codecs(self) -> FrozenSet[str]:
+        """
+        Compression codecs every peer can decode, none until discovery has settled or while
+        a peer that does not announce them is around.
+
+        :return: Codecs.
+        :rtype:  FrozenSet[str]
+        """
+        return self._codecs
+
+    @property
+    def version(self) -> int:
+        """
+        Envelope version the publishers use right now.
+
+        :return: Envelope version.
+        :rtype:  int
+        """
+        return 2 if self._compact else 1
+
+    def watch(self, topic: str, group: str, compressed: bool = False):
+        """
+        Watches the messages of version 1 sent by the other members of the given group on
+        a topic we publish on, they reveal the peers running older versions of this
+        library. Only used when the publishers are allowed to use the compact envelope or
+        compress their payloads, whatever the envelope version.
+
+        :param topic:       (:obj:`str`):   Topic.
+        :param group:       (:obj:`str`):   Name of the group (or subgroup) publishing on it.
+        :param compressed:  (:obj:`bool`):  Whether the publisher compresses its payloads.
+        """
+        if self._options.version < 2 and not compressed:
+            return
+        self.activate()
+        with self._delivery_lock:
+            if topic in self._watched:
+                return
+            self._watched[topic] = (group, self._handler.subscribe(topic, self._on_message))
+
+    def activate(self):
+        """
+        Starts announcing this group periodically, i.e., takes part in the negotiation of
+        the envelope and of the compression codecs. Groups that neither allow the compact
+        envelope nor compress stay silent (they only answer probes) until a peer of the
+        group negotiates with them.
+        """
+        with self._lock:
+            if self._active or self._is_shutdown:
+                return
+            self._active = True
+            # discovery starts now
+            self._started = time.monotonic()
+        # the mailman's lock is taken, not while holding ours
+        timer = self._timers.every(self.ANNOUNCE_PERIOD, self._tick)
+        self._timer = timer
+        if self._is_shutdown:
+            self._timers.cancel(timer)
+            return
+        self.announce()
+
+    def announce(self):
+        """
+        Tells the other members of the group about us.
+        """
+        announcement = {"process": PROCESS_ID, "host": HOSTNAME, "version": self.VERSION,
+                        "codecs": sorted(CODECS), "group": self._group,
+                        "address": self._address}
+        self._handler.publish(self.CHANNEL, json.dumps(announcement).encode("utf-8"))
+
+    def close(self):
+        """
+        Stops announcing.
+        """
+        self._is_shutdown = True
+        if self._timer is not None:
+            self._timers.cancel(self._timer)
+        with self._delivery_lock:
+            self._handler.unsubscribe(self._subscription)
+            for _, subscription in self._watched.values():
+                self._handler.unsubscribe(subscription)
+            self._watched.clear()
+
+    def _on_announcement(self, _: str, data: bytes):
+        try:
+            announcement = json.loads(data)
+            process, host = announcement["process"], announcement["host"]
+            # groups probing the address want to hear from us, whoever they are
+            if announcement.get("probe"):
+                if not self._is_shutdown:
+                    self.announce()
+                return
+            version = int(announcement["version"])
+            # peers running older versions of this library do not announce their codecs
+            # nor their group
+            codecs = frozenset(str(name) for name in announcement.get("codecs", ()))
+            group = announcement.get("group", self._group)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._logger.warning("Received invalid envelope announcement. Ignoring it.")
+            return
+        if self._is_shutdown:
+            return
+        # other groups sharing our address are not our peers
+        if group != self._group:
+            if self._on_collision is not None:
+                self._on_collision(str(group))
+            return
+        # we know about ourselves already
+        if process == PROCESS_ID:
+            return
+        now = time.monotonic()
+        with self._lock:
+            new = process not in self._peers
+            self._peers[process] = now
+            self._peer_codecs[process] = codecs
+            self._names[short_id(host)] = host
+            if version >= 2:
+                self._hosts[host] = now
+                self._legacy.pop(host, None)
+            else:
+                self._legacy[host] = now
+            self._update()
+        # a peer negotiating with us, take part
+        if not self._active:
+            self.activate()
+        # help newcomers learn our hostname quickly
+        elif new:
+            self.announce()
+
+    def _on_message(self, topic: str, data: BytesLike):
+        if is_compact(data):
+            return
+        try:
+            msg, _ = codec.decode_header(data)
+        except ValueError:
+            return
+        watched = self._watched.get(topic)
+        # messages of other groups sharing our address do not count
+        if watched is None or watched[0] != msg.group or msg.origin in self._hosts:
+            return
+        with self._lock:
+            if msg.origin not in self._legacy:
+                self._logger.info(f"The host `{msg.origin}` runs an older version of this "
+                                  f"library, falling back to envelope version 1 without "
+                                  f"compression.")
+            self._legacy[msg.origin] = time.monotonic()
+            self._update()
+
+    def _update(self):
+        # decides which envelope to use, the caller holds the lock
+        now = time.monotonic()
+        for host, last_seen in list(self._legacy.items()):
+            if now - last_seen > self.PEER_TIMEOUT:
+                del self._legacy[host]
+        settled = now - self._started >= self.SETTLE_TIME
+        compact = self._options.version >= 2 and not self._legacy and settled
+        if compact != self._compact:
+            self._logger.debug(f"Using envelope version {2 if compact else 1}.")
+            self._compact = compact
+        codecs = frozenset()
+        if settled and not self._legacy:
+            codecs = frozenset(CODECS).intersection(*self._peer_codecs.values())
+        if codecs != self._codecs:
+            self._logger.debug(f"Compressing with the codecs {sorted(codecs)}.")
+            self._codecs = codecs
+
+    def _tick(self):
+        now = time.monotonic()
+        with self._lock:
+            for process, last_seen in list(self._peers.items()):
+                if now - last_seen > self.PEER_TIMEOUT:
+                    del self._peers[process]
+                    self._peer_codecs.pop(process, None)
+            for host, last_seen in list(self._hosts.items()):
+                if now - last_seen > self.PEER_TIMEOUT:
+                    del self._hosts[host]
+            self._update()
+        self.announce()
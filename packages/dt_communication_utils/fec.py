@@ -0,0 +1,307 @@
+"""
+Forward error correction (FEC) for lossy multicast links.
+
+Publishers with FEC enabled number the messages they send and, every `block_size`
+messages, send a parity message containing the XOR of the (encoded) messages of the block.
+Receivers keep the messages of the most recent blocks and rebuild a lost message as soon
+as all the other messages of its block and the parity message are received, without any
+round trip.
+
+XOR parity rebuilds at most one message per block, losses on WiFi come in bursts, so
+blocks can be interleaved: with `interleave=D`, consecutive messages belong to D different
+blocks and bursts of up to D lost messages can be recovered.
+
+Receivers always decode FEC, it only needs to be enabled on the publishers.
+"""
+
+import random
+import struct
+import threading
+import dataclasses
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Hashable, Dict
+
+from .codec import BytesLike
+
+# metadata of the messages protected by FEC and of the parity messages
+FEC_DATA = {"fec": "data"}
+FEC_PARITY = {"fec": "parity"}
+
+# stream id, sequence number, block size, interleave
+_DATA = struct.Struct(">IIBB")
+# stream id, block id, block size, interleave, XOR of the messages' lengths
+_PARITY = struct.Struct(">IIBBI")
+
+
+@dataclass
+class DTFecOptions(object):
+    """
+    Configures the forward error correction of the messages sent by a group.
+
+    Parameters
+
+    - block_size:   (:obj:`int`): number of messages protected by each parity message,
+                    smaller blocks recover more losses at the cost of more traffic
+    - interleave:   (:obj:`int`): number of interleaved blocks, i.e., longest burst of lost
+                    messages that can be recovered
+    """
+    block_size: int = 4
+    interleave: int = 1
+
+    def __post_init__(self):
+        if not 2 <= self.block_size <= 255:
+            raise ValueError(f"Field `block_size` must be an integer between 2 and 255, "
+                             f"got {self.block_size} instead.")
+        if not 1 <= self.interleave <= 255:
+            raise ValueError(f"Field `interleave` must be an integer between 1 and 255, "
+                             f"got {self.interleave} instead.")
+
+
+@dataclass
+class DTFecStats(object):
+    """
+    Forward error correction statistics of a group.
+
+    Parameters
+
+    - data_sent:        (:obj:`int`): messages sent with FEC protection
+    - parity_sent:      (:obj:`int`): parity messages sent
+    - parity_received:  (:obj:`int`): parity messages received
+    - recovered:        (:obj:`int`): lost messages rebuilt from the parity
+    - unrecoverable:    (:obj:`int`): lost messages that could not be rebuilt
+    """
+    data_sent: int = 0
+    parity_sent: int = 0
+    parity_received: int = 0
+    recovered: int = 0
+    unrecoverable: int = 0
+
+
+def _block_of(seq: int, k: int, d: int) -> int:
+    return (seq // (k * d)) * d + seq % d
+
+
+def _members_of(block: int, k: int, d: int) -> List[int]:
+    base = (block // d) * k * d + block % d
+    return [base + i * d for i in range(k)]
+
+
+class _DTFecBlock(object):
+
+    __slots__ = ("size", "messages", "parity", "done")
+
+    def __init__(self, size: int):
+        self.size = size
+        # sequence number -> encoded message
+        self.messages: Dict[int, bytes] = {}
+        # (XOR of the lengths, XOR of the messages)
+        self.parity: Optional[Tuple[int, bytes]] = None
+        self.done = False
+
+
+class DTFecEncoder(object):
+    """
+    Numbers the messages sent by a publisher and computes the parity messages.
+
+    :meta private:
+    """
+
+    def __init__(self, fec: 'DTFec'):
+        self._fec = fec
+        self._options = fec.options
+        self._stream = random.getrandbits(32)
+        self._seq = 0
+        self._lock = threading.Lock()
+        # block id -> (count, XOR of the lengths, XOR of the messages, longest message)
+        self._blocks: Dict[int, List[int]] = {}
+
+    def header(self) -> Tuple[int, bytes]:
+        """
+        Reserves a sequence number for the next message.
+
+        :return:    The sequence number and the header to prepend to the payload.
+        :rtype:     Tuple[int, bytes]
+        """
+        with self._lock:
+            seq = self._seq
+            self._seq = (seq + 1) & 0xFFFFFFFF
+        return seq, _DATA.pack(self._stream, seq, self._options.block_size,
+                               self._options.interleave)
+
+    def add(self, seq: int, message: bytes) -> Optional[bytes]:
+        """
+        Adds a sent message to its block.
+
+        :param seq:     (:obj:`int`):   Sequence number of the message.
+        :param message: (:obj:`bytes`): Encoded message, as sent.
+        :return:        The payload of the parity message to send, if the block is complete.
+        :rtype:         Optional[bytes]
+        """
+        k, d = self._options.block_size, self._options.interleave
+        block = _block_of(seq, k, d)
+        value = int.from_bytes(message, "little")
+        with self._lock:
+            state = self._blocks.setdefault(block, [0, 0, 0, 0])
+            state[0] += 1
+            state[1] ^= len(message)
+            state[2] ^= value
+            state[3] = max(state[3], len(message))
+            if state[0] < k:
+                parity = None
+            else:
+                del self._blocks[block]
+                parity = _PARITY.pack(self._stream, block, k, d, state[1]) + \
+                    state[2].to_bytes(state[3], "little")
+        self._fec.on_sent(parity is not None)
+        return parity
+
+
+class DTFec(object):
+    """
+    Forward error correction of a group: creates the publishers' encoders and rebuilds the
+    lost messages on the receiving side.
+
+    Args:
+        options     (:obj:`DTFecOptions`): FEC options, `None` disables FEC on the
+                    sending side
+
+    :meta private:
+    """
+
+    # streams (i.e., remote publishers) tracked at the same time
+    MAX_STREAMS = 64
+
+    def __init__(self, options: Optional[DTFecOptions]):
+        self._options = options
+        self._stats = DTFecStats()
+        self._lock = threading.Lock()
+        # (key, stream) -> (newest block, {block id -> block})
+        self._streams: OrderedDict = OrderedDict()
+
+    @property
+    def options(self) -> Optional[DTFecOptions]:
+        return self._options
+
+    @property
+    def stats(self) -> DTFecStats:
+        """
+        A snapshot of the FEC statistics.
+
+        :return: FEC statistics.
+        :rtype:  DTFecStats
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def encoder(self) -> Optional[DTFecEncoder]:
+        """
+        Creates an encoder for a new publisher.
+
+        :return:    An encoder, `None` if FEC is disabled.
+        :rtype:     Optional[DTFecEncoder]
+        """
+        return None if self._options is None else DTFecEncoder(self)
+
+    def on_sent(self, parity: bool):
+        with self._lock:
+            self._stats.data_sent += 1
+            self._stats.parity_sent += int(parity)
+
+    @staticmethod
+    def strip(payload: BytesLike) -> BytesLike:
+        """
+        Removes the FEC header from the payload of a data message.
+
+        :param payload: (:obj:`BytesLike`): Payload of a data message.
+        :return:        The original payload.
+        :rtype:         BytesLike
+        """
+        return memoryview(payload)[_DATA.size:]
+
+    def receive(self, key: Hashable, message: bytes, payload: BytesLike, parity: bool) \
+            -> Tuple[Optional[BytesLike], List[bytes]]:
+        """
+        Processes a message protected by FEC (or a parity message).
+
+        :param key:     (:obj:`Hashable`):  Identifies the sender (e.g., topic and origin).
+        :param message: (:obj:`bytes`):     The whole encoded message, as received.
+        :param payload: (:obj:`BytesLike`): Payload of the message.
+        :param parity:  (:obj:`bool`):      Whether this is a parity message.
+        :return:        The original payload (`None` for parity messages, duplicates and
+                        invalid messages), and the encoded messages rebuilt thanks to this
+                        one.
+        :rtype:         Tuple[Optional[BytesLike], List[bytes]]
+        """
+        header = _PARITY if parity else _DATA
+        try:
+            fields = header.unpack_from(payload)
+        except struct.error:
+            return None, []
+        stream, number, k, d = fields[:4]
+        if k < 2 or d < 1:
+            return None, []
+        block_id = number if parity else _block_of(number, k, d)
+        with self._lock:
+            block = self._block((key, stream), block_id, k, d)
+            if block is None:
+                return None, []
+            if parity:
+                self._stats.parity_received += 1
+                block.parity = (fields[4], bytes(memoryview(payload)[_PARITY.size:]))
+            elif number in block.messages:
+                # we rebuilt this message already
+                return None, []
+            else:
+                block.messages[number] = bytes(message)
+            recovered = self._recover(block, block_id, k, d)
+        return (None if parity else self.strip(payload)), recovered
+
+    def _block(self, stream: Hashable, block_id: int, k: int, d: int) -> Optional[_DTFecBlock]:
+        newest, blocks = self._streams.get(stream, (block_id, None))
+        if blocks is None:
+            blocks = {}
+            # forget the least recently active stream
+            if len(self._streams) >= self.MAX_STREAMS:
+                _, (_, evicted) = self._streams.popitem(last=False)
+                for old in evicted.values():
+                    self._finalize(old)
+        self._streams[stream] = (max(newest, block_id), blocks)
+        self._streams.move_to_end(stream)
+        # blocks that are too old are given up on
+        oldest = max(newest, block_id) - 2 * d
+        if block_id < oldest:
+            return None
+        for old_id in [b for b in blocks if b < oldest]:
+            self._finalize(blocks.pop(old_id))
+        block = blocks.get(block_id)
+        if block is None:
+            block = blocks[block_id] = _DTFecBlock(k)
+        return block if block.size == k else None
+
+    def _recover(self, block: _DTFecBlock, block_id: int, k: int, d: int) -> List[bytes]:
+        if block.done:
+            return []
+        if len(block.messages) == k:
+            block.done = True
+            return []
+        if block.parity is None or len(block.messages) != k - 1:
+            return []
+        # rebuild the only message missing
+        length, value = block.parity
+        length_value = int.from_bytes(value, "little")
+        for message in block.messages.values():
+            length ^= len(message)
+            length_value ^= int.from_bytes(message, "little")
+        missing = next(s for s in _members_of(block_id, k, d) if s not in block.messages)
+        if length > len(value):
+            return []
+        message = length_value.to_bytes(len(value), "little")[:length]
+        block.messages[missing] = message
+        block.done = True
+        self._stats.recovered += 1
+        return [message]
+
+    def _finalize(self, block: _DTFecBlock):
+        if not block.done:
+            self._stats.unrecoverable += block.size - len(block.messages)
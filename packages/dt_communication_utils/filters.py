@@ -0,0 +1,72 @@
+import time
+from typing import Callable, Iterable
+
+from .header import DTCommunicationMessageHeader
+
+DTCommunicationFilter = Callable[[DTCommunicationMessageHeader], bool]
+
+
+def from_origins(origins: Iterable[str]) -> DTCommunicationFilter:
+    """
+    Accepts only messages sent by the given hosts.
+
+    :param origins:     (:obj:`Iterable[str]`): Hostnames of the allowed origins.
+    :return:            A filter to pass to a Subscriber.
+    :rtype:             :obj:`Callable`
+    """
+    origins = frozenset(origins)
+
+    def _filter(header: DTCommunicationMessageHeader) -> bool:
+        return header.origin in origins
+
+    return _filter
+
+
+def not_from_origins(origins: Iterable[str]) -> DTCommunicationFilter:
+    """
+    Rejects messages sent by the given hosts.
+
+    :param origins:     (:obj:`Iterable[str]`): Hostnames of the rejected origins.
+    :return:            A filter to pass to a Subscriber.
+    :rtype:             :obj:`Callable`
+    """
+    origins = frozenset(origins)
+
+    def _filter(header: DTCommunicationMessageHeader) -> bool:
+        return header.origin not in origins
+
+    return _filter
+
+
+def newer_than(timestamp: int) -> DTCommunicationFilter:
+    """
+    Accepts only messages generated after the given time.
+
+    :param timestamp:   (:obj:`int`):   Minimum timestamp (in microseconds) of the messages.
+    :return:            A filter to pass to a Subscriber.
+    :rtype:             :obj:`Callable`
+    """
+
+    def _filter(header: DTCommunicationMessageHeader) -> bool:
+        return header.timestamp is not None and header.timestamp >= timestamp
+
+    return _filter
+
+
+def max_age(seconds: float) -> DTCommunicationFilter:
+    """
+    Accepts only messages generated at most `seconds` seconds ago.
+
+    NOTE: This relies on the clocks of the machines within the group being synchronized.
+
+    :param seconds:     (:obj:`float`): Maximum age of the messages in seconds.
+    :return:            A filter to pass to a Subscriber.
+    :rtype:             :obj:`Callable`
+    """
+    max_age_us = int(seconds * 1e6)
+
+    def _filter(header: DTCommunicationMessageHeader) -> bool:
+        return header.timestamp is not None and \
+            (time.time_ns() // 1000) - header.timestamp <= max_age_us
+
+    return _filter
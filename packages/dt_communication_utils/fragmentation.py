@@ -0,0 +1,287 @@
+"""
+Application-level fragmentation of large payloads.
+
+LCM fragments large messages on its own, but a message is lost as soon as one of its
+fragments is, and nobody is told about it. When a fragment size is configured, publishers
+split large payloads into chunks sent as independent messages, each chunk starts with a
+small header (message id, offset, total size, chunk index and number of chunks).
+Receivers reassemble the chunks in bounded memory, incomplete messages are dropped after
+a timeout or evicted when too many of them are pending.
+
+Receivers always reassemble, fragmentation only needs to be enabled on the publishers.
+"""
+
+import time
+import random
+import struct
+import itertools
+import threading
+import dataclasses
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, List, Tuple, Hashable
+
+from .codec import BytesLike
+
+# metadata of the messages carrying a fragment
+FRAGMENT = {"frag": 1}
+
+# message id, offset, total size, chunk index, number of chunks
+_HEADER = struct.Struct(">QIIHH")
+
+
+@dataclass
+class DTFragmentationOptions(object):
+    """
+    Configures how large payloads are fragmented and reassembled.
+
+    Parameters
+
+    - fragment_size:        (:obj:`int`): maximum number of payload bytes carried by each
+                            fragment, larger payloads are split. `None` (default) leaves
+                            fragmentation to LCM. Keep it below the MTU of your links minus
+                            the size of the message header (about 200 bytes).
+    - timeout:              (:obj:`float`): incomplete messages are dropped after `timeout`
+                            seconds
+    - max_pending:          (:obj:`int`): maximum number of messages being reassembled
+    - max_pending_bytes:    (:obj:`int`): maximum amount of memory used by the messages being
+                            reassembled, the oldest ones are evicted to make room
+    """
+    fragment_size: Optional[int] = None
+    timeout: float = 1.0
+    max_pending: int = 16
+    max_pending_bytes: int = 32 * 1024 * 1024
+
+    def __post_init__(self):
+        if self.fragment_size is not None and self.fragment_size < 1:
+            raise ValueError(f"Field `fragment_size` must be a positive integer, "
+                             f"got {self.fragment_size} instead.")
+        if self.timeout <= 0:
+            raise ValueError(f"Field `timeout` must be a positive number, "
+                             f"got {self.timeout} instead.")
+        if self.max_pending < 1:
+            raise ValueError(f"Field `max_pending` must be a positive integer, "
+                             f"got {self.max_pending} instead.")
+        if self.max_pending_bytes < 1:
+            raise ValueError(f"Field `max_pending_bytes` must be a positive integer, "
+                             f"got {self.max_pending_bytes} instead.")
+
+
+@dataclass
+class DTFragmentationStats(object):
+    """
+    Fragmentation statistics of a group.
+
+    Parameters
+
+    - messages_fragmented:  (:obj:`int`): messages split into fragments
+    - fragments_sent:       (:obj:`int`): fragments published
+    - fragments_received:   (:obj:`int`): fragments received
+    - messages_reassembled: (:obj:`int`): messages successfully reassembled
+    - incomplete:           (:obj:`int`): messages currently waiting for fragments
+    - dropped_timeout:      (:obj:`int`): incomplete messages dropped after the timeout
+    - dropped_evicted:      (:obj:`int`): incomplete messages evicted to make room
+    - dropped_invalid:      (:obj:`int`): fragments dropped because malformed or too large
+    - duplicates:           (:obj:`int`): fragments received more than once
+    """
+    messages_fragmented: int = 0
+    fragments_sent: int = 0
+    fragments_received: int = 0
+    messages_reassembled: int = 0
+    incomplete: int = 0
+    dropped_timeout: int = 0
+    dropped_evicted: int = 0
+    dropped_invalid: int = 0
+    duplicates: int = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.dropped_timeout + self.dropped_evicted
+
+
+class _DTPendingMessage(object):
+
+    __slots__ = ("buffer", "count", "fragment_size", "received", "started")
+
+    def __init__(self, size: int, count: int, fragment_size: int):
+        self.buffer = bytearray(size)
+        self.count = count
+        self.fragment_size = fragment_size
+        self.received = set()
+        self.started = time.monotonic()
+
+
+def _fragment_size(offset: int, size: int, index: int, count: int, length: int) \
+        -> Optional[int]:
+    """
+    Infers the fragment size used by the sender from a fragment and checks that the
+    fragment is consistent with it, i.e., it starts at `index * fragment_size`, it ends
+    within the message and the message is split in `count` fragments.
+
+    :param offset:  (:obj:`int`):   Offset of the fragment in the message.
+    :param size:    (:obj:`int`):   Size of the whole message.
+    :param index:   (:obj:`int`):   Index of the fragment.
+    :param count:   (:obj:`int`):   Number of fragments.
+    :param length:  (:obj:`int`):   Length of the fragment.
+    :return:        The fragment size, `None` if the fragment is not valid.
+    :rtype:         Optional[int]
+    """
+    if index >= count or length < 1 or offset + length > size:
+        return None
+    if index < count - 1:
+        # all fragments but the last one are exactly one fragment size long
+        fragment_size = length
+    else:
+        # the last one ends the message and can be shorter
+        if offset + length != size:
+            return None
+        if index == 0:
+            fragment_size = length
+        elif offset % index == 0 and length <= offset // index:
+            fragment_size = offset // index
+        else:
+            return None
+    if offset != index * fragment_size or \
+            (size + fragment_size - 1) // fragment_size != count:
+        return None
+    return fragment_size
+
+
+class DTFragmentation(object):
+    """
+    Splits outgoing payloads and reassembles incoming ones.
+
+    Args:
+        options     (:obj:`DTFragmentationOptions`): fragmentation options
+
+    :meta private:
+    """
+
+    def __init__(self, options: DTFragmentationOptions):
+        self._options = options
+        self._stats = DTFragmentationStats()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(random.getrandbits(63))
+        # (key, message id) -> pending message, oldest first
+        self._pending: OrderedDict = OrderedDict()
+        self._pending_bytes = 0
+
+    @property
+    def options(self) -> DTFragmentationOptions:
+        return self._options
+
+    @property
+    def stats(self) -> DTFragmentationStats:
+        """
+        A snapshot of the fragmentation statistics.
+
+        :return: Fragmentation statistics.
+        :rtype:  DTFragmentationStats
+        """
+        with self._lock:
+            self._expire()
+            return dataclasses.replace(self._stats, incomplete=len(self._pending))
+
+    def needs_splitting(self, size: int) -> bool:
+        """
+        Whether a payload of the given size is sent in fragments.
+
+        :param size:    (:obj:`int`):   Size of the payload in bytes.
+        :return:        Whether the payload is sent in fragments.
+        :rtype:         bool
+        """
+        chunk = self._options.fragment_size
+        return chunk is not None and size > chunk
+
+    def split(self, data: bytes) -> Optional[List[Tuple[bytes, memoryview]]]:
+        """
+        Splits a payload into fragments.
+
+        :param data:    (:obj:`bytes`): Payload.
+        :return:        The fragments as (header, chunk) pairs, `None` if the payload does
+                        not need to be fragmented.
+        :rtype:         Optional[List[Tuple[bytes, memoryview]]]
+
+        :raises ValueError: The payload is too large to be fragmented.
+        """
+        chunk = self._options.fragment_size
+        size = len(data)
+        if not self.needs_splitting(size):
+            return None
+        count = (size + chunk - 1) // chunk
+        if count > 0xFFFF:
+            raise ValueError(f"Cannot split a payload of {size} bytes in fragments of "
+                             f"{chunk} bytes, too many fragments.")
+        view = memoryview(data)
+        with self._lock:
+            msg_id = next(self._ids) & 0xFFFFFFFFFFFFFFFF
+            self._stats.messages_fragmented += 1
+            self._stats.fragments_sent += count
+        return [
+            (_HEADER.pack(msg_id, offset, size, i, count), view[offset:offset + chunk])
+            for i, offset in enumerate(range(0, size, chunk))
+        ]
+
+    def reassemble(self, key: Hashable, fragment: BytesLike) -> Optional[bytearray]:
+        """
+        Adds a fragment to the message it belongs to.
+
+        :param key:         (:obj:`Hashable`):  Identifies the sender (e.g., topic and origin).
+        :param fragment:    (:obj:`BytesLike`): Fragment (header included).
+        :return:            The whole payload if this was the last missing fragment.
+        :rtype:             Optional[bytearray]
+        """
+        with self._lock:
+            self._stats.fragments_received += 1
+            try:
+                msg_id, offset, size, index, count = _HEADER.unpack_from(fragment)
+            except struct.error:
+                self._stats.dropped_invalid += 1
+                return None
+            chunk = memoryview(fragment)[_HEADER.size:]
+            end = offset + chunk.nbytes
+            fragment_size = _fragment_size(offset, size, index, count, chunk.nbytes)
+            if fragment_size is None or size > self._options.max_pending_bytes:
+                self._stats.dropped_invalid += 1
+                return None
+            self._expire()
+            key = (key, msg_id)
+            pending = self._pending.get(key)
+            if pending is None:
+                self._make_room(size)
+                pending = self._pending[key] = _DTPendingMessage(size, count, fragment_size)
+                self._pending_bytes += size
+            elif len(pending.buffer) != size or pending.count != count or \
+                    pending.fragment_size != fragment_size:
+                self._stats.dropped_invalid += 1
+                return None
+            if index in pending.received:
+                self._stats.duplicates += 1
+                return None
+            pending.buffer[offset:end] = chunk
+            pending.received.add(index)
+            if len(pending.received) < pending.count:
+                return None
+            # this was the last one
+            self._drop(key)
+            self._stats.messages_reassembled += 1
+            return pending.buffer
+
+    def _expire(self):
+        deadline = time.monotonic() - self._options.timeout
+        while self._pending:
+            key, pending = next(iter(self._pending.items()))
+            if pending.started > deadline:
+                break
+            self._drop(key)
+            self._stats.dropped_timeout += 1
+
+    def _make_room(self, size: int):
+        while self._pending and (len(self._pending) >= self._options.max_pending or
+                                 self._pending_bytes + size > self._options.max_pending_bytes):
+            self._drop(next(iter(self._pending)))
+            self._stats.dropped_evicted += 1
+
+    def _drop(self, key: Hashable):
+        pending = self._pending.pop(key)
+        self._pending_bytes -= len(pending.buffer)
@@ -0,0 +1,39 @@
+import json
+from functools import lru_cache
+from typing import Optional
+from dataclasses import dataclass
+
+from .constants import HOSTNAME
+
+
+@dataclass
+class DTCommunicationMessageHeader(object):
+    """
+    Models the header of a Communication Group Message.
+
+    Parameters
+
+    - timestamp:      (:obj:`int`): the timestamp the message was generated in microseconds
+    - origin:         (:obj:`str`): the hostname of the origin machine
+    - destination:    (:obj:`str`): the hostname of the destination machine
+    - txt:            (:obj:`str`): extra data encoded as JSON attached to the message
+    """
+    timestamp: Optional[int]
+    origin: str
+    destination: Optional[str]
+    txt: Optional[str]
+
+    def i_sent_this(self):
+        return self.origin == HOSTNAME
+
+
+@lru_cache(maxsize=128)
+def decode_metadata(raw: str) -> dict:
+    """
+    Decodes (and interns) the metadata of an incoming message.
+
+    Messages coming from the same group share the same metadata string, decoding
+    it once saves a ``json.loads`` per message.
+    The returned dictionary is shared and must not be modified.
+    """
+    return json.loads(raw)
@@ -0,0 +1,166 @@
+"""
+Lazy decoding of ROS messages.
+
+Groups created with ``lazy=True`` do not deserialize the incoming messages, callbacks
+receive a :py:class:`DTLazyMessage` instead, a proxy that deserializes the message the
+first time one of its fields is accessed. Callbacks that only look at the header, or
+forward the message as is, never pay for the deserialization:
+
+.. code-block:: python
+
+    def callback(msg, header):
+        if header.origin != 'autobot01':
+            return
+        # the message is deserialized here
+        print(msg.data)
+
+    # forwarded without being serialized again
+    group.Subscriber(lambda msg, header: other.Publisher().publish(msg))
+
+Messages whose fields include arrays of numbers can be deserialized into NumPy arrays
+(``numpy=True``), which is much faster than building tuples of Python numbers.
+"""
+
+import copy
+from typing import Optional, Type, Any
+
+from genpy import Message as GenericROSMessage
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# ROS types deserialized into numpy arrays by `deserialize_numpy`
+# (uint8[] and char[] are deserialized into bytes anyway)
+_NUMERIC_TYPES = {"int8", "uint16", "int16", "uint32", "int32", "uint64", "int64",
+                  "float32", "float64"}
+
+
+def is_array_heavy(msg_type: Type[GenericROSMessage]) -> bool:
+    """
+    Whether a message type has fields that are arrays of numbers.
+
+    :param msg_type:    (:obj:`GenericROSMessage`): Message type.
+    :return:            Whether `deserialize_numpy` makes a difference for this type.
+    :rtype:             bool
+
+    :meta private:
+    """
+    for slot_type in getattr(msg_type, "_slot_types", []):
+        if "[" in slot_type and slot_type.split("[", 1)[0] in _NUMERIC_TYPES:
+            return True
+    return False
+
+
+def deserialize(msg_type: Type[GenericROSMessage], data: bytes,
+                use_numpy: bool = False) -> GenericROSMessage:
+    """
+    Deserializes a ROS message, into numpy arrays when asked to and possible.
+
+    :param msg_type:    (:obj:`GenericROSMessage`): Message type.
+    :param data:        (:obj:`bytes`):             Serialized message.
+    :param use_numpy:   (:obj:`bool`):              Use `deserialize_numpy` (when available).
+    :return:            Deserialized message.
+    :rtype:             GenericROSMessage
+
+    :meta private:
+    """
+    msg = msg_type()
+    if use_numpy and numpy is not None and hasattr(msg, "deserialize_numpy"):
+        msg.deserialize_numpy(data, numpy)
+    else:
+        msg.deserialize(data)
+    return msg
+
+
+class DTLazyMessage(object):
+    """
+    Proxy to a ROS message that is deserialized the first time one of its fields is
+    accessed. See :py:mod:`dt_communication_utils.lazy`.
+
+    The proxy behaves like the message it wraps, ``isinstance(proxy, MsgClass)`` is `True`.
+    Publishing a proxy that was never deserialized sends the serialized bytes as they were
+    received, once deserialized the message is serialized again (as it might have changed).
+
+    Args:
+        msg_type    (:obj:`GenericROSMessage`): type of the message
+        data        (:obj:`bytes`): serialized message
+        use_numpy   (:obj:`bool`): deserialize arrays of numbers into numpy arrays
+    """
+
+    __slots__ = ("_msg_type", "_data", "_use_numpy", "_message")
+
+    def __init__(self, msg_type: Type[GenericROSMessage], data: bytes, use_numpy: bool = False):
+        object.__setattr__(self, "_msg_type", msg_type)
+        object.__setattr__(self, "_data", data)
+        object.__setattr__(self, "_use_numpy", use_numpy)
+        object.__setattr__(self, "_message", None)
+
+    @property
+    def __class__(self) -> type:
+        # makes isinstance() see the type of the message
+        return self._msg_type
+
+    @property
+    def raw(self) -> bytes:
+        """
+        The serialized message, as received.
+
+        :return: Serialized message.
+        :rtype:  bytes
+        """
+        return self._data
+
+    @property
+    def is_decoded(self) -> bool:
+        """
+        Whether the message was deserialized already.
+
+        :return: Whether the message was deserialized already.
+        :rtype:  bool
+        """
+        return self._message is not None
+
+    @property
+    def message(self) -> GenericROSMessage:
+        """
+        The deserialized message, deserializes it if needed.
+
+        :return: Deserialized message.
+        :rtype:  GenericROSMessage
+        """
+        message: Optional[GenericROSMessage] = self._message
+        if message is None:
+            message = deserialize(self._msg_type, self._data, self._use_numpy)
+            object.__setattr__(self, "_message", message)
+        return message
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self.message, item)
+
+    def __setattr__(self, key: str, value: Any):
+        setattr(self.message, key, value)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, DTLazyMessage):
+            other = other.message
+        return self.message == other
+
+    def __ne__(self, other: Any) -> bool:
+        return not self.__eq__(other)
+
+    def __str__(self) -> str:
+        return str(self.message)
+
+    def __repr__(self) -> str:
+        if self.is_decoded:
+            return repr(self.message)
+        return f"<DTLazyMessage of type `{self._msg_type.__name__}`, " \
+               f"{len(self._data)} bytes>"
+
+    def __deepcopy__(self, memo: dict) -> GenericROSMessage:
+        # a copy is a plain message
+        if self.is_decoded:
+            return copy.deepcopy(self.message, memo)
+        return deserialize(self._msg_type, self._data, self._use_numpy)
@@ -0,0 +1,273 @@
+import os
+import time
+import heapq
+import logging
+import selectors
+import threading
+from typing import Optional, List, Callable
+
+logging.basicConfig()
+
+
+class DTCommunicationMailman(object):
+    """
+    Process-wide event loop delivering the messages of all the communication groups.
+
+    A single thread polls the file descriptors of all the attached LCM handlers and lets
+    each handler process its messages when data is available. A wakeup pipe makes
+    attaching/detaching handlers (and shutting down) immediate.
+
+    Handlers are objects exposing a file descriptor (`fileno()`) and a method
+    `handle_timeout(0)` processing at most one message, just like :py:class:`lcm.LCM`.
+    The mailman also runs periodic timers (see :py:meth:`every`).
+
+    The mailman holds :py:attr:`lock` while handlers process messages, anything that
+    modifies a handler's subscriptions should hold the same lock, so that subscriptions
+    are never destroyed while a message is being delivered to them.
+
+    :meta private:
+    """
+
+    __instance__ = None
+    __instance_lock__ = threading.Lock()
+
+    # maximum number of messages processed per handler before moving on to the next one
+    MAX_MESSAGES_PER_WAKEUP = 64
+
+    def __init__(self):
+        self._logger = logging.getLogger('CommMailman')
+        self._lock = _DTDeliveryLock()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+        # handlers attached (from the users' point of view)
+        self._handlers = set()
+        # pending changes to the selector, applied by the mailman thread:
+        # (op, handler, file descriptor, event)
+        self._requests: List[tuple] = []
+        # periodic timers: heap of (deadline, sequence, timer)
+        self._timers: List[tuple] = []
+        self._timers_seq = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def get_instance() -> 'DTCommunicationMailman':
+        with DTCommunicationMailman.__instance_lock__:
+            if DTCommunicationMailman.__instance__ is None:
+                DTCommunicationMailman.__instance__ = DTCommunicationMailman()
+            return DTCommunicationMailman.__instance__
+
+    @property
+    def lock(self) -> '_DTDeliveryLock':
+        """
+        Lock held by the mailman while it delivers messages.
+
+        :return: The delivery lock.
+        :rtype:  _DTDeliveryLock
+        """
+        return self._lock
+
+    def attach(self, handler):
+        """
+        Starts delivering the messages received by the given LCM handler.
+
+        :param handler:     (:obj:`lcm.LCM`):   LCM handler.
+        """
+        with self._lock:
+            self._handlers.add(handler)
+            self._requests.append(("attach", handler, handler.fileno(), None))
+            self._start()
+        self._wakeup()
+
+    def detach(self, handler):
+        """
+        Stops delivering the messages received by the given LCM handler.
+
+        When this method returns, no messages from this handler are (or will be) delivered.
+
+        :param handler:     (:obj:`lcm.LCM`):   LCM handler.
+        """
+        # a thread holding the lock (e.g., delivering a message published in this process)
+        # would wait forever for the mailman, which needs the lock to process the request
+        owned = self._lock.owned()
+        event = threading.Event()
+        with self._lock:
+            if handler not in self._handlers:
+                return
+            self._handlers.remove(handler)
+            self._requests.append(("detach", handler, handler.fileno(), event))
+            # if we are the mailman (e.g., called from a callback) or we hold the lock, the
+            # mailman is not handling, and it never delivers messages of detached handlers
+            if owned or threading.current_thread() is self._thread:
+                self._wakeup()
+                return
+        self._wakeup()
+        event.wait()
+
+    def every(self, period: float, callback: Callable[[], None]) -> '_DTMailmanTimer':
+        """
+        Calls the given function every `period` seconds from the mailman thread, while
+        holding :py:attr:`lock`. The first call happens after `period` seconds.
+
+        :param period:      (:obj:`float`):     Period in seconds.
+        :param callback:    (:obj:`Callable`):  Function to call.
+        :return:            A timer, cancel it with :py:meth:`cancel`.
+        :rtype:             _DTMailmanTimer
+        """
+        timer = _DTMailmanTimer(period, callback)
+        with self._lock:
+            self._schedule(timer, time.monotonic() + period)
+            self._start()
+        self._wakeup()
+        return timer
+
+    def cancel(self, timer: '_DTMailmanTimer'):
+        """
+        Cancels a timer created with :py:meth:`every`.
+
+        :param timer:       (:obj:`_DTMailmanTimer`):   Timer to cancel.
+        """
+        with self._lock:
+            timer.cancelled = True
+            self._timers = [t for t in self._timers if t[2] is not timer]
+            heapq.heapify(self._timers)
+        self._wakeup()
+
+    def _schedule(self, timer: '_DTMailmanTimer', deadline: float):
+        self._timers_seq += 1
+        heapq.heappush(self._timers, (deadline, self._timers_seq, timer))
+
+    def _start(self):
+        # (re)start the mailman if needed, the caller holds the lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._spin, name="CommMailman")
+            self._thread.start()
+
+    def _run_timers(self) -> Optional[float]:
+        # runs the timers that are due, returns the time until the next one
+        with self._lock:
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                _, _, timer = heapq.heappop(self._timers)
+                try:
+                    timer.callback()
+                except Exception:
+                    self._logger.exception("An error occurred while running a timer.")
+                # the timer might have been cancelled by its own callback
+                if not timer.cancelled:
+                    self._schedule(timer, now + timer.period)
+            if not self._timers:
+                return None
+            return max(0.0, self._timers[0][0] - time.monotonic())
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            # the pipe is full, the mailman will wake up anyway
+            pass
+
+    def _process_requests(self) -> bool:
+        with self._lock:
+            requests, self._requests = self._requests, []
+            for op, handler, fd, event in requests:
+                if op == "attach":
+                    self._selector.register(fd, selectors.EVENT_READ, handler)
+                else:
+                    # the handler might be closed already, its file descriptor is not used
+                    try:
+                        self._selector.unregister(fd)
+                    except KeyError:
+                        pass
+                    event.set()
+            # the mailman returns when nothing is left to deliver
+            if not self._handlers and not self._requests and not self._timers:
+                self._thread = None
+                return False
+        return True
+
+    def _spin(self):
+        try:
+            while self._process_requests():
+                timeout = self._run_timers()
+                for key, _ in self._selector.select(timeout):
+                    handler = key.data
+                    # wakeup pipe
+                    if handler is None:
+                        try:
+                            while os.read(self._wakeup_r, 512):
+                                pass
+                        except BlockingIOError:
+                            pass
+                        continue
+                    # deliver messages
+                    with self._lock:
+                        if handler not in self._handlers:
+                            continue
+                        try:
+                            for _ in range(self.MAX_MESSAGES_PER_WAKEUP):
+                                if handler.handle_timeout(0) <= 0:
+                                    break
+                        except KeyboardInterrupt:
+                            raise
+                        except Exception:
+                            self._logger.exception("An error occurred while delivering "
+                                                   "a message.")
+        except KeyboardInterrupt:
+            pass
+
+
+class _DTMailmanTimer(object):
+    """
+    A periodic timer run by the mailman.
+
+    :meta private:
+    """
+
+    def __init__(self, period: float, callback: Callable[[], None]):
+        self.period = period
+        self.callback = callback
+        self.cancelled = False
+
+
+class _DTDeliveryLock(object):
+    """
+    A reentrant lock that knows whether the calling thread owns it.
+
+    :meta private:
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._owner: Optional[int] = None
+        self._depth = 0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if not self._lock.acquire(blocking, timeout):
+            return False
+        self._owner = threading.get_ident()
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+        self._lock.release()
+
+    def owned(self) -> bool:
+        """
+        Whether the calling thread holds the lock.
+
+        :return: `True` if the calling thread holds the lock.
+        :rtype:  bool
+        """
+        return self._owner == threading.get_ident()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *_):
+        self.release()
@@ -0,0 +1,304 @@
+"""
+Delivery of messages to a pool of worker processes.
+
+Decoding ROS messages and running heavy callbacks (e.g., image processing) in the process
+receiving the messages is limited by the GIL. Subscribers created with
+``DTDeliveryOptions(processes=N)`` hand the encoded payloads to N worker processes instead,
+each worker decodes the payloads and calls the callback.
+
+Payloads travel through one shared memory ring (see
+:py:class:`dt_communication_utils.shm.DTSharedMemoryRing`) per worker, a FIFO wakes the
+worker up. Every worker publishes how many messages (and bytes) it processed in a small
+shared counters area, so that the receiving process knows how far behind each worker is
+and drops the incoming messages instead of overwriting the ones not processed yet.
+
+Workers are started through a fork server (see :py:mod:`multiprocessing`), a clean
+single-threaded process: forking the process creating the subscriber would copy the locks
+held by its threads (e.g., the mailman's), and the workers could hang on them. The callback
+is therefore pickled and must be importable by the workers (e.g., a function defined at
+the top level of a module), and so is the group's decoder (see
+:py:attr:`DTRawCommunicationGroup.decoder`).
+"""
+
+import os
+import json
+import mmap
+import zlib
+import pickle
+import select
+import struct
+import logging
+import threading
+import dataclasses
+import multiprocessing
+from typing import Callable, Optional, Any, List
+
+from .header import DTCommunicationMessageHeader
+from .delivery import DTDelivery, DTDeliveryOptions, DTDeliveryStats
+from .shm import DTSharedMemoryRing, DTSharedMemoryRingReader, DTSharedMemoryInbox, \
+    file_prefix, remove_stale_files_once
+
+# processed messages, processed bytes, expired messages (written by the worker), stop flag
+_COUNTERS = struct.Struct("<QQQQ")
+_PROGRESS = struct.Struct("<QQQ")
+_STOP = struct.Struct("<Q")
+
+
+class DTProcessDelivery(DTDelivery):
+    """
+    Delivers encoded messages to a pool of worker processes, which decode them and call
+    the callback. See :py:mod:`dt_communication_utils.pool`.
+
+    Args:
+        callback    (:obj:`Callable`): the user callback
+        options     (:obj:`DTDeliveryOptions`): delivery options
+        logger      (:obj:`logging.Logger`): logger used to report errors
+        decode      (:obj:`Callable`): decodes a payload given its metadata
+
+    :meta private:
+    """
+
+    encoded = True
+
+    # size of the shared memory ring of each worker, messages larger than a quarter of it
+    # are dropped
+    BUFFER_SIZE = 32 * 1024 * 1024
+    # messages waiting for each worker, when no queue size is given
+    DEFAULT_QUEUE_SIZE = 32
+    # messages read from the ring at once by a worker
+    MAX_MESSAGES_PER_READ = 16
+
+    def __init__(self, callback: Callable, options: DTDeliveryOptions, logger: logging.Logger,
+                 decode: Callable[[Any, dict], Any]):
+        super(DTProcessDelivery, self).__init__(callback, options, logger)
+        self._queue_size = options.queue_size or self.DEFAULT_QUEUE_SIZE
+        self._lock = threading.Lock()
+        self._next = 0
+        self._is_shutdown = False
+        # the workers receive their own copy of the callback and of the decoder
+        try:
+            pickle.dumps((callback, decode))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            raise ValueError(f"Messages delivered to worker processes need a picklable "
+                             f"callback (e.g., a function defined at the top level of a "
+                             f"module): {e}")
+        remove_stale_files_once(logger)
+        prefix = file_prefix("pool")
+        count = options.processes
+        # shared with the workers
+        self._counters_path = f"{prefix}.counters"
+        fd = os.open(self._counters_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, _COUNTERS.size * count)
+            self._counters = mmap.mmap(fd, _COUNTERS.size * count)
+        finally:
+            os.close(fd)
+        self._rings: List[DTSharedMemoryRing] = []
+        self._inboxes: List[DTSharedMemoryInbox] = []
+        # messages and bytes sent to each worker
+        self._sent = [[0, 0] for _ in range(count)]
+        self._workers: List[multiprocessing.Process] = []
+        context = multiprocessing.get_context("forkserver")
+        for i in range(count):
+            ring = DTSharedMemoryRing(f"{prefix}-{i}.ring", self.BUFFER_SIZE)
+            self._rings.append(ring)
+            self._inboxes.append(DTSharedMemoryInbox(f"{prefix}-{i}.inbox"))
+        for i in range(count):
+            # workers read their ring from the start, they do not miss any message
+            worker = context.Process(
+                target=_work,
+                args=(i, self._rings[i].path, self._inboxes[i].path, self._counters_path,
+                      callback, decode, options, logger.name),
+                name=f"CommDeliveryProcess-{i}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    @property
+    def stats(self) -> DTDeliveryStats:
+        with self._lock:
+            done, expired = 0, 0
+            for i in range(len(self._workers)):
+                processed, _, worker_expired, _ = \
+                    _COUNTERS.unpack_from(self._counters, i * _COUNTERS.size)
+                done += processed
+                expired += worker_expired
+            sent = sum(messages for messages, _ in self._sent)
+            return dataclasses.replace(
+                self._stats,
+                delivered=done - expired,
+                dropped_expired=self._stats.dropped_expired + expired,
+                queued=sent - done
+            )
+
+    def deliver_encoded(self, payload: Any, metadata: dict,
+                        header: DTCommunicationMessageHeader):
+        """
+        Hands an encoded message to one of the workers.
+
+        :param payload:     (:obj:`BytesLike`):                     Encoded payload.
+        :param metadata:    (:obj:`dict`):                          Message metadata.
+        :param header:      (:obj:`DTCommunicationMessageHeader`):  Message header.
+        """
+        frame = json.dumps([header.timestamp, header.origin, header.destination, header.txt,
+                            metadata]).encode("utf-8")
+        # the header of the message travels in the topic field of the ring's records
+        if len(frame) > DTSharedMemoryRing.MAX_TOPIC_SIZE:
+            self._logger.warning(f"The header of the message (e.g., `txt`) is too large to "
+                                 f"be handed to a worker process ({len(frame)} bytes), "
+                                 f"dropped.")
+            with self._lock:
+                self._stats.received += 1
+                self._stats.dropped_overflow += 1
+            return
+        size = DTSharedMemoryRing.record_size(len(frame), len(payload))
+        with self._lock:
+            if self._is_shutdown:
+                return
+            self._stats.received += 1
+            if self._is_expired(header):
+                self._stats.dropped_expired += 1
+                return
+            worker = self._choose(header)
+            processed, processed_bytes, _, _ = \
+                _COUNTERS.unpack_from(self._counters, worker * _COUNTERS.size)
+            messages, sent_bytes = self._sent[worker]
+            ring = self._rings[worker]
+            # never overwrite what the worker did not process yet (wrapping wastes at most
+            # one record at the end of the ring)
+            if messages - processed >= self._queue_size or \
+                    sent_bytes - processed_bytes + size + ring.max_record_size > self.BUFFER_SIZE \
+                    or not ring.write(frame, payload):
+                self._stats.dropped_overflow += 1
+                return
+            self._sent[worker] = [messages + 1, sent_bytes + size]
+            self._inboxes[worker].notify()
+
+    def deliver(self, payload: Any, header: DTCommunicationMessageHeader):
+        raise RuntimeError("Messages delivered to worker processes must not be decoded, "
+                           "use deliver_encoded() instead.")
+
+    def shutdown(self):
+        with self._lock:
+            if self._is_shutdown:
+                return
+            self._is_shutdown = True
+            for i, inbox in enumerate(self._inboxes):
+                _STOP.pack_into(self._counters, i * _COUNTERS.size + _PROGRESS.size, 1)
+                inbox.notify()
+        for worker in self._workers:
+            worker.join(timeout=1.0)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        for ring in self._rings:
+            ring.close()
+        for inbox in self._inboxes:
+            inbox.close()
+        self._counters.close()
+        try:
+            os.unlink(self._counters_path)
+        except FileNotFoundError:
+            pass
+
+    def _choose(self, header: DTCommunicationMessageHeader) -> int:
+        count = len(self._workers)
+        # messages from the same origin are processed in order by the same worker
+        if self._options.ordered:
+            return zlib.crc32((header.origin or "").encode("utf-8")) % count
+        # otherwise, the worker with the fewest messages waiting
+        best, waiting = self._next, None
+        for i in range(count):
+            worker = (self._next + i) % count
+            processed = _COUNTERS.unpack_from(self._counters, worker * _COUNTERS.size)[0]
+            pending = self._sent[worker][0] - processed
+            if waiting is None or pending < waiting:
+                best, waiting = worker, pending
+        self._next = (best + 1) % count
+        return best
+
+
+class _DTWorker(DTDelivery):
+    """
+    Runs in a worker process: decodes the messages read from its ring and calls the
+    callback.
+
+    Args:
+        index       (:obj:`int`): index of the worker
+        ring        (:obj:`str`): path to the ring the messages are read from
+        inbox       (:obj:`str`): path to the FIFO waking the worker up
+        counters    (:obj:`str`): path to the counters shared with the receiving process
+        callback    (:obj:`Callable`): the user callback
+        decode      (:obj:`Callable`): decodes a payload given its metadata
+        options     (:obj:`DTDeliveryOptions`): delivery options
+        logger      (:obj:`logging.Logger`): logger used to report errors
+
+    :meta private:
+    """
+
+    def __init__(self, index: int, ring: str, inbox: str, counters: str, callback: Callable,
+                 decode: Callable[[Any, dict], Any], options: DTDeliveryOptions,
+                 logger: logging.Logger):
+        super(_DTWorker, self).__init__(callback, options, logger)
+        self._decode = decode
+        self._offset = index * _COUNTERS.size
+        self._reader = DTSharedMemoryRingReader(ring, from_start=True)
+        self._inbox = DTSharedMemoryInbox(inbox, create=False)
+        fd = os.open(counters, os.O_RDWR)
+        try:
+            self._counters = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+    def run(self):
+        reader, inbox, offset = self._reader, self._inbox, self._offset
+        parent = multiprocessing.parent_process()
+        processed, processed_bytes, expired = 0, 0, 0
+        try:
+            while True:
+                select.select([inbox.fileno()], [], [], 1.0)
+                inbox.drain()
+                if _COUNTERS.unpack_from(self._counters, offset)[3] or \
+                        (parent is not None and not parent.is_alive()):
+                    return
+                while True:
+                    messages, more = reader.read(DTProcessDelivery.MAX_MESSAGES_PER_READ)
+                    for frame, payload in messages:
+                        timestamp, origin, destination, txt, metadata = json.loads(frame)
+                        header = DTCommunicationMessageHeader(
+                            timestamp=timestamp,
+                            origin=origin,
+                            destination=destination,
+                            txt=txt
+                        )
+                        if self._is_expired(header):
+                            expired += 1
+                        else:
+                            try:
+                                message = self._decode(payload, metadata)
+                                if message is not None:
+                                    self._callback(message, header)
+                            except Exception:
+                                self._logger.exception("An error occurred while delivering "
+                                                       "a message.")
+                        processed += 1
+                        processed_bytes += DTSharedMemoryRing.record_size(
+                            len(frame.encode("utf-8")), len(payload))
+                        _PROGRESS.pack_into(self._counters, offset, processed, processed_bytes,
+                                            expired)
+                    if not more:
+                        break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._reader.close()
+            self._inbox.close()
+            self._counters.close()
+
+
+def _work(index: int, ring: str, inbox: str, counters: str, callback: Callable,
+          decode: Callable[[Any, dict], Any], options: DTDeliveryOptions, logger: str):
+    # entry point of the worker processes
+    _DTWorker(index, ring, inbox, counters, callback, decode, options,
+              logging.getLogger(logger)).run()
@@ -0,0 +1,323 @@
+"""
+Rate limiting of the messages sent by a publisher.
+
+Producers often publish faster than anybody needs (e.g., IMU readings shown on a dashboard).
+Publishers with a maximum rate send at most one message every `period` seconds (or
+`frequency` times per second, as :py:class:`dt_class_utils.DTReminder` does), the messages
+published in between are conflated: only the latest one is kept. With `trailing` enabled,
+the latest message is sent at the end of the period instead of being dropped, so that
+subscribers always end up with the last value published.
+
+Publishers can also pace the bytes they send over the network with a token bucket of
+`burst` bytes refilled at `bytes_per_second`, which spreads bursts (e.g., the fragments of
+a large message) over time so that the socket buffers do not overflow on slow links.
+Paced publishers hand their datagrams to a sender thread that waits for the bucket to
+refill, so publishing never blocks (e.g., on the mailman thread or in an event loop). At most
+one second of traffic (or `burst` bytes, if larger) waits to be sent, newer messages are
+dropped when the backlog is full.
+
+Only the messages sent to everybody are conflated, private messages are always sent.
+"""
+
+import time
+import logging
+import threading
+import dataclasses
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional, Callable, Any, Tuple, List
+
+from .constants import ANYBODY
+from .mailman import DTCommunicationMailman
+
+# trailing messages are sent at most this fraction of a period late
+_TRAILING_RESOLUTION = 4
+
+
+@dataclass
+class DTRateLimitOptions(object):
+    """
+    Configures the rate limiting of the messages sent by a publisher.
+
+    Parameters
+
+    - period:           (:obj:`float`): minimum time (in seconds) between two messages
+    - frequency:        (:obj:`float`): maximum number of messages per second, alternative
+                        to `period`
+    - trailing:         (:obj:`bool`): send the latest message conflated in a period at the
+                        end of the period, rather than dropping it
+    - bytes_per_second: (:obj:`int`): maximum number of bytes per second sent over the network
+    - burst:            (:obj:`int`): maximum number of bytes sent at once (size of the token
+                        bucket)
+    """
+    period: Optional[float] = None
+    frequency: Optional[float] = None
+    trailing: bool = True
+    bytes_per_second: Optional[int] = None
+    burst: int = 65536
+
+    def __post_init__(self):
+        if self.period is not None and self.frequency is not None:
+            raise ValueError("Fields `period` and `frequency` cannot be both given.")
+        if self.period is not None and self.period <= 0:
+            raise ValueError(f"Field `period` must be a positive number, "
+                             f"got {self.period} instead.")
+        if self.frequency is not None and self.frequency <= 0:
+            raise ValueError(f"Field `frequency` must be a positive number, "
+                             f"got {self.frequency} instead.")
+        if self.bytes_per_second is not None and self.bytes_per_second <= 0:
+            raise ValueError(f"Field `bytes_per_second` must be a positive number, "
+                             f"got {self.bytes_per_second} instead.")
+        if self.burst < 1:
+            raise ValueError(f"Field `burst` must be a positive integer, "
+                             f"got {self.burst} instead.")
+        if self.period is None and self.frequency is None and self.bytes_per_second is None:
+            raise ValueError("At least one of the fields `period`, `frequency` and "
+                             "`bytes_per_second` must be given.")
+
+    @property
+    def interval(self) -> Optional[float]:
+        """
+        Minimum time (in seconds) between two messages, `None` if messages are not conflated.
+        """
+        if self.frequency is not None:
+            return 1.0 / self.frequency
+        return self.period
+
+
+@dataclass
+class DTRateLimitStats(object):
+    """
+    Rate limiting statistics of a group.
+
+    Parameters
+
+    - sent:         (:obj:`int`): messages sent by the rate-limited publishers
+    - conflated:    (:obj:`int`): messages replaced by a newer one (or dropped) before
+                    being sent
+    - paced:        (:obj:`int`): network messages that waited for the token bucket
+    - paced_time:   (:obj:`float`): total time (in seconds) spent waiting for the token bucket
+    - dropped:      (:obj:`int`): messages dropped because the backlog of the sender thread
+                    was full
+    """
+    sent: int = 0
+    conflated: int = 0
+    paced: int = 0
+    paced_time: float = 0.0
+    dropped: int = 0
+
+
+class DTRateLimiter(object):
+    """
+    Conflates and paces the messages sent by a publisher.
+
+    Args:
+        rate_limit  (:obj:`DTRateLimit`): rate limiting of the group, collects the statistics
+        options     (:obj:`DTRateLimitOptions`): rate limiting options
+        send        (:obj:`Callable`): sends a message, called with the data, the
+                    destination and the user metadata of the latest message at the end of
+                    a period (if `trailing` is enabled)
+
+    :meta private:
+    """
+
+    def __init__(self, rate_limit: 'DTRateLimit', options: DTRateLimitOptions,
+                 send: Callable[[Any, str, Optional[str]], None]):
+        self._rate_limit = rate_limit
+        self._options = options
+        self._send = send
+        self._lock = threading.Lock()
+        self._interval = options.interval
+        # time the last message was sent, periods with no messages are not carried over
+        self._last_sent = -float("inf")
+        self._pending: Optional[Tuple[Any, str, Optional[str]]] = None
+        self._timer = None
+        if self._interval is not None and options.trailing:
+            self._timer = DTCommunicationMailman.get_instance().every(
+                self._interval / _TRAILING_RESOLUTION, self._flush)
+        # token bucket, refilled lazily by the sender thread
+        self._tokens = float(options.burst)
+        self._refilled = time.monotonic()
+        self._backlog = deque()
+        self._backlog_size = 0
+        self._max_backlog = max(options.burst, options.bytes_per_second or 0)
+        self._backlog_lock = threading.Condition()
+        self._is_shutdown = False
+        self._sender = None
+        if options.bytes_per_second is not None:
+            self._sender = threading.Thread(target=self._spin, name="CommPacer", daemon=True)
+            self._sender.start()
+
+    @property
+    def paced(self) -> bool:
+        """
+        Whether the bytes sent over the network are paced.
+        """
+        return self._options.bytes_per_second is not None
+
+    def admit(self, data: Any, destination: Optional[str], txt: Optional[str]) -> bool:
+        """
+        Decides whether a message is sent right away, otherwise it is conflated.
+
+        :param data:        (:obj:`Any`):   Message.
+        :param destination: (:obj:`str`):   Destination of the message.
+        :param txt:         (:obj:`str`):   User metadata.
+        :return:            Whether the message must be sent now.
+        :rtype:             bool
+        """
+        destination = destination or ANYBODY
+        # private (and invalid) messages are let through
+        if self._interval is None or not isinstance(destination, str) or \
+                destination.strip() != ANYBODY:
+            self._rate_limit.on_sent()
+            return True
+        with self._lock:
+            conflated = self._pending is not None
+            now = time.monotonic()
+            if now - self._last_sent >= self._interval:
+                # the message waiting for the end of the period is older than this one
+                self._last_sent = now
+                self._pending = None
+                self._rate_limit.on_sent(conflated)
+                return True
+            # without trailing messages, this one is dropped, otherwise the previous one is
+            if self._options.trailing:
+                self._pending = (data, destination, txt)
+            if conflated or not self._options.trailing:
+                self._rate_limit.on_conflated()
+            return False
+
+    def transmit(self, messages: List[bytes], publish: Callable[[bytes], None]):
+        """
+        Hands the datagrams of a message to the sender thread, which publishes them as the
+        token bucket allows (pacing must be enabled). Returns right away.
+
+        :param messages:    (:obj:`List[bytes]`):   Datagrams of a message.
+        :param publish:     (:obj:`Callable`):      Sends a datagram over the network.
+        """
+        size = sum(len(msg) for msg in messages)
+        with self._backlog_lock:
+            # a message always fits in an empty backlog
+            if self._is_shutdown or \
+                    (self._backlog and self._backlog_size + size > self._max_backlog):
+                self._rate_limit.on_dropped()
+                return
+            self._backlog.append((messages, publish))
+            self._backlog_size += size
+            self._backlog_lock.notify()
+
+    def close(self):
+        """
+        Sends the message waiting for the end of the period (if any), stops the timer and
+        waits for the sender thread to send the backlog.
+        """
+        if self._timer is not None:
+            DTCommunicationMailman.get_instance().cancel(self._timer)
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._rate_limit.on_sent()
+            self._send(*pending)
+        if self._sender is None:
+            return
+        with self._backlog_lock:
+            self._is_shutdown = True
+            self._backlog_lock.notify()
+        if self._sender is not threading.current_thread():
+            self._sender.join()
+
+    def _flush(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._pending is None or now - self._last_sent < self._interval:
+                return
+            self._last_sent = now
+            pending, self._pending = self._pending, None
+        self._rate_limit.on_sent()
+        self._send(*pending)
+
+    def _spin(self):
+        rate = self._options.bytes_per_second
+        while True:
+            with self._backlog_lock:
+                while not self._backlog and not self._is_shutdown:
+                    self._backlog_lock.wait()
+                # the backlog is sent before stopping
+                if not self._backlog:
+                    return
+                messages, publish = self._backlog.popleft()
+                self._backlog_size -= sum(len(msg) for msg in messages)
+            for msg in messages:
+                now = time.monotonic()
+                self._tokens = min(float(self._options.burst),
+                                   self._tokens + (now - self._refilled) * rate)
+                self._refilled = now
+                # the bucket can go into debt, so that messages larger than it get sent too
+                self._tokens -= len(msg)
+                if self._tokens < 0:
+                    wait = -self._tokens / rate
+                    time.sleep(wait)
+                    self._rate_limit.on_paced(wait)
+                try:
+                    publish(msg)
+                except Exception:
+                    self._rate_limit.logger.exception("Cannot send a paced message.")
+
+
+class DTRateLimit(object):
+    """
+    Rate limiting of a group: creates the publishers' rate limiters and collects their
+    statistics.
+
+    :meta private:
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+        self._stats = DTRateLimitStats()
+        self._lock = threading.Lock()
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    @property
+    def stats(self) -> DTRateLimitStats:
+        """
+        A snapshot of the rate limiting statistics.
+
+        :return: Rate limiting statistics.
+        :rtype:  DTRateLimitStats
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats)
+
+    def limiter(self, options: Optional[DTRateLimitOptions],
+                send: Callable[[Any, str, Optional[str]], None]) -> Optional[DTRateLimiter]:
+        """
+        Creates a rate limiter for a new publisher.
+
+        :param options: (:obj:`DTRateLimitOptions`): Options of the publisher.
+        :param send:    (:obj:`Callable`): Sends the messages sent at the end of a period.
+        :return:        A rate limiter, `None` if rate limiting is disabled.
+        :rtype:         Optional[DTRateLimiter]
+        """
+        return None if options is None else DTRateLimiter(self, options, send)
+
+    def on_sent(self, conflated: bool = False):
+        with self._lock:
+            self._stats.sent += 1
+            self._stats.conflated += int(conflated)
+
+    def on_conflated(self):
+        with self._lock:
+            self._stats.conflated += 1
+
+    def on_paced(self, wait: float):
+        with self._lock:
+            self._stats.paced += 1
+            self._stats.paced_time += wait
+
+    def on_dropped(self):
+        with self._lock:
+            self._stats.dropped += 1
@@ -0,0 +1,371 @@
+"""
+Sharded communication groups.
+
+A sharded group spreads its messages over N groups (the shards), each one with its own
+multicast address. Every message is sent to the shard its key maps to, the key defaults
+to the hostname of the publisher, so all the messages from the same robot end up on the
+same shard. Subscribers join all the shards or only the ones they care about, e.g., to
+spread the shards over several worker processes:
+
+.. code-block:: python
+
+    group = DTShardedCommunicationGroup('detections', Detection, shards=8)
+
+    # worker `i` of `n`
+    subscriber = group.Subscriber(callback, shards=range(i, 8, n))
+
+Shards are only created (and joined) when they are used. All the peers of a sharded group
+must agree on the number of shards.
+"""
+
+import inspect
+import logging
+import threading
+from hashlib import sha256
+from typing import Callable, Iterable, Optional, Dict, List, Any
+
+from genpy import Message as GenericROSMessage
+
+from .constants import HOSTNAME, ANYBODY
+from .delivery import DTDeliveryOptions
+from .compression import DTCompressionOptions
+from .batching import DTBatchingOptions
+from .delta import DTDeltaOptions
+from .ratelimit import DTRateLimitOptions
+from .communication import \
+    DTRawCommunicationGroup, \
+    DTCommunicationGroup, \
+    DTCommunicationPublisher, \
+    DTCommunicationSubscriber
+
+
+class DTShardedCommunicationPublisher(object):
+
+    def __init__(self, group: 'DTRawShardedCommunicationGroup', key: Optional[str],
+                 compression: DTCompressionOptions = None, batching: DTBatchingOptions = None,
+                 delta: DTDeltaOptions = None, rate_limit: DTRateLimitOptions = None):
+        """
+        (For internal use only)
+        Creates a new Publisher for a sharded group.
+
+        Args:
+            group:  (:obj:`DTRawShardedCommunicationGroup`):   Underlying sharded group.
+            key:  (:obj:`str`):   Default key of the messages.
+            compression:  (:obj:`DTCompressionOptions`):   Compression options.
+            batching:  (:obj:`DTBatchingOptions`):   Batching options.
+            delta:  (:obj:`DTDeltaOptions`):   Delta encoding options.
+            rate_limit:  (:obj:`DTRateLimitOptions`):   Rate limiting options (of each shard).
+
+        :meta private:
+        """
+        # the publishers of the shards are created lazily, fail early
+        if batching is not None and delta is not None:
+            raise ValueError("Fields `batching` and `delta` cannot be both enabled.")
+        self._group = group
+        self._key = key or HOSTNAME
+        self._compression = compression
+        self._batching = batching
+        self._delta = delta
+        self._rate_limit = rate_limit
+        # shard -> publisher
+        self._publishers: Dict[int, DTCommunicationPublisher] = {}
+
+    def publish(self, data: Any, destination: str = ANYBODY, txt: str = None,
+                key: str = None):
+        """
+        Publishes a new message on the shard its key maps to.
+
+        :param data:            (:obj:`Any`):   Message to publish.
+        :param destination:     (:obj:`str`):   (Optional) Destination of this message. Used
+                                                to send private messages within a group.
+        :param txt:             (:obj:`str`)    (Optional) JSON-encoded string of user metadata.
+        :param key:             (:obj:`str`)    (Optional) Key of the message, defaults to the
+                                                key of the publisher.
+
+        :raises ValueError:     A given argument is of the wrong type.
+        """
+        shard = self._group.shard_of(key or self._key)
+        publisher = self._publishers.get(shard)
+        if publisher is None:
+            publisher = self._publishers[shard] = \
+                self._group.shard(shard).Publisher(self._compression, self._batching,
+                                                   self._delta, self._rate_limit)
+        publisher.publish(data, destination, txt)
+
+    def shutdown(self):
+        """
+        Shuts down the publisher.
+        """
+        for publisher in self._publishers.values():
+            publisher.shutdown()
+        self._publishers.clear()
+        self._group.remove_publisher(self)
+
+
+class DTShardedCommunicationSubscriber(object):
+
+    def __init__(self, subscribers: List[DTCommunicationSubscriber],
+                 group: 'DTRawShardedCommunicationGroup', shards: List[int]):
+        """
+        (For internal use only)
+        Groups the subscribers to the shards of a sharded group.
+
+        Args:
+            subscribers:  (:obj:`List[DTCommunicationSubscriber]`):   Subscribers, one per shard.
+            group:  (:obj:`DTRawShardedCommunicationGroup`):   Underlying sharded group.
+            shards:  (:obj:`List[int]`):   Shards joined.
+
+        :meta private:
+        """
+        self._subscribers = subscribers
+        self._group = group
+        self._shards = shards
+
+    @property
+    def shards(self) -> List[int]:
+        """
+        The shards this subscriber joined.
+
+        :return: Shards.
+        :rtype:  List[int]
+        """
+        return list(self._shards)
+
+    @property
+    def subscribers(self) -> List[DTCommunicationSubscriber]:
+        """
+        The subscribers to the single shards (e.g., to look at their delivery statistics).
+
+        :return: Subscribers, in the same order as :py:attr:`shards`.
+        :rtype:  List[DTCommunicationSubscriber]
+        """
+        return list(self._subscribers)
+
+    def shutdown(self):
+        """
+        Shuts down the subscriber.
+        """
+        for subscriber in self._subscribers:
+            subscriber.shutdown()
+        self._group.remove_subscriber(self)
+
+
+class DTRawShardedCommunicationGroup(object):
+    """
+    Raw Communication Group whose messages are spread over several shards, each one with
+    its own multicast address. See :py:mod:`dt_communication_utils.sharding`.
+
+    Args:
+        name        (:obj:`str`): the name of the group
+        shards      (:obj:`int`): number of shards
+        ttl         (:obj:`int`): (Time to live) the number of hops the message can do throughout
+                    the network before it is discarded.
+                    See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
+        loglevel    (:obj:`int`): Logger's level of verbosity
+        kwargs      (:obj:`dict`): other options, passed to each shard,
+                    see :py:class:`DTRawCommunicationGroup`
+
+    """
+
+    def __init__(self, name: str, shards: int, ttl: int = 1, loglevel: int = logging.WARNING,
+                 **kwargs):
+        if not isinstance(shards, int) or shards < 1:
+            raise ValueError(f"Field `shards` must be a positive integer, "
+                             f"got {shards} instead.")
+        self._name = name
+        self._num_shards = shards
+        self._ttl = ttl
+        self._loglevel = loglevel
+        self._kwargs = kwargs
+        self._shards: Dict[int, DTRawCommunicationGroup] = {}
+        self._lock = threading.Lock()
+        self._publishers = set()
+        self._subscribers = set()
+        self._is_shutdown = False
+
+    @property
+    def name(self) -> str:
+        """
+        Unique group's name.
+
+        :return: Unique group's name.
+        :rtype:  str
+        """
+        return self._name
+
+    @property
+    def shards(self) -> int:
+        """
+        Number of shards.
+
+        :return: Number of shards.
+        :rtype:  int
+        """
+        return self._num_shards
+
+    @property
+    def is_shutdown(self) -> bool:
+        """
+        Wether the group is shutdown.
+
+        :return: Wether the group is shutdown.
+        :rtype:  bool
+        """
+        return self._is_shutdown
+
+    def shard_of(self, key: str) -> int:
+        """
+        Returns the shard the messages with the given key are sent to.
+
+        :param key:     (:obj:`str`):   Key (e.g., the hostname of a publisher).
+        :return:        Shard.
+        :rtype:         int
+        """
+        digest = sha256(key.encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') % self._num_shards
+
+    def shard(self, shard: int) -> DTRawCommunicationGroup:
+        """
+        Returns the group of the given shard, creates it if needed.
+
+        :param shard:   (:obj:`int`):   Shard.
+        :return:        Group of the shard.
+        :rtype:         DTRawCommunicationGroup
+
+        :meta private:
+        """
+        if not 0 <= shard < self._num_shards:
+            raise ValueError(f"Shard {shard} does not exist, the group `{self._name}` "
+                             f"has {self._num_shards} shards.")
+        with self._lock:
+            group = self._shards.get(shard)
+            if group is None:
+                group = self._shards[shard] = self._create_shard(f"{self._name}/shard{shard}")
+            return group
+
+    def Publisher(self, key: str = None, compression: DTCompressionOptions = None,
+                  batching: DTBatchingOptions = None,
+                  delta: DTDeltaOptions = None,
+                  rate_limit: DTRateLimitOptions = None) -> DTShardedCommunicationPublisher:
+        """
+        Creates a Publisher object on this group.
+
+        :param key:         (:obj:`str`): (Optional) Key of the messages published, defaults
+                                                to the hostname. Can be overridden on each
+                                                message.
+        :param compression: (:obj:`DTCompressionOptions`): (Optional) Compression of the
+                                                payloads sent by this publisher.
+        :param batching:    (:obj:`DTBatchingOptions`): (Optional) Send small messages in
+                                                batches rather than one at a time.
+        :param delta:       (:obj:`DTDeltaOptions`): (Optional) Send only what changed since
+                                                the last keyframe, see
+                                                :py:mod:`dt_communication_utils.delta`.
+        :param rate_limit:  (:obj:`DTRateLimitOptions`): (Optional) Conflate the messages
+                                                published faster than a maximum rate and/or
+                                                pace the bytes sent over the network.
+        :return: A new Publisher.
+        :rtype:  :obj:`DTShardedCommunicationPublisher`
+        """
+        pub = DTShardedCommunicationPublisher(self, key, compression, batching, delta,
+                                              rate_limit)
+        self.add_publisher(pub)
+        return pub
+
+    def Subscriber(self, callback: Callable, filters: Iterable[Callable] = None,
+                   delivery: DTDeliveryOptions = None, shards: Iterable[int] = None) \
+            -> DTShardedCommunicationSubscriber:
+        """
+        Creates a Subscriber object on this group.
+
+        :param callback:    (:obj:`Callable`):  Callback function used to process incoming
+                                                messages, see
+                                                :py:meth:`DTRawCommunicationGroup.Subscriber`.
+        :param filters:     (:obj:`Iterable[Callable]`):    (Optional) Predicates on the header
+                                                of the incoming messages.
+                                                See :py:mod:`dt_communication_utils.filters`.
+        :param delivery:    (:obj:`DTDeliveryOptions`): (Optional) How messages are delivered
+                                                to the callback, applies to each shard.
+        :param shards:      (:obj:`Iterable[int]`): (Optional) Shards to join, all of them by
+                                                default. See :py:meth:`shard_of`.
+        :return: A new Subscriber.
+        :rtype:  :obj:`DTShardedCommunicationSubscriber`
+        """
+        shards = list(range(self._num_shards) if shards is None else shards)
+        subscribers = [self.shard(shard).Subscriber(callback, filters, delivery)
+                       for shard in shards]
+        sub = DTShardedCommunicationSubscriber(subscribers, self, shards)
+        self.add_subscriber(sub)
+        return sub
+
+    def add_publisher(self, publisher: DTShardedCommunicationPublisher):
+        """
+        :meta private:
+        """
+        self._publishers.add(publisher)
+
+    def add_subscriber(self, subscriber: DTShardedCommunicationSubscriber):
+        """
+        :meta private:
+        """
+        self._subscribers.add(subscriber)
+
+    def remove_publisher(self, publisher: DTShardedCommunicationPublisher):
+        """
+        :meta private:
+        """
+        self._publishers.discard(publisher)
+
+    def remove_subscriber(self, subscriber: DTShardedCommunicationSubscriber):
+        """
+        :meta private:
+        """
+        self._subscribers.discard(subscriber)
+
+    def shutdown(self):
+        """
+        Shuts down the group and all its shards.
+        """
+        self._is_shutdown = True
+        for pub in list(self._publishers):
+            pub.shutdown()
+        for sub in list(self._subscribers):
+            sub.shutdown()
+        for group in self._shards.values():
+            group.shutdown()
+        self._shards.clear()
+
+    def _create_shard(self, name: str) -> DTRawCommunicationGroup:
+        return DTRawCommunicationGroup(name, self._ttl, self._loglevel, **self._kwargs)
+
+
+class DTShardedCommunicationGroup(DTRawShardedCommunicationGroup):
+    """
+    Communication Group exchanging ROS messages, whose messages are spread over several
+    shards. See :py:mod:`dt_communication_utils.sharding`.
+
+    Args:
+        name        (:obj:`str`): the name of the group
+        msg_type    (:obj:`GenericROSMessage`): type of message exchanged in this group.
+        shards      (:obj:`int`): number of shards
+        ttl         (:obj:`int`): (Time to live) the number of hops the message can do throughout
+                    the network before it is discarded.
+                    See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
+        loglevel    (:obj:`int`): Logger's level of verbosity
+        kwargs      (:obj:`dict`): other options, passed to each shard,
+                    see :py:class:`DTRawCommunicationGroup`
+
+    """
+
+    def __init__(self, name: str, msg_type: GenericROSMessage, shards: int, ttl: int = 1,
+                 loglevel: int = logging.WARNING, **kwargs):
+        # check msg_type
+        if not inspect.isclass(msg_type):
+            raise ValueError(f"Field `msg_type` expected to be of type `class`, "
+                             f"got {msg_type.__class__.__name__} instead.")
+        # ---
+        self.MsgClass = msg_type
+        super(DTShardedCommunicationGroup, self).__init__(name, shards, ttl, loglevel, **kwargs)
+
+    def _create_shard(self, name: str) -> DTCommunicationGroup:
+        return DTCommunicationGroup(name, self.MsgClass, self._ttl, self._loglevel,
+                                    **self._kwargs)
@@ -0,0 +1,708 @@
+"""
+Shared memory transport for the peers of a group living on the same host.
+
+Every process publishing on a group with shared memory enabled writes its messages
+(LCM-encoded, exactly as they would go on the wire) to a ring buffer in `/dev/shm`.
+Processes on the same host map the rings of the other processes and read the messages
+from there, a FIFO (one per reader) is used to wake them up. Messages are still sent over
+multicast, the readers served through shared memory ignore the copy from the network.
+
+Peers that do not enable shared memory never announce themselves, so a publisher cannot
+know whether they exist (on this host or on others). Only when all the peers of the group
+are known to enable shared memory (`exclusive`), multicast is restricted to discovery and
+to the peers that cannot be reached through shared memory.
+
+Discovery: every peer periodically announces on the group itself which topics it is
+subscribed to, which ring it writes to and which rings it reads. A publisher writes a
+message to its ring only for the readers that confirmed they map the ring, and (when
+`exclusive`) sends the message over multicast only if somebody else needs it. The list of
+readers served through shared memory travels with the message (in the metadata), so that
+every reader gets each message exactly once, either from shared memory or from the network.
+"""
+
+import os
+import re
+import json
+import mmap
+import time
+import uuid
+import errno
+import struct
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, FrozenSet
+
+from .constants import HOSTNAME, PROCESS_ID
+from .mailman import DTCommunicationMailman
+
+SHM_DIR = "/dev/shm"
+
+# shared memory files are named `dt-comm-[<kind>-]<PID namespace>-<PID>-<id>.<extension>`,
+# so that the ones left behind by processes that died without cleaning up are recognized
+_FILE_NAME = re.compile(r"^dt-comm-(?:[a-z]+-)?(\d+)-(\d+)-")
+_stale_files_removed = False
+_stale_files_lock = threading.Lock()
+
+
+def _pid_namespace() -> str:
+    # PIDs are only meaningful within a PID namespace (e.g., a container), "0" if unknown
+    try:
+        link = os.readlink("/proc/self/ns/pid")
+    except OSError:
+        return "0"
+    return "".join(filter(str.isdigit, link)) or "0"
+
+
+PID_NAMESPACE = _pid_namespace()
+
+
+def file_prefix(kind: str = None) -> str:
+    """
+    Returns a new, unique prefix for the shared memory files created by this process.
+
+    :param kind:    (:obj:`str`):   (Optional) Kind of files, e.g., `pool`.
+    :return:        Path prefix, extensions are added by the caller.
+    :rtype:         str
+
+    :meta private:
+    """
+    kind = f"{kind}-" if kind else ""
+    return os.path.join(
+        SHM_DIR, f"dt-comm-{kind}{PID_NAMESPACE}-{os.getpid()}-{uuid.uuid4().hex[:16]}")
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # e.g., owned by another user
+        pass
+    return True
+
+
+def remove_stale_files(directory: str = SHM_DIR) -> List[str]:
+    """
+    Removes the shared memory files left behind by processes that no longer exist
+    (e.g., after a crash). Only the files created in our PID namespace are considered,
+    the PIDs of the other namespaces (e.g., other containers) cannot be checked.
+
+    :param directory:   (:obj:`str`):   Directory of the shared memory files.
+    :return:            Paths of the files removed.
+    :rtype:             List[str]
+
+    :meta private:
+    """
+    if PID_NAMESPACE == "0":
+        return []
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    removed = []
+    alive: Dict[int, bool] = {}
+    for name in names:
+        match = _FILE_NAME.match(name)
+        if match is None or match.group(1) != PID_NAMESPACE:
+            continue
+        pid = int(match.group(2))
+        if pid not in alive:
+            alive[pid] = _is_alive(pid)
+        if alive[pid]:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        removed.append(path)
+    return removed
+
+
+def remove_stale_files_once(logger: logging.Logger):
+    """
+    Removes the stale shared memory files (see :py:func:`remove_stale_files`), the first
+    time it is called in this process.
+
+    :param logger:  (:obj:`logging.Logger`):    Logger used to report the files removed.
+
+    :meta private:
+    """
+    global _stale_files_removed
+    with _stale_files_lock:
+        if _stale_files_removed:
+            return
+        _stale_files_removed = True
+        removed = remove_stale_files()
+    if removed:
+        logger.info(f"Removed {len(removed)} shared memory file(s) left behind by processes "
+                    f"that no longer exist.")
+
+
+def align(size: int) -> int:
+    """
+    Rounds a size up to the alignment of the records in a ring (8 bytes).
+
+    :param size:    (:obj:`int`):   Size in bytes.
+    :return:        Aligned size in bytes.
+    :rtype:         int
+
+    :meta private:
+    """
+    return (size + 7) & ~7
+
+
+class DTSharedMemoryRing(object):
+    """
+    Ring buffer in a shared memory file, written by one process and read by many.
+
+    The file starts with a header (magic, capacity, reserved position, committed position)
+    followed by `capacity` bytes of records. Positions grow monotonically, the offset of a
+    position in the buffer is `position % capacity`. Records are aligned to 8 bytes and
+    never wrap around the end of the buffer, a record of length zero marks the end of the
+    buffer.
+
+    A record is made of: `[u32 length][u16 topic length][topic][message]`, topics are at
+    most :py:attr:`MAX_TOPIC_SIZE` bytes long.
+
+    The writer advances the reserved position before writing a record and the committed
+    position after, readers use the reserved position to detect records overwritten while
+    they were reading them. The writer never waits for the readers.
+
+    Args:
+        path        (:obj:`str`): path to the shared memory file
+        capacity    (:obj:`int`): size of the buffer, in bytes
+
+    :meta private:
+    """
+
+    MAGIC = b"DTSHMRB1"
+    HEADER_SIZE = 64
+    MAX_TOPIC_SIZE = 0xFFFF
+    _HEADER = struct.Struct("<8sQQQ")
+    _POSITION = struct.Struct("<Q")
+    _RECORD = struct.Struct("<IH")
+    _RESERVED_AT = 16
+    _COMMITTED_AT = 24
+
+    def __init__(self, path: str, capacity: int):
+        self._path = path
+        self._capacity = align(capacity)
+        self._position = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, self.HEADER_SIZE + self._capacity)
+            self._mm = mmap.mmap(fd, self.HEADER_SIZE + self._capacity)
+        finally:
+            os.close(fd)
+        self._HEADER.pack_into(self._mm, 0, self.MAGIC, self._capacity, 0, 0)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @classmethod
+    def record_size(cls, topic_size: int, message_size: int) -> int:
+        """
+        Space taken in the ring by a message.
+
+        :param topic_size:      (:obj:`int`):   Size of the (UTF-8 encoded) topic, in bytes.
+        :param message_size:    (:obj:`int`):   Size of the encoded message, in bytes.
+        :return:                Size of the record, in bytes.
+        :rtype:                 int
+        """
+        return align(cls._RECORD.size + topic_size + message_size)
+
+    @property
+    def max_record_size(self) -> int:
+        """
+        Largest record accepted, larger messages have to be sent over the network.
+
+        :return: Size in bytes.
+        :rtype:  int
+        """
+        return self._capacity // 4
+
+    def write(self, topic: bytes, message: bytes) -> bool:
+        """
+        Appends a message to the ring.
+
+        :param topic:       (:obj:`bytes`):     Topic of the message (UTF-8 encoded).
+        :param message:     (:obj:`bytes`):     Encoded message.
+        :return:            Whether the message was written (i.e., it was not too big).
+        :rtype:             bool
+        """
+        if len(topic) > self.MAX_TOPIC_SIZE:
+            return False
+        length = self._RECORD.size + len(topic) + len(message)
+        size = self.record_size(len(topic), len(message))
+        if size > self.max_record_size:
+            return False
+        mm, capacity = self._mm, self._capacity
+        position = self._position
+        offset = position % capacity
+        # the record does not fit before the end of the buffer, wrap around
+        wrap = offset + size > capacity
+        end = position + (capacity - offset if wrap else 0) + size
+        self._POSITION.pack_into(mm, self._RESERVED_AT, end)
+        if wrap:
+            self._RECORD.pack_into(mm, self.HEADER_SIZE + offset, 0, 0)
+            offset = 0
+        start = self.HEADER_SIZE + offset
+        self._RECORD.pack_into(mm, start, length, len(topic))
+        start += self._RECORD.size
+        mm[start:start + len(topic)] = topic
+        start += len(topic)
+        mm[start:start + len(message)] = message
+        self._POSITION.pack_into(mm, self._COMMITTED_AT, end)
+        self._position = end
+        return True
+
+    def close(self):
+        """
+        Unmaps and deletes the ring.
+        """
+        self._mm.close()
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class DTSharedMemoryRingReader(object):
+    """
+    Reads the messages written to a :py:class:`DTSharedMemoryRing` by another process.
+
+    Reading starts from the messages written after the reader is created, or from the
+    first message ever written to the ring.
+
+    Args:
+        path        (:obj:`str`): path to the shared memory file
+        from_start  (:obj:`bool`): read the messages written before the reader was created
+
+    :meta private:
+    """
+
+    def __init__(self, path: str, from_start: bool = False):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        magic, self._capacity, _, self._position = \
+            DTSharedMemoryRing._HEADER.unpack_from(self._mm, 0)
+        if from_start:
+            self._position = 0
+        if magic != DTSharedMemoryRing.MAGIC:
+            self._mm.close()
+            raise ValueError(f"File `{path}` is not a shared memory ring.")
+        # number of times we fell so far behind that we lost messages
+        self.lapped = 0
+
+    def read(self, limit: int) -> Tuple[List[Tuple[str, bytes]], bool]:
+        """
+        Reads (and copies) the messages written since the last call.
+
+        :param limit:   (:obj:`int`):   Maximum number of messages to read.
+        :return:        The messages as (topic, data) pairs, and whether more are available.
+        :rtype:         Tuple[List[Tuple[str, bytes]], bool]
+        """
+        mm, capacity = self._mm, self._capacity
+        position_of = DTSharedMemoryRing._POSITION.unpack_from
+        committed = position_of(mm, DTSharedMemoryRing._COMMITTED_AT)[0]
+        messages = []
+        while self._position < committed and len(messages) < limit:
+            position = self._position
+            # the writer lapped us, skip to the most recent message
+            if position_of(mm, DTSharedMemoryRing._RESERVED_AT)[0] - position > capacity:
+                self._on_lapped()
+                committed = self._position
+                break
+            offset = position % capacity
+            start = DTSharedMemoryRing.HEADER_SIZE + offset
+            length, topic_length = DTSharedMemoryRing._RECORD.unpack_from(mm, start)
+            # end of the buffer
+            if length == 0:
+                self._position += capacity - offset
+                continue
+            # garbage, we are reading a record while it is being overwritten
+            if length < DTSharedMemoryRing._RECORD.size or offset + length > capacity:
+                self._on_lapped()
+                committed = self._position
+                break
+            record = mm[start:start + length]
+            # make sure the record was not overwritten while we were copying it
+            if position_of(mm, DTSharedMemoryRing._RESERVED_AT)[0] - position > capacity:
+                self._on_lapped()
+                committed = self._position
+                break
+            self._position += align(length)
+            topic_end = DTSharedMemoryRing._RECORD.size + topic_length
+            topic = record[DTSharedMemoryRing._RECORD.size:topic_end].decode("utf-8")
+            messages.append((topic, memoryview(record)[topic_end:]))
+        return messages, self._position < committed
+
+    def close(self):
+        self._mm.close()
+
+    def _on_lapped(self):
+        self.lapped += 1
+        self._position = DTSharedMemoryRing._POSITION.unpack_from(
+            self._mm, DTSharedMemoryRing._COMMITTED_AT)[0]
+
+
+class DTSharedMemoryInbox(object):
+    """
+    Named pipe used by writers to wake up a reader, created (and deleted) by the reader
+    unless `create` is `False`.
+
+    Args:
+        path        (:obj:`str`): path to the named pipe
+        create      (:obj:`bool`): whether to create the named pipe (and delete it on close)
+
+    :meta private:
+    """
+
+    def __init__(self, path: str, create: bool = True):
+        self._path = path
+        self._created = create
+        if create:
+            os.mkfifo(path, 0o600)
+        # opened for writing as well, so that it never reports EOF
+        self._fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def drain(self):
+        try:
+            while os.read(self._fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def notify(self):
+        _notify(self._fd)
+
+    def close(self):
+        os.close(self._fd)
+        if not self._created:
+            return
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+
+
+def _notify(fd: int):
+    try:
+        os.write(fd, b"\0")
+    except BlockingIOError:
+        # the pipe is full, the reader will wake up anyway
+        pass
+
+
+@dataclass
+class _DTSharedMemoryPeer(object):
+    """
+    What we know about another member of the group (from its announcements).
+
+    :meta private:
+    """
+    id: str
+    process: str
+    # whether we can reach this peer through shared memory
+    local: bool
+    topics: FrozenSet[str]
+    # ids of the peers whose rings this peer reads
+    rings: FrozenSet[str]
+    ring: Optional[str]
+    inbox: Optional[str]
+    last_seen: float
+
+
+class DTSharedMemoryTransport(object):
+    """
+    Moves the messages of a group between the processes living on the same host through
+    shared memory. See :py:mod:`dt_communication_utils.shm`.
+
+    The transport behaves like an LCM handler from the point of view of the mailman, i.e.,
+    it exposes a file descriptor (`fileno()`) and processes messages in `handle_timeout()`.
+
+    Args:
+        group       (:obj:`DTRawCommunicationGroup`): the group using this transport
+        size        (:obj:`int`): size of the ring buffer, in bytes
+        lock        (:obj:`threading.RLock`): lock held while messages are being delivered
+        exclusive   (:obj:`bool`): all the peers of the group use shared memory, messages
+                    are sent over multicast only for the peers that announced they need them
+        timers      (:obj:`DTCommunicationMailman`): runs the announcements, defaults to the
+                    mailman
+
+    :meta private:
+    """
+
+    CHANNEL = "/__shm__"
+    DEFAULT_SIZE = 8 * 1024 * 1024
+    ANNOUNCE_PERIOD = 1.0
+    PEER_TIMEOUT = 3.5
+    # exclusive transports send over multicast as well until discovery has settled
+    SETTLE_TIME = 1.0
+    MAX_MESSAGES_PER_READ = 16
+
+    def __init__(self, group: 'DTRawCommunicationGroup', size: int, lock: threading.RLock,
+                 exclusive: bool = False, timers: DTCommunicationMailman = None):
+        self._group = group
+        self._timers = timers or DTCommunicationMailman.get_instance()
+        self._exclusive = exclusive
+        self._id = uuid.uuid4().hex[:16]
+        self._size = size
+        self._logger: logging.Logger = group.logger
+        self._delivery_lock = lock
+        self._lock = threading.RLock()
+        remove_stale_files_once(self._logger)
+        self._prefix = file_prefix()
+        self._ring: Optional[DTSharedMemoryRing] = None
+        self._inbox = DTSharedMemoryInbox(f"{self._prefix}.inbox")
+        self._peers: Dict[str, _DTSharedMemoryPeer] = {}
+        # rings we read, by writer id
+        self._readers: Dict[str, DTSharedMemoryRingReader] = {}
+        # peers reading our ring, and their inboxes
+        self._served: FrozenSet[str] = frozenset()
+        self._notify: Dict[str, int] = {}
+        self._extra: Optional[dict] = None
+        self._started = time.monotonic()
+        self._is_shutdown = False
+        # ---
+        group.dispatcher.use_shared_memory(self._id, self.announce)
+        with self._delivery_lock:
+            self._subscription = group.handler.subscribe(self.CHANNEL, self._on_announcement)
+        self._timer = self._timers.every(self.ANNOUNCE_PERIOD, self._tick)
+        self.announce()
+
+    @property
+    def id(self) -> str:
+        """
+        Unique identifier of this transport.
+
+        :return: Identifier.
+        :rtype:  str
+        """
+        return self._id
+
+    def fileno(self) -> int:
+        return self._inbox.fileno()
+
+    def route(self, topic: str) -> Tuple[Optional[dict], bool]:
+        """
+        Decides how a message on the given topic should be sent.
+
+        :param topic:   (:obj:`str`):   Topic of the message.
+        :return:        The extra metadata to add to the message if it should be written to
+                        shared memory (`None` otherwise), and whether it should be sent
+                        over the network.
+        :rtype:         Tuple[Optional[dict], bool]
+        """
+        created = False
+        with self._lock:
+            # the ring is created when we publish for the first time
+            if self._ring is None:
+                self._ring = DTSharedMemoryRing(f"{self._prefix}.ring", self._size)
+                created = True
+            # peers without shared memory do not announce, unless we know there are none
+            network = not self._exclusive or \
+                time.monotonic() - self._started < self.SETTLE_TIME
+            if not network:
+                for peer in self._peers.values():
+                    if topic in peer.topics and peer.id not in self._served \
+                            and not self._delivered_in_process(peer):
+                        network = True
+                        break
+            extra = self._extra
+        # let the readers on this host know about the ring
+        if created:
+            self.announce()
+        return extra, network
+
+    def write(self, topic: str, message: bytes) -> bool:
+        """
+        Writes a message to shared memory and wakes up the readers subscribed to its topic.
+
+        :param topic:       (:obj:`str`):   Topic of the message.
+        :param message:     (:obj:`bytes`): Encoded message.
+        :return:            Whether the message was written (i.e., it was not too big).
+        :rtype:             bool
+        """
+        with self._lock:
+            if self._ring is None or not self._ring.write(topic.encode("utf-8"), message):
+                return False
+            for peer_id, fd in list(self._notify.items()):
+                peer = self._peers.get(peer_id)
+                if peer is None or topic not in peer.topics:
+                    continue
+                try:
+                    _notify(fd)
+                except OSError:
+                    # the reader is gone
+                    self._forget(peer_id)
+            return True
+
+    def handle_timeout(self, _: int = 0) -> int:
+        """
+        Delivers the messages available in the rings we read.
+
+        :return: Number of messages delivered.
+        :rtype:  int
+        """
+        self._inbox.drain()
+        messages, more = [], False
+        with self._lock:
+            for reader in self._readers.values():
+                batch, pending = reader.read(self.MAX_MESSAGES_PER_READ)
+                messages.extend(batch)
+                more = more or pending
+        # we leave before reading everything, make sure we are called again
+        if more:
+            self._inbox.notify()
+        dispatch = self._group.dispatcher.dispatch
+        for topic, data in messages:
+            dispatch(topic, data, shm=True)
+        return len(messages)
+
+    def announce(self, bye: bool = False):
+        """
+        Tells the other members of the group about us.
+
+        :param bye:     (:obj:`bool`):  Whether we are leaving.
+        """
+        with self._lock:
+            announcement = self._announcement(bye)
+            if not bye and self._update(announcement):
+                # we now read our own ring
+                announcement = self._announcement(bye)
+                self._update(announcement)
+        self._group.handler.publish(self.CHANNEL, json.dumps(announcement).encode("utf-8"))
+
+    def close(self):
+        """
+        Leaves the group and releases all the shared memory resources.
+        """
+        self._is_shutdown = True
+        self._timers.cancel(self._timer)
+        with self._delivery_lock:
+            self._group.handler.unsubscribe(self._subscription)
+        self.announce(bye=True)
+        with self._lock:
+            for peer_id in list(self._peers):
+                self._forget(peer_id)
+            if self._ring is not None:
+                self._ring.close()
+                self._ring = None
+            self._inbox.close()
+
+    def _announcement(self, bye: bool) -> dict:
+        return {
+            "id": self._id,
+            "host": HOSTNAME,
+            "process": PROCESS_ID,
+            "topics": [] if bye else list(self._group.dispatcher.topics),
+            "rings": [] if bye else list(self._readers),
+            "ring": None if (bye or self._ring is None) else self._ring.path,
+            "inbox": self._inbox.path,
+            "bye": bye,
+        }
+
+    def _on_announcement(self, _: str, data: bytes):
+        try:
+            announcement = json.loads(data)
+            peer_id = announcement["id"]
+        except (ValueError, KeyError, TypeError):
+            self._logger.warning("Received invalid shared memory announcement. Ignoring it.")
+            return
+        # we know about ourselves already
+        if peer_id == self._id or self._is_shutdown:
+            return
+        with self._lock:
+            if announcement.get("bye", False):
+                self._forget(peer_id)
+                return
+            new = peer_id not in self._peers
+            changed = self._update(announcement)
+        # help newcomers discover us quickly, tell writers we now read their rings
+        if new or changed:
+            self.announce()
+
+    def _update(self, announcement: dict) -> bool:
+        # updates what we know about a peer, returns whether we started reading a new ring
+        peer_id = announcement["id"]
+        inbox = announcement.get("inbox")
+        known = self._peers.get(peer_id)
+        local = known.local if known is not None else \
+            announcement["host"] == HOSTNAME and inbox is not None and os.path.exists(inbox)
+        peer = _DTSharedMemoryPeer(
+            id=peer_id,
+            process=announcement["process"],
+            local=local,
+            topics=frozenset(announcement.get("topics", [])),
+            rings=frozenset(announcement.get("rings", [])),
+            ring=announcement.get("ring"),
+            inbox=inbox,
+            last_seen=time.monotonic(),
+        )
+        self._peers[peer_id] = peer
+        # start reading the rings of the writers on this host
+        new_ring = False
+        if peer.local and peer.ring is not None and peer_id not in self._readers \
+                and not self._delivered_in_process(peer):
+            try:
+                self._readers[peer_id] = DTSharedMemoryRingReader(peer.ring)
+                new_ring = True
+            except (OSError, ValueError) as e:
+                self._logger.warning(f"Cannot read the shared memory ring `{peer.ring}`: {e}")
+        # start/stop writing to this peer
+        if peer.local and self._id in peer.rings and not self._delivered_in_process(peer):
+            if peer_id not in self._notify:
+                try:
+                    self._notify[peer_id] = os.open(peer.inbox, os.O_WRONLY | os.O_NONBLOCK)
+                except OSError as e:
+                    if e.errno not in (errno.ENOENT, errno.ENXIO):
+                        raise
+        elif peer_id in self._notify:
+            os.close(self._notify.pop(peer_id))
+        self._update_served()
+        return new_ring
+
+    def _forget(self, peer_id: str):
+        self._peers.pop(peer_id, None)
+        reader = self._readers.pop(peer_id, None)
+        if reader is not None:
+            reader.close()
+        fd = self._notify.pop(peer_id, None)
+        if fd is not None:
+            os.close(fd)
+        self._update_served()
+
+    def _update_served(self):
+        served = frozenset(self._notify)
+        if served != self._served:
+            self._served = served
+            # a new object every time, the metadata cache relies on it
+            self._extra = {"shm": sorted(served)} if served else None
+
+    def _delivered_in_process(self, peer: _DTSharedMemoryPeer) -> bool:
+        # peers in this process receive our messages directly when local delivery is on
+        return peer.process == PROCESS_ID and self._group.local_delivery
+
+    def _tick(self):
+        now = time.monotonic()
+        with self._lock:
+            for peer_id, peer in list(self._peers.items()):
+                if peer_id != self._id and now - peer.last_seen > self.PEER_TIMEOUT:
+                    self._logger.debug(f"Peer `{peer_id}` timed out.")
+                    self._forget(peer_id)
+        self.announce()
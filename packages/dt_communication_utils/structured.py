@@ -0,0 +1,296 @@
+"""
+Communication groups exchanging structured data (dictionaries, lists, numbers, strings)
+encoded with `CBOR <https://cbor.io>`_, a binary format that is both faster to encode and
+decode and more compact than JSON.
+
+Messages are published as dictionaries, or as dataclasses when the group is given a
+schema, in which case subscribers receive instances of the schema:
+
+.. code-block:: python
+
+    @dataclass
+    class Telemetry:
+        robot: str
+        battery: float
+        pose: List[float]
+
+    group = DTStructuredCommunicationGroup('telemetry', schema=Telemetry,
+                                           keys=['robot', 'battery', 'pose'])
+
+Groups can share a key dictionary, a list of the keys found in the messages: those keys are
+replaced by their (small) index before encoding, which makes messages smaller. All the
+peers of a group must use the same key dictionary (messages encoded with a different one
+are dropped). Integer keys found in the messages are tagged so that they are not mistaken
+for an index.
+
+Fields holding dataclasses are rebuilt, also when they are optional, or lists or dictionaries
+(values) of dataclasses, e.g., `Optional[Pose]`, `List[Pose]` or `Dict[str, Pose]`.
+"""
+
+import typing
+import logging
+import collections.abc
+import dataclasses
+from hashlib import sha256
+from typing import Optional, Sequence, Dict, Any
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+from . import codec
+from .communication import DTRawCommunicationGroup
+
+# values that are encoded as they are
+_SCALARS = frozenset((str, int, float, bool, bytes, type(None)))
+
+# CBOR tag of the integer keys of the messages, when the group has a key dictionary
+_INT_KEY_TAG = 25716
+
+# shape of a field: a dataclass, a list (list, shape) or a dictionary (dict, shape) of
+# dataclasses, `None` for the values that are used as they are
+_Shape = Any
+
+
+def _shape(hint: Any) -> _Shape:
+    # Optional[X]
+    if typing.get_origin(hint) is typing.Union:
+        args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+        hint = args[0] if len(args) == 1 else None
+    if dataclasses.is_dataclass(hint):
+        return hint
+    origin, args = typing.get_origin(hint), typing.get_args(hint)
+    # List[X], Sequence[X], Tuple[X, ...]
+    if origin in (list, tuple, collections.abc.Sequence) and args:
+        if origin is tuple and not (len(args) == 2 and args[1] is Ellipsis):
+            return None
+        item = _shape(args[0])
+        return None if item is None else (list, item)
+    # Dict[K, X], Mapping[K, X]
+    if origin in (dict, collections.abc.Mapping) and len(args) == 2:
+        item = _shape(args[1])
+        return None if item is None else (dict, item)
+    return None
+
+
+def _fields(schema: type) -> Dict[str, _Shape]:
+    # fields of a dataclass, and the shape of the fields holding dataclasses
+    try:
+        hints = typing.get_type_hints(schema)
+    except (NameError, TypeError):
+        hints = {field.name: field.type for field in dataclasses.fields(schema)}
+    return {field.name: _shape(hints.get(field.name)) for field in dataclasses.fields(schema)}
+
+
+class _DTIntKey(object):
+    # an integer key of a message, it must not be equal to the index of a key in the
+    # dictionary while the map holding it is decoded
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def __eq__(self, other):
+        return type(other) is _DTIntKey and other.value == self.value
+
+    def __hash__(self):
+        return hash((_DTIntKey, self.value))
+
+
+class DTStructuredCommunicationGroup(DTRawCommunicationGroup):
+    """
+    Communication Group allowing processes to exchange structured data encoded with CBOR.
+    See :py:mod:`dt_communication_utils.structured`.
+
+    Args:
+        name        (:obj:`str`): the name of the group
+        ttl         (:obj:`int`): (Time to live) the number of hops the message can do throughout
+                    the network before it is discarded.
+                    See `Time to live (Wikipedia) <https://en.wikipedia.org/wiki/Time_to_live>`_.
+        loglevel    (:obj:`int`): Logger's level of verbosity
+        schema      (:obj:`type`): dataclass the messages are decoded into, `None` (default)
+                    decodes them into dictionaries
+        keys        (:obj:`Sequence[str]`): key dictionary shared by all the peers of the
+                    group, the keys in it are sent as integers
+        kwargs      (:obj:`dict`): other options, see :py:class:`DTRawCommunicationGroup`
+
+    """
+
+    def __init__(self, name: str, ttl: int = 1, loglevel: int = logging.WARNING,
+                 schema: type = None, keys: Sequence[str] = None, **kwargs):
+        if cbor2 is None:
+            raise ValueError("Structured groups are not available, install the package "
+                             "`cbor2`.")
+        if schema is not None and not dataclasses.is_dataclass(schema):
+            raise ValueError(f"Field `schema` must be a dataclass, "
+                             f"got `{schema}` instead.")
+        keys = list(keys or [])
+        if len(set(keys)) != len(keys) or not all(isinstance(key, str) for key in keys):
+            raise ValueError("Field `keys` must be a list of unique strings.")
+        self._schema = schema
+        self._keys = keys
+        self._key_ids = {key: i for i, key in enumerate(keys)}
+        # dataclass -> fields
+        self._schemas: Dict[type, Dict[str, _Shape]] = {}
+        super(DTStructuredCommunicationGroup, self).__init__(name, ttl, loglevel, **kwargs)
+        self._metadata = {
+            "msg_type": "cbor"
+        }
+        # peers must agree on the key dictionary
+        if keys:
+            self._metadata["keys"] = sha256("\0".join(keys).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def schema(self) -> Optional[type]:
+        """
+        The dataclass the messages are decoded into.
+
+        :return: The dataclass, `None` if messages are decoded into dictionaries.
+        :rtype:  Optional[type]
+        """
+        return self._schema
+
+    @property
+    def keys(self) -> Sequence[str]:
+        """
+        The key dictionary shared by the peers of the group.
+
+        :return: Key dictionary.
+        :rtype:  Sequence[str]
+        """
+        return list(self._keys)
+
+    def _decoding_state(self) -> dict:
+        return {
+            **super(DTStructuredCommunicationGroup, self)._decoding_state(),
+            "_schema": self._schema,
+            "_keys": self._keys,
+            "_key_ids": self._key_ids,
+            "_schemas": {},
+            "_metadata": self._metadata,
+        }
+
+    def encode(self, msg: Any, _: codec.DTEncodingBuffer = None) -> Optional[bytes]:
+        """
+        Encodes a dictionary (or a dataclass) with CBOR.
+
+        :param msg:     (:obj:`Any`):               Message to encode.
+        :param _:       (:obj:`DTEncodingBuffer`):  Reusable buffer (unused).
+        :return:        Encoded message.
+        :rtype:         :obj:`bytes`
+
+        :meta private:
+        """
+        if not isinstance(msg, dict) and not (dataclasses.is_dataclass(msg) and
+                                              not isinstance(msg, type)):
+            self._logger.warning(f"Expected a dictionary or a dataclass, "
+                                 f"got `{msg.__class__.__name__}` instead.")
+            return None
+        try:
+            # without a key dictionary, only dataclasses need to be converted
+            if not self._key_ids:
+                return cbor2.dumps(msg, default=self._encode_dataclass)
+            return cbor2.dumps(self._pack(msg))
+        except (cbor2.CBOREncodeError, TypeError, ValueError) as e:
+            self._logger.warning(f"Cannot encode the message: {e}")
+            return None
+
+    def decode(self, data: codec.BytesLike, metadata: dict) -> Optional[Any]:
+        """
+        Decodes a CBOR payload into a dictionary (or into the schema).
+
+        :param data:        (:obj:`BytesLike`):  Payload.
+        :param metadata:    (:obj:`dict`):  Message metadata.
+        :return:            Decoded message.
+        :rtype:             :obj:`Any`
+
+        :meta private:
+        """
+        if metadata.get('msg_type') != "cbor":
+            self._logger.warning(f"Expected a CBOR message, "
+                                 f"got `{metadata.get('msg_type')}` instead.")
+            return None
+        if metadata.get('keys') != self._metadata.get('keys'):
+            self._logger.warning("Received a message encoded with a different key "
+                                 "dictionary, dropped.")
+            return None
+        try:
+            msg = cbor2.loads(data, object_hook=self._unpack if self._keys else None,
+                              tag_hook=self._untag if self._keys else None)
+        except (cbor2.CBORDecodeError, TypeError, ValueError, IndexError) as e:
+            self._logger.warning(f"Cannot decode the message: {e}")
+            return None
+        if self._schema is None:
+            return msg
+        try:
+            return self._instantiate(self._schema, msg)
+        except (TypeError, ValueError) as e:
+            self._logger.warning(f"The message does not match the schema "
+                                 f"`{self._schema.__name__}`: {e}")
+            return None
+
+    def _encode_dataclass(self, encoder: 'cbor2.CBOREncoder', value: Any):
+        if not dataclasses.is_dataclass(value) or isinstance(value, type):
+            raise TypeError(f"cannot encode objects of type `{value.__class__.__name__}`")
+        encoder.encode({name: getattr(value, name) for name in self._fields_of(type(value))})
+
+    def _pack(self, value: Any) -> Any:
+        # dataclasses become dictionaries, known keys become integers, integer keys are tagged
+        pack = self._pack
+        if isinstance(value, dict):
+            ids = self._key_ids
+            return {cbor2.CBORTag(_INT_KEY_TAG, key) if type(key) is int else ids.get(key, key):
+                    item if type(item) in _SCALARS else pack(item)
+                    for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [item if type(item) in _SCALARS else pack(item) for item in value]
+        if dataclasses.is_dataclass(value) and not isinstance(value, type):
+            ids = self._key_ids
+            return {ids.get(name, name): pack(getattr(value, name))
+                    for name in self._fields_of(type(value))}
+        return value
+
+    def _unpack(self, _: 'cbor2.CBORDecoder', value: dict) -> dict:
+        # called by the decoder on every dictionary, known keys are integers
+        keys = self._keys
+        return {keys[key] if type(key) is int else
+                key.value if type(key) is _DTIntKey else key: item
+                for key, item in value.items()}
+
+    @staticmethod
+    def _untag(_: 'cbor2.CBORDecoder', tag: 'cbor2.CBORTag') -> Any:
+        # called by the decoder on every tag it does not know
+        if tag.tag == _INT_KEY_TAG and type(tag.value) is int:
+            return _DTIntKey(tag.value)
+        return tag
+
+    def _instantiate(self, schema: type, value: dict) -> Any:
+        if not isinstance(value, dict):
+            raise TypeError(f"expected a dictionary, got `{value.__class__.__name__}`")
+        fields = self._fields_of(schema)
+        # unknown fields are ignored (e.g., sent by newer peers)
+        return schema(**{
+            name: item if fields[name] is None else self._rebuild(fields[name], item)
+            for name, item in value.items() if name in fields
+        })
+
+    def _rebuild(self, shape: _Shape, value: Any) -> Any:
+        if value is None:
+            return None
+        if not isinstance(shape, tuple):
+            return self._instantiate(shape, value)
+        container, item = shape
+        if container is list:
+            if not isinstance(value, list):
+                raise TypeError(f"expected a list, got `{value.__class__.__name__}`")
+            return [self._rebuild(item, element) for element in value]
+        if not isinstance(value, dict):
+            raise TypeError(f"expected a dictionary, got `{value.__class__.__name__}`")
+        return {key: self._rebuild(item, element) for key, element in value.items()}
+
+    def _fields_of(self, schema: type) -> Dict[str, _Shape]:
+        fields = self._schemas.get(schema)
+        if fields is None:
+            fields = self._schemas[schema] = _fields(schema)
+        return fields
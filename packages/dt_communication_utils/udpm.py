@@ -0,0 +1,458 @@
+"""
+Native UDP multicast backend, wire-compatible with LCM (``udpm://`` provider).
+
+The LCM Python binding costs one system call and one trip through the binding per
+datagram. This backend reads up to :py:attr:`DTUDPMulticastHandler.BATCH_SIZE` datagrams
+with a single ``recvmmsg`` call, hands the messages read together on the same channel to
+the subscriptions made with :py:meth:`DTUDPMulticastHandler.subscribe_many` in a single
+call, and sends all the datagrams of a fragmented message with a single ``sendmmsg`` call
+(through `ctypes`, no compilation needed). Where these calls are
+not available (i.e., outside Linux), it falls back to one ``recv``/``send`` per datagram.
+
+Datagrams follow the LCM UDPM protocol:
+
+- short messages:   ``[u32 magic "LC02"][u32 sequence number][channel\\0][payload]``
+- long messages:    ``[u32 magic "LC03"][u32 sequence number][u32 payload size]``
+  ``[u32 fragment offset][u16 fragment number][u16 number of fragments]``, followed by the
+  channel (first fragment only) and the fragment of the payload
+
+so groups using this backend talk to plain LCM peers.
+"""
+
+import os
+import sys
+import errno
+import ctypes
+import ctypes.util
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple, Optional, Set
+from urllib.parse import urlparse, parse_qs
+
+from .codec import BytesLike
+
+_MAGIC_SHORT = 0x4c433032
+_MAGIC_LONG = 0x4c433033
+_SHORT = struct.Struct(">II")
+_LONG = struct.Struct(">IIIIHH")
+
+# same limits as LCM
+MAX_CHANNEL_LENGTH = 63
+SHORT_MESSAGE_MAX_SIZE = 65499
+FRAGMENT_MAX_PAYLOAD = 65423
+MAX_DATAGRAM_SIZE = 65536
+
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+_IP_MULTICAST_ALL = getattr(socket, "IP_MULTICAST_ALL", 49)
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint,
+                                  ctypes.c_int, ctypes.c_void_p]
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint,
+                                  ctypes.c_int]
+        return libc
+    except (OSError, AttributeError, TypeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def _check(result: int) -> int:
+    if result < 0:
+        err = ctypes.get_errno()
+        if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+            return 0
+        raise OSError(err, os.strerror(err))
+    return result
+
+
+class _DTDatagramReader(object):
+    """
+    Reads batches of datagrams from a socket, with a single `recvmmsg` call when available.
+    """
+
+    def __init__(self, sock: socket.socket, size: int):
+        self._sock = sock
+        self._size = size
+        self._buffer = bytearray(size * MAX_DATAGRAM_SIZE)
+        self._view = memoryview(self._buffer)
+        if _libc is None:
+            return
+        base = ctypes.addressof(ctypes.c_char.from_buffer(self._buffer))
+        self._names = (ctypes.c_char * (16 * size))()
+        self._iovecs = (_IOVec * size)()
+        self._msgs = (_MMsgHdr * size)()
+        for i in range(size):
+            self._iovecs[i].iov_base = base + i * MAX_DATAGRAM_SIZE
+            self._iovecs[i].iov_len = MAX_DATAGRAM_SIZE
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._names) + 16 * i
+            hdr.msg_iov = ctypes.pointer(self._iovecs[i])
+            hdr.msg_iovlen = 1
+
+    def read(self) -> List[Tuple[memoryview, bytes]]:
+        """
+        Reads the datagrams available (without blocking).
+
+        :return:    The datagrams, as views over an internal buffer (valid until the next
+                    call), and the address of their senders.
+        :rtype:     List[Tuple[memoryview, bytes]]
+        """
+        if _libc is None:
+            return self._read_one_by_one()
+        for i in range(self._size):
+            self._msgs[i].msg_hdr.msg_namelen = 16
+        count = _check(_libc.recvmmsg(self._sock.fileno(), self._msgs, self._size,
+                                      _MSG_DONTWAIT, None))
+        return [
+            (self._view[i * MAX_DATAGRAM_SIZE:i * MAX_DATAGRAM_SIZE + self._msgs[i].msg_len],
+             self._names[16 * i:16 * i + 8])
+            for i in range(count)
+        ]
+
+    def _read_one_by_one(self) -> List[Tuple[memoryview, bytes]]:
+        datagrams = []
+        for i in range(self._size):
+            view = self._view[i * MAX_DATAGRAM_SIZE:(i + 1) * MAX_DATAGRAM_SIZE]
+            try:
+                size, address = self._sock.recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            datagrams.append((view[:size], repr(address).encode()))
+        return datagrams
+
+
+def _send_all(sock: socket.socket, datagrams: List[bytes]):
+    """
+    Sends datagrams on a connected socket, with a single `sendmmsg` call when available.
+    """
+    if _libc is None or len(datagrams) == 1:
+        for datagram in datagrams:
+            sock.send(datagram)
+        return
+    count = len(datagrams)
+    iovecs = (_IOVec * count)()
+    msgs = (_MMsgHdr * count)()
+    for i, datagram in enumerate(datagrams):
+        # points straight to the content of the (immutable) datagram, no copies
+        iovecs[i].iov_base = ctypes.cast(ctypes.c_char_p(datagram), ctypes.c_void_p).value
+        iovecs[i].iov_len = len(datagram)
+        msgs[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+        msgs[i].msg_hdr.msg_iovlen = 1
+    sent = 0
+    while sent < count:
+        result = _libc.sendmmsg(sock.fileno(), ctypes.byref(msgs[sent]), count - sent, 0)
+        if result < 0:
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            raise OSError(err, os.strerror(err))
+        sent += result
+
+
+class _DTPendingMessage(object):
+
+    __slots__ = ("channel", "buffer", "count", "received")
+
+    def __init__(self, size: int, count: int):
+        self.channel: Optional[str] = None
+        self.buffer = bytearray(size)
+        self.count = count
+        # numbers of the fragments received so far
+        self.received: Set[int] = set()
+
+
+class DTUDPMulticastSubscription(object):
+    """
+    Subscription to a channel, returned by :py:meth:`DTUDPMulticastHandler.subscribe`.
+
+    :meta private:
+    """
+
+    def __init__(self, channel: str, callback: Callable[[str, BytesLike], None],
+                 batch_callback: Callable[[str, List[BytesLike]], None] = None):
+        self.channel = channel
+        self.callback = callback
+        self.batch_callback = batch_callback
+
+
+class DTUDPMulticastHandler(object):
+    """
+    Drop-in replacement for the LCM handler of a group (``udpm://`` URLs only) that
+    receives and sends datagrams in batches. See :py:mod:`dt_communication_utils.udpm`.
+
+    Unlike LCM, channels are matched exactly (no regular expressions).
+
+    Args:
+        url         (:obj:`str`): LCM URL of the group, e.g., ``udpm://239.255.0.1:7667?ttl=1``
+        buffer_size (:obj:`int`): size (in bytes) of the kernel's receive and send buffers
+
+    :meta private:
+    """
+
+    BATCH_SIZE = 32
+    DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+    # messages being reassembled at the same time
+    MAX_PENDING = 16
+    MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, url: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        parsed = urlparse(url)
+        if parsed.scheme != "udpm":
+            raise ValueError(f"Only `udpm://` URLs are supported, got `{url}` instead.")
+        self._address = (parsed.hostname, parsed.port or 7667)
+        ttl = int(parse_qs(parsed.query).get("ttl", ["0"])[0])
+        self._lock = threading.Lock()
+        self._seqno = 0
+        # channel -> subscriptions, replaced (never modified) on (un)subscribe
+        self._subscriptions: Dict[str, Tuple[DTUDPMulticastSubscription, ...]] = {}
+        # (sender, sequence number) -> message being reassembled
+        self._pending: OrderedDict = OrderedDict()
+        # receiving socket
+        self._recv = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._recv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            try:
+                self._recv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        self._recv.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+        self._recv.bind(("", self._address[1]))
+        membership = socket.inet_aton(self._address[0]) + socket.inet_aton("0.0.0.0")
+        self._recv.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        # Linux delivers the traffic of all the groups joined on the host with the same port
+        # to every socket bound to that port, only take the traffic of our group
+        if sys.platform.startswith("linux"):
+            self._recv.setsockopt(socket.IPPROTO_IP, _IP_MULTICAST_ALL, 0)
+        self._recv.setblocking(False)
+        self._reader = _DTDatagramReader(self._recv, self.BATCH_SIZE)
+        # sending socket
+        self._send = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._send.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self._send.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self._send.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+        self._send.connect(self._address)
+
+    @staticmethod
+    def is_batched() -> bool:
+        """
+        Whether datagrams are actually read and written in batches on this platform.
+
+        :return: Whether `recvmmsg`/`sendmmsg` are available.
+        :rtype:  bool
+        """
+        return _libc is not None
+
+    def fileno(self) -> int:
+        return self._recv.fileno()
+
+    def subscribe(self, channel: str, callback: Callable[[str, BytesLike], None]) \
+            -> DTUDPMulticastSubscription:
+        """
+        Calls `callback(channel, data)` for every message received on the given channel.
+
+        :param channel:     (:obj:`str`):       Channel.
+        :param callback:    (:obj:`Callable`):  Callback.
+        :return:            Subscription, pass it to :py:meth:`unsubscribe`.
+        :rtype:             DTUDPMulticastSubscription
+        """
+        return self._subscribe(DTUDPMulticastSubscription(channel, callback))
+
+    def subscribe_many(self, channel: str, callback: Callable[[str, List[BytesLike]], None]) \
+            -> DTUDPMulticastSubscription:
+        """
+        Calls `callback(channel, messages)` with the messages received on the given channel,
+        in batches (i.e., the consecutive messages of the channel read together).
+
+        :param channel:     (:obj:`str`):       Channel.
+        :param callback:    (:obj:`Callable`):  Callback.
+        :return:            Subscription, pass it to :py:meth:`unsubscribe`.
+        :rtype:             DTUDPMulticastSubscription
+        """
+        return self._subscribe(DTUDPMulticastSubscription(channel, None, callback))
+
+    def _subscribe(self, subscription: DTUDPMulticastSubscription) \
+            -> DTUDPMulticastSubscription:
+        with self._lock:
+            self._subscriptions[subscription.channel] = \
+                self._subscriptions.get(subscription.channel, ()) + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription: DTUDPMulticastSubscription):
+        """
+        Removes a subscription.
+
+        :param subscription:    (:obj:`DTUDPMulticastSubscription`):    Subscription.
+        """
+        with self._lock:
+            channel = subscription.channel
+            remaining = tuple(s for s in self._subscriptions.get(channel, ())
+                              if s is not subscription)
+            if remaining:
+                self._subscriptions[channel] = remaining
+            else:
+                self._subscriptions.pop(channel, None)
+
+    def publish(self, channel: str, data: BytesLike):
+        """
+        Publishes a message, large messages are fragmented the way LCM does.
+
+        :param channel:     (:obj:`str`):       Channel.
+        :param data:        (:obj:`BytesLike`): Message.
+        """
+        self.publish_many(channel, [data])
+
+    def publish_many(self, channel: str, messages: List[BytesLike]):
+        """
+        Publishes several messages on the same channel with as few system calls as possible.
+
+        :param channel:     (:obj:`str`):               Channel.
+        :param messages:    (:obj:`List[BytesLike]`):   Messages.
+        """
+        name = channel.encode("utf-8")
+        if len(name) > MAX_CHANNEL_LENGTH:
+            raise ValueError(f"Channel names cannot be longer than {MAX_CHANNEL_LENGTH} "
+                             f"bytes, got `{channel}` instead.")
+        name += b"\0"
+        with self._lock:
+            seqno = self._seqno
+            self._seqno = (seqno + len(messages)) & 0xFFFFFFFF
+        datagrams = []
+        for i, data in enumerate(messages):
+            datagrams.extend(self._datagrams(name, (seqno + i) & 0xFFFFFFFF, data))
+        _send_all(self._send, datagrams)
+
+    def handle_timeout(self, _: int = 0) -> int:
+        """
+        Reads a batch of datagrams (without blocking) and delivers the complete messages.
+
+        :return: Number of datagrams read.
+        :rtype:  int
+        """
+        datagrams = self._reader.read()
+        # consecutive messages on the same channel are delivered together
+        channel, batch = None, []
+        for datagram, sender in datagrams:
+            message = self._parse(datagram, sender)
+            if message is None:
+                continue
+            if message[0] != channel:
+                self._deliver(channel, batch)
+                channel, batch = message[0], []
+            batch.append(message[1])
+        self._deliver(channel, batch)
+        return len(datagrams)
+
+    def _deliver(self, channel: Optional[str], batch: List[BytesLike]):
+        if not batch:
+            return
+        for subscription in self._subscriptions.get(channel, ()):
+            if subscription.batch_callback is not None:
+                subscription.batch_callback(channel, batch)
+                continue
+            for data in batch:
+                subscription.callback(channel, data)
+
+    def close(self):
+        """
+        Closes the sockets.
+        """
+        self._recv.close()
+        self._send.close()
+
+    @staticmethod
+    def _datagrams(name: bytes, seqno: int, data: BytesLike) -> List[bytes]:
+        size = data.nbytes if isinstance(data, memoryview) else len(data)
+        if len(name) + size <= SHORT_MESSAGE_MAX_SIZE:
+            return [b"".join((_SHORT.pack(_MAGIC_SHORT, seqno), name, data))]
+        view = memoryview(data)
+        count = (len(name) + size + FRAGMENT_MAX_PAYLOAD - 1) // FRAGMENT_MAX_PAYLOAD
+        if count > 0xFFFF:
+            raise ValueError(f"Message too large ({size} bytes).")
+        # the first fragment carries the channel
+        first = FRAGMENT_MAX_PAYLOAD - len(name)
+        datagrams = [b"".join((_LONG.pack(_MAGIC_LONG, seqno, size, 0, 0, count),
+                               name, view[:first]))]
+        for number, offset in enumerate(range(first, size, FRAGMENT_MAX_PAYLOAD), 1):
+            datagrams.append(b"".join((
+                _LONG.pack(_MAGIC_LONG, seqno, size, offset, number, count),
+                view[offset:offset + FRAGMENT_MAX_PAYLOAD]
+            )))
+        return datagrams
+
+    def _parse(self, datagram: memoryview, sender: bytes) -> Optional[Tuple[str, BytesLike]]:
+        if datagram.nbytes < _SHORT.size:
+            return None
+        magic, seqno = _SHORT.unpack_from(datagram)
+        if magic == _MAGIC_SHORT:
+            end = bytes(datagram[_SHORT.size:_SHORT.size + MAX_CHANNEL_LENGTH + 1]).find(b"\0")
+            if end < 0:
+                return None
+            start = _SHORT.size + end + 1
+            channel = bytes(datagram[_SHORT.size:start - 1]).decode("utf-8", "replace")
+            if channel not in self._subscriptions:
+                return None
+            return channel, bytes(datagram[start:])
+        if magic != _MAGIC_LONG or datagram.nbytes < _LONG.size:
+            return None
+        _, _, size, offset, number, count = _LONG.unpack_from(datagram)
+        if size > self.MAX_MESSAGE_SIZE or number >= count:
+            return None
+        key = (sender, seqno)
+        pending = self._pending.get(key)
+        if pending is None:
+            while len(self._pending) >= self.MAX_PENDING:
+                self._pending.popitem(last=False)
+            pending = self._pending[key] = _DTPendingMessage(size, count)
+        elif len(pending.buffer) != size or pending.count != count:
+            del self._pending[key]
+            return None
+        if number in pending.received:
+            # duplicated fragment
+            return None
+        start = _LONG.size
+        if number == 0:
+            end = bytes(datagram[start:start + MAX_CHANNEL_LENGTH + 1]).find(b"\0")
+            if end < 0:
+                del self._pending[key]
+                return None
+            pending.channel = bytes(datagram[start:start + end]).decode("utf-8", "replace")
+            start += end + 1
+        chunk = datagram[start:]
+        if offset + chunk.nbytes > size:
+            del self._pending[key]
+            return None
+        pending.buffer[offset:offset + chunk.nbytes] = chunk
+        pending.received.add(number)
+        if len(pending.received) < pending.count:
+            return None
+        del self._pending[key]
+        if pending.channel is None or pending.channel not in self._subscriptions:
+            return None
+        return pending.channel, pending.buffer
@@ -0,0 +1,9 @@
+import os
+import sys
+import importlib.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "packages"))
+
+# the package needs the LCM binding, even for the tests that do not send anything
+if importlib.util.find_spec("lcm") is None or importlib.util.find_spec("genpy") is None:
+    collect_ignore_glob = ["test_*.py"]
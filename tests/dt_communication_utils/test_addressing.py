@@ -0,0 +1,81 @@
+import time
+
+from dt_communication_utils import DTRawCommunicationGroup, DTAddressingOptions, \
+    DTEnvelopeOptions
+from dt_communication_utils.addressing import group_address
+
+# a tiny pool, so that names collide easily
+OPTIONS = DTAddressingOptions(network="239.255.0.0/30", probe=0.2)
+
+
+def colliding_names():
+    first = "test_addressing_a"
+    for i in range(1000):
+        second = f"test_addressing_b{i}"
+        if group_address(second, OPTIONS) == group_address(first, OPTIONS) and \
+                group_address(second, OPTIONS, 1) != group_address(first, OPTIONS):
+            return first, second
+    raise AssertionError("no colliding names found")
+
+
+def address(group):
+    return group._get_group_ip(), group._port
+
+
+def test_probing_moves_away_from_other_groups_and_joins_peers():
+    first, second = colliding_names()
+    a = DTRawCommunicationGroup(first, addressing=OPTIONS)
+    try:
+        assert address(a) == group_address(first, OPTIONS)
+        b1 = DTRawCommunicationGroup(second, addressing=OPTIONS)
+        try:
+            assert address(b1) == group_address(second, OPTIONS, 1)
+            # a peer of the second group joins it, wherever it is
+            b2 = DTRawCommunicationGroup(second, addressing=OPTIONS)
+            assert address(b2) == address(b1)
+            b2.shutdown()
+        finally:
+            b1.shutdown()
+    finally:
+        a.shutdown()
+
+
+def test_collisions_are_learned_from_announcements():
+    first, second = colliding_names()
+    options = DTAddressingOptions(network=OPTIONS.network)
+    # groups negotiating their envelope announce themselves periodically
+    envelope = DTEnvelopeOptions(version=2)
+    a = DTRawCommunicationGroup(first, addressing=options, envelope=envelope)
+    b = DTRawCommunicationGroup(second, addressing=options, envelope=envelope)
+    try:
+        # the second group only uses a subgroup
+        b.Subgroup("sub").Publisher().publish(b"hello")
+        # groups announce themselves every second
+        deadline = time.monotonic() + 5
+        while not (second in a._collisions and first in b._collisions) and \
+                time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert second in a._collisions
+        assert first in b._collisions
+    finally:
+        b.shutdown()
+        a.shutdown()
+
+
+def test_newcomers_join_peers_that_moved_away():
+    first, second = colliding_names()
+    a = DTRawCommunicationGroup(first, addressing=OPTIONS)
+    try:
+        b1 = DTRawCommunicationGroup(second, addressing=OPTIONS)
+    finally:
+        # the group that made the second group move away leaves, its address is free again
+        a.shutdown()
+    try:
+        assert address(b1) == group_address(second, OPTIONS, 1)
+        b2 = DTRawCommunicationGroup(second, addressing=OPTIONS)
+        try:
+            assert address(b2) == address(b1)
+        finally:
+            b2.shutdown()
+    finally:
+        b1.shutdown()
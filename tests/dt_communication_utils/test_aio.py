@@ -0,0 +1,72 @@
+import time
+import asyncio
+import threading
+
+from dt_communication_utils import DTRawCommunicationGroup, DTEnvelopeOptions
+from dt_communication_utils.aio import DTAsyncRawCommunicationGroup
+from dt_communication_utils.batching import DTBatchingOptions
+from dt_communication_utils.mailman import DTCommunicationMailman
+
+
+def test_local_messages_from_other_threads_are_delivered_on_the_loop():
+
+    async def main():
+        group = DTAsyncRawCommunicationGroup("test_aio_local", local_delivery=True)
+        other = DTRawCommunicationGroup("test_aio_local", local_delivery=True)
+        loop_thread = threading.current_thread()
+        threads = []
+        subscriber = group.Subscriber()
+        original = subscriber.deliver
+
+        def deliver(payload, header):
+            threads.append(threading.current_thread())
+            original(payload, header)
+
+        subscriber.deliver = deliver
+        try:
+            publisher = other.Publisher()
+            sender = threading.Thread(
+                target=lambda: [publisher.publish(b"m%d" % i) for i in range(10)])
+            sender.start()
+            received = []
+            for _ in range(10):
+                message, _ = await asyncio.wait_for(subscriber.recv(), 5)
+                received.append(bytes(message))
+            sender.join()
+            assert received == [b"m%d" % i for i in range(10)]
+            assert threads and all(thread is loop_thread for thread in threads)
+        finally:
+            other.shutdown()
+            group.shutdown()
+
+    asyncio.run(main())
+
+
+def test_periodic_tasks_run_on_the_loop():
+    mailman = DTCommunicationMailman.get_instance()
+    # the mailman stops once the groups of the other tests are gone
+    deadline = time.monotonic() + 5
+    while mailman._thread is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert mailman._thread is None
+
+    async def main():
+        group = DTAsyncRawCommunicationGroup("test_aio_timers", shared_memory=True,
+                                             envelope=DTEnvelopeOptions(version=2))
+        try:
+            negotiator = group.envelope
+            announcements = []
+            original = negotiator.announce
+            negotiator.announce = lambda: announcements.append(original())
+            publisher = group.Publisher(batching=DTBatchingOptions())
+            await publisher.publish(b"hello")
+            await asyncio.sleep(negotiator.ANNOUNCE_PERIOD * 1.5)
+            assert announcements
+            # announcements and batches do not need the mailman
+            assert mailman._thread is None
+            assert not mailman._timers
+            assert "CommMailman" not in [thread.name for thread in threading.enumerate()]
+        finally:
+            group.shutdown()
+
+    asyncio.run(main())
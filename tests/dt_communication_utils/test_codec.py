@@ -0,0 +1,62 @@
+import pytest
+
+from dt_communication_utils import codec
+from dt_communication_utils.dt_communication_msg_t import dt_communication_msg_t
+
+
+def message(payload: bytes = b"\x00payload\xff") -> dt_communication_msg_t:
+    msg = dt_communication_msg_t()
+    msg.timestamp = 1234567890123
+    msg.group = "my_group"
+    msg.origin = "autobot01"
+    msg.destination = ""
+    msg.metadata = '{"msg_type": "raw"}'
+    msg.txt = "àèìòù"
+    msg.length = len(payload)
+    msg.payload = payload
+    return msg
+
+
+@pytest.mark.parametrize("payload", [b"", b"\x00payload\xff", bytes(range(256)) * 64])
+def test_roundtrip(payload):
+    msg = message(payload)
+    data = codec.encode(msg)
+    # the wire format is the one of LCM
+    assert data == msg.encode()
+    decoded = codec.decode(data)
+    for field in dt_communication_msg_t.__slots__:
+        assert getattr(decoded, field) == getattr(msg, field), field
+    assert bytes(decoded.payload) == payload
+
+
+def test_encode_into_reuses_the_buffer():
+    msg = message()
+    strings = [codec.encode_string(value) for value in
+               (msg.group, msg.origin, msg.destination, msg.metadata, msg.txt)]
+    buffer = bytearray()
+    size = codec.encode_into(buffer, msg.timestamp, strings, msg.payload)
+    assert bytes(buffer[:size]) == msg.encode()
+    # a smaller message fits in the same buffer
+    size = codec.encode_into(buffer, msg.timestamp, strings, b"")
+    assert bytes(buffer[:size]) == message(b"").encode()
+    assert len(buffer) > size
+
+
+def test_header_only():
+    data = codec.encode(message())
+    msg, offset = codec.decode_header(data)
+    assert (msg.group, msg.origin, msg.destination) == ("my_group", "autobot01", "")
+    assert bytes(codec.decode_body(data, msg, offset).payload) == b"\x00payload\xff"
+
+
+@pytest.mark.parametrize("data", [b"", b"garbage", codec.encode(message())[:-1]])
+def test_invalid_messages_are_rejected(data):
+    with pytest.raises(ValueError):
+        codec.decode(data)
+
+
+@pytest.mark.parametrize("size", [4, 20, 30])
+def test_truncated_strings_are_rejected(size):
+    data = codec.encode(message())[:size]
+    with pytest.raises(ValueError, match="Truncated"):
+        codec.decode_header(data)
@@ -0,0 +1,98 @@
+import json
+import time
+import zlib
+
+from dt_communication_utils import DTRawCommunicationGroup, codec
+from dt_communication_utils.dt_communication_msg_t import dt_communication_msg_t
+from dt_communication_utils.compression import DTCompression, DTCompressionOptions
+
+
+def test_fallback_to_zlib_when_a_peer_does_not_know_the_codec():
+    compression = DTCompression(None)
+    # a codec we pretend some peer does not know
+    compressor = compression.compressor(DTCompressionOptions(codec="zlib", threshold=0))
+    data = b"x" * 4096
+    payload, metadata = compressor.compress(data, frozenset(["zlib", "lz4"]))
+    assert metadata == {"codec": "zlib"}
+    payload, metadata = compressor.compress(data, frozenset())
+    assert payload == data and metadata is None
+    assert compression.stats.fallbacks == 1
+
+
+def test_decompressed_size_is_bounded():
+    compression = DTCompression(None, max_size=1024)
+    assert compression.decompress("zlib", zlib.compress(b"x" * 1024)) == b"x" * 1024
+    assert compression.decompress("zlib", zlib.compress(b"x" * 1025)) is None
+    assert compression.decompress("zlib", zlib.compress(b"x" * 1024)[:-4]) is None
+    assert compression.stats.errors == 2
+
+
+def test_peers_that_do_not_announce_codecs_disable_compression():
+    group = DTRawCommunicationGroup("test_compression_negotiation")
+    try:
+        negotiator = group.envelope
+        assert negotiator.codecs == frozenset()
+        # discovery has settled
+        negotiator._started -= negotiator.SETTLE_TIME
+        negotiator._tick()
+        assert "zlib" in negotiator.codecs
+        negotiator._on_announcement("", json.dumps(
+            {"process": "peer-1", "host": "peer", "version": 2, "codecs": ["zlib"]}).encode())
+        assert negotiator.codecs == frozenset(["zlib"])
+        # an older peer
+        negotiator._on_announcement("", json.dumps(
+            {"process": "peer-2", "host": "peer", "version": 2}).encode())
+        assert negotiator.codecs == frozenset()
+    finally:
+        group.shutdown()
+
+
+def test_legacy_publishers_disable_compression():
+    group = DTRawCommunicationGroup("test_compression_legacy")
+    try:
+        negotiator = group.envelope
+        # the group uses envelope version 1, the publisher compresses
+        assert negotiator.options.version == 1
+        group.Publisher(compression=DTCompressionOptions(codec="zlib", threshold=0))
+        negotiator._started -= negotiator.SETTLE_TIME
+        negotiator._tick()
+        assert "zlib" in negotiator.codecs
+        # a peer running an older version of this library publishes on the same topic
+        msg = dt_communication_msg_t()
+        msg.timestamp = 0
+        msg.group = group.name
+        msg.origin = "legacy-host"
+        msg.destination = ""
+        msg.metadata = "{}"
+        msg.txt = ""
+        msg.payload = b"legacy"
+        msg.length = len(msg.payload)
+        group.handler.publish(group.DEFAULT_CHANNEL, codec.encode(msg))
+        deadline = time.monotonic() + 2
+        while negotiator.codecs and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert negotiator.codecs == frozenset()
+    finally:
+        group.shutdown()
+
+
+def test_groups_announce_only_when_negotiating():
+    silent = DTRawCommunicationGroup("test_compression_silent")
+    try:
+        assert not silent.envelope._active
+        silent.Publisher()
+        assert not silent.envelope._active
+        # a compressing publisher negotiates the codecs
+        silent.Publisher(compression=DTCompressionOptions(codec="zlib"))
+        assert silent.envelope._active
+    finally:
+        silent.shutdown()
+    peer = DTRawCommunicationGroup("test_compression_silent")
+    try:
+        # a peer of the group negotiating with us
+        peer.envelope._on_announcement("", json.dumps(
+            {"process": "peer-1", "host": "peer", "version": 2, "codecs": ["zlib"],
+             "group": peer.name}).encode())
+        assert peer.envelope._active
+    finally:
+        peer.shutdown()
@@ -0,0 +1,58 @@
+import sys
+import logging
+import threading
+from typing import List
+
+from dt_communication_utils.delivery import DTDelivery, DTDeliveryOptions, DTOverflowPolicy
+from dt_communication_utils.header import DTCommunicationMessageHeader
+
+THREADS = 8
+MESSAGES = 20000
+
+
+def test_direct_delivery_stats_are_consistent():
+    delivery = DTDelivery.create(lambda *_: None, DTDeliveryOptions(), logging.getLogger())
+    header = DTCommunicationMessageHeader(
+        timestamp=None, origin="autobot01", destination="", txt="")
+
+    def deliver():
+        for _ in range(MESSAGES):
+            delivery.deliver(b"", header)
+
+    threads = [threading.Thread(target=deliver) for _ in range(THREADS)]
+    # switch threads as often as possible
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    stats = delivery.stats
+    assert stats.received == stats.delivered == THREADS * MESSAGES
+
+
+def test_queued_delivery_of_a_batch():
+    received: List[bytes] = []
+    done = threading.Event()
+
+    def callback(message, _):
+        received.append(message)
+        if len(received) == 3:
+            done.set()
+
+    delivery = DTDelivery.create(callback, DTDeliveryOptions(
+        queue_size=3, overflow=DTOverflowPolicy.DROP_NEWEST), logging.getLogger())
+    header = DTCommunicationMessageHeader(
+        timestamp=None, origin="autobot01", destination="", txt="")
+    try:
+        delivery.deliver_many([(b"%d" % i, header) for i in range(5)])
+        assert done.wait(5)
+        stats = delivery.stats
+    finally:
+        delivery.shutdown()
+    # the batch is queued at once, the workers see the queue full
+    assert received == [b"0", b"1", b"2"]
+    assert (stats.received, stats.dropped_overflow) == (5, 2)
@@ -0,0 +1,60 @@
+import zlib
+
+from dt_communication_utils.delta import DTDelta, DTDeltaOptions, _HEADER
+
+
+def payloads(count):
+    # a slowly changing state
+    state = bytearray(b"\x00" * 200)
+    for i in range(count):
+        state[i % len(state)] = i % 256
+        yield bytes(state)
+
+
+def test_deltas_are_rebuilt():
+    sender, receiver = DTDelta(), DTDelta()
+    encoder = sender.encoder(DTDeltaOptions(keyframe_every=4, keyframe_period=60))
+    for data in payloads(10):
+        assert receiver.decode("key", encoder.encode(data)) == data
+    assert sender.stats.deltas_sent > 0
+    assert receiver.stats.deltas_received == sender.stats.deltas_sent
+
+
+def test_resync_after_a_lost_keyframe():
+    sender, receiver = DTDelta(), DTDelta()
+    encoder = sender.encoder(DTDeltaOptions(keyframe_every=4, keyframe_period=60))
+    decoded = []
+    for i, data in enumerate(payloads(12)):
+        payload = encoder.encode(data)
+        # the second keyframe is lost
+        if i == 4:
+            continue
+        decoded.append(receiver.decode("key", payload))
+    expected = list(payloads(12))
+    # the deltas referring to the lost keyframe are dropped
+    assert decoded[:4] == expected[:4]
+    assert decoded[4:7] == [None] * 3
+    # the next keyframe resynchronizes the receiver
+    assert decoded[7:] == expected[8:]
+    assert receiver.stats.deltas_dropped == 3
+
+
+def test_late_joiners_wait_for_a_keyframe():
+    sender, receiver = DTDelta(), DTDelta()
+    encoder = sender.encoder(DTDeltaOptions(keyframe_every=3, keyframe_period=60))
+    encoded = [encoder.encode(data) for data in payloads(6)]
+    decoded = [receiver.decode("key", payload) for payload in encoded[1:]]
+    assert decoded[:2] == [None, None]
+    assert decoded[2:] == list(payloads(6))[3:]
+
+
+def test_decompressed_deltas_are_bounded():
+    sender, receiver = DTDelta(), DTDelta(max_size=1000)
+    encoder = sender.encoder(DTDeltaOptions(keyframe_every=4, keyframe_period=60))
+    keyframe = encoder.encode(bytes(200))
+    assert receiver.decode("key", keyframe) == bytes(200)
+    stream, keyframe_id, _ = _HEADER.unpack_from(keyframe)
+    # a tiny delta expanding to 10 MB
+    bomb = _HEADER.pack(stream, keyframe_id, 1) + zlib.compress(bytes(10 * 1024 * 1024))
+    assert receiver.decode("key", bomb) is None
+    assert receiver.stats.errors == 1
@@ -0,0 +1,86 @@
+import json
+import logging
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from dt_communication_utils import codec
+from dt_communication_utils.constants import HOSTNAME
+from dt_communication_utils.dispatcher import DTCommunicationDispatcher
+from dt_communication_utils.dt_communication_msg_t import dt_communication_msg_t
+
+
+class Handler(object):
+
+    def subscribe(self, topic, callback):
+        return topic
+
+    def unsubscribe(self, subscription):
+        pass
+
+
+class Subscriber(object):
+
+    encoded = False
+    decoding_key = None
+
+    def __init__(self, topic, group):
+        self.topic = topic
+        self.group = SimpleNamespace(name=group, decode=lambda payload, _: bytes(payload))
+        self.received = []
+        self.batches = []
+
+    def accepts(self, _):
+        return True
+
+    def deliver(self, message, header):
+        self.received.append(message)
+
+    def deliver_many(self, messages):
+        self.batches.append([message for message, _ in messages])
+
+
+def message(destination, metadata=None):
+    msg = dt_communication_msg_t()
+    msg.group = "group"
+    msg.origin = "somebody-else"
+    msg.destination = destination
+    msg.metadata = json.dumps(metadata or {})
+    msg.txt = ""
+    msg.payload = b"payload"
+    msg.length = len(msg.payload)
+    return codec.encode(msg)
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = DTCommunicationDispatcher(
+        "group", Handler(), logging.getLogger(), threading.RLock())
+    yield dispatcher
+    dispatcher.close()
+
+
+def test_messages_for_others_are_dropped_before_decoding(dispatcher, monkeypatch):
+    subscriber = Subscriber("topic", "group")
+    dispatcher.add(subscriber)
+    decoded = []
+    decode_body = codec.decode_body
+    monkeypatch.setattr(codec, "decode_body",
+                        lambda *args: decoded.append(1) or decode_body(*args))
+    dispatcher.dispatch("topic", message("another-host"))
+    assert decoded == []
+    dispatcher.dispatch("topic", message(HOSTNAME))
+    assert decoded == [1]
+    assert subscriber.received == [b"payload"]
+
+
+def test_batches_are_handed_to_each_subscriber_at_once(dispatcher):
+    ours, others = Subscriber("topic", "group"), Subscriber("topic", "group")
+    dispatcher.add(ours)
+    dispatcher.add(others)
+    messages = [message(HOSTNAME), message("another-host"), message(HOSTNAME)]
+    dispatcher.dispatch_many("topic", messages)
+    for subscriber in (ours, others):
+        assert subscriber.batches == [[b"payload", b"payload"]]
+        assert subscriber.received == []
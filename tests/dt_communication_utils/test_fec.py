@@ -0,0 +1,65 @@
+import pytest
+
+from dt_communication_utils.fec import DTFec, DTFecOptions
+
+
+def send(encoder, data):
+    # messages are sent as the FEC header followed by the payload
+    seq, header = encoder.header()
+    message = header + data
+    return message, encoder.add(seq, message)
+
+
+def stream(options, payloads):
+    encoder = DTFec(options).encoder()
+    sent = []
+    for data in payloads:
+        message, parity = send(encoder, data)
+        sent.append((message, False))
+        if parity is not None:
+            sent.append((parity, True))
+    return sent
+
+
+@pytest.mark.parametrize("lost", range(4))
+def test_one_lost_message_per_block_is_rebuilt(lost):
+    payloads = [b"first", b"", b"third message\x00\x00", b"4"]
+    sent = stream(DTFecOptions(block_size=4), payloads)
+    receiver = DTFec(None)
+    received, recovered = [], []
+    for i, (message, parity) in enumerate(sent):
+        if i == lost:
+            continue
+        payload, rebuilt = receiver.receive("key", message, message, parity)
+        if payload is not None:
+            received.append(bytes(payload))
+        recovered.extend(rebuilt)
+    assert recovered == [sent[lost][0]]
+    assert bytes(DTFec.strip(recovered[0])) == payloads[lost]
+    assert receiver.stats.recovered == 1
+
+
+def test_interleaving_recovers_bursts():
+    payloads = [b"message %d" % i for i in range(8)]
+    sent = stream(DTFecOptions(block_size=4, interleave=2), payloads)
+    data = [message for message, parity in sent if not parity]
+    receiver = DTFec(None)
+    recovered = []
+    for message, parity in sent:
+        # two consecutive messages are lost
+        if message in data[2:4]:
+            continue
+        recovered.extend(receiver.receive("key", message, message, parity)[1])
+    assert sorted(recovered) == sorted(data[2:4])
+
+
+def test_two_lost_messages_in_a_block_are_unrecoverable():
+    # blocks are given up on once two newer ones started
+    sent = stream(DTFecOptions(block_size=4), [b"a", b"b", b"c", b"d"] * 4)
+    receiver = DTFec(None)
+    for i, (message, parity) in enumerate(sent):
+        if i in (0, 1):
+            continue
+        assert receiver.receive("key", message, message, parity)[1] == []
+    assert receiver.stats.recovered == 0
+    assert receiver.stats.unrecoverable == 2
@@ -0,0 +1,87 @@
+import time
+
+from dt_communication_utils.fragmentation import DTFragmentation, DTFragmentationOptions, _HEADER
+
+
+def fragments(fragmentation, data):
+    return [header + bytes(chunk) for header, chunk in fragmentation.split(data)]
+
+
+def test_out_of_order_reassembly():
+    fragmentation = DTFragmentation(DTFragmentationOptions(fragment_size=10))
+    data = bytes(range(95))
+    parts = fragments(fragmentation, data)
+    assert len(parts) == 10
+    results = [fragmentation.reassemble("key", part) for part in reversed(parts)]
+    assert results[:-1] == [None] * 9
+    assert bytes(results[-1]) == data
+    assert fragmentation.stats.messages_reassembled == 1
+
+
+def test_incomplete_messages_time_out():
+    fragmentation = DTFragmentation(DTFragmentationOptions(fragment_size=10, timeout=0.1))
+    first = fragments(fragmentation, b"x" * 30)
+    assert fragmentation.reassemble("key", first[0]) is None
+    time.sleep(0.2)
+    # the message is given up on the next time a fragment arrives
+    second = fragments(fragmentation, b"y" * 30)
+    assert fragmentation.reassemble("key", second[0]) is None
+    stats = fragmentation.stats
+    assert stats.dropped_timeout == 1
+    assert stats.incomplete == 1
+    # the late fragments start over, they never complete the message
+    assert fragmentation.reassemble("key", first[1]) is None
+    assert fragmentation.reassemble("key", first[2]) is None
+
+
+def test_oldest_messages_are_evicted():
+    fragmentation = DTFragmentation(DTFragmentationOptions(fragment_size=10, max_pending=2))
+    messages = [fragments(fragmentation, bytes([i]) * 30) for i in range(3)]
+    for parts in messages:
+        assert fragmentation.reassemble("key", parts[0]) is None
+    stats = fragmentation.stats
+    assert stats.dropped_evicted == 1
+    assert stats.incomplete == 2
+    # the newest messages can still be completed
+    assert fragmentation.reassemble("key", messages[2][1]) is None
+    assert bytes(fragmentation.reassemble("key", messages[2][2])) == bytes([2]) * 30
+
+
+def test_memory_is_bounded():
+    options = DTFragmentationOptions(fragment_size=10, max_pending_bytes=50)
+    fragmentation = DTFragmentation(options)
+    first, second = fragments(fragmentation, b"a" * 30), fragments(fragmentation, b"b" * 30)
+    fragmentation.reassemble("key", first[0])
+    fragmentation.reassemble("key", second[0])
+    assert fragmentation.stats.dropped_evicted == 1
+    # too large to be ever reassembled
+    assert fragmentation.reassemble("key", fragments(fragmentation, b"c" * 60)[0]) is None
+    assert fragmentation.stats.dropped_invalid == 1
+
+
+def test_inconsistent_fragments_are_rejected():
+    fragmentation = DTFragmentation(DTFragmentationOptions(fragment_size=10))
+    parts = fragments(fragmentation, bytes(range(25)))
+    msg_id, offset, size, index, count = _HEADER.unpack_from(parts[1])
+    chunk = parts[1][_HEADER.size:]
+    forged = [
+        # the offset does not match the index
+        _HEADER.pack(msg_id, offset + 1, size, index, count) + chunk,
+        # the fragment ends past the end of the message
+        _HEADER.pack(msg_id, offset, 15, index, count) + chunk,
+        # the index does not match the offset
+        _HEADER.pack(msg_id, offset, size, 0, count) + chunk,
+        # the last fragment does not end the message
+        _HEADER.pack(msg_id, 20, size, 2, count) + chunk[:2],
+    ]
+    for fragment in forged:
+        assert fragmentation.reassemble("key", fragment) is None
+    assert fragmentation.stats.dropped_invalid == len(forged)
+    # a fragment size different from the one of the other fragments
+    assert fragmentation.reassemble("key", parts[0]) is None
+    assert fragmentation.reassemble(
+        "key", _HEADER.pack(msg_id, 9, size, 1, count) + bytes(9)) is None
+    assert fragmentation.stats.dropped_invalid == len(forged) + 1
+    # the genuine fragments still complete the message
+    assert fragmentation.reassemble("key", parts[1]) is None
+    assert bytes(fragmentation.reassemble("key", parts[2])) == bytes(range(25))
@@ -0,0 +1,82 @@
+import threading
+
+from dt_communication_utils import DTRawCommunicationGroup
+from dt_communication_utils.mailman import DTCommunicationMailman
+
+
+def test_detach_while_holding_the_lock_does_not_deadlock():
+    mailman = DTCommunicationMailman.get_instance()
+    group = DTRawCommunicationGroup("test_mailman_detach")
+    done = threading.Event()
+
+    def shutdown():
+        with mailman.lock:
+            group.shutdown()
+        done.set()
+
+    threading.Thread(target=shutdown, daemon=True).start()
+    assert done.wait(5)
+
+
+def test_shutdown_from_local_delivery_does_not_deadlock():
+    publisher = DTRawCommunicationGroup("test_mailman_local", local_delivery=True)
+    subscriber = DTRawCommunicationGroup("test_mailman_local")
+    received = threading.Event()
+    done = threading.Event()
+
+    def callback(data, header):
+        received.set()
+        # delivered on the publisher's thread
+        subscriber.shutdown()
+
+    subscriber.Subscriber(callback)
+
+    def publish():
+        publisher.Publisher().publish(b"bye")
+        done.set()
+
+    threading.Thread(target=publish, daemon=True).start()
+    try:
+        assert done.wait(5)
+        assert received.is_set()
+    finally:
+        publisher.shutdown()
+
+
+def test_lock_ownership():
+    lock = DTCommunicationMailman.get_instance().lock
+    assert not lock.owned()
+    with lock:
+        with lock:
+            assert lock.owned()
+        assert lock.owned()
+        other = []
+        thread = threading.Thread(target=lambda: other.append(lock.owned()))
+        thread.start()
+        thread.join()
+        assert other == [False]
+    assert not lock.owned()
+
+
+def test_slow_local_subscribers_do_not_hold_the_delivery_lock():
+    lock = DTCommunicationMailman.get_instance().lock
+    group = DTRawCommunicationGroup("test_mailman_slow_local", local_delivery=True)
+    inside = threading.Event()
+    release = threading.Event()
+
+    def callback(data, header):
+        inside.set()
+        release.wait(5)
+
+    group.Subscriber(callback)
+    publisher = threading.Thread(target=lambda: group.Publisher().publish(b"slow"), daemon=True)
+    publisher.start()
+    try:
+        assert inside.wait(5)
+        # the network delivery can go on while the local callback is running
+        assert lock.acquire(timeout=1)
+        lock.release()
+    finally:
+        release.set()
+        publisher.join(5)
+        group.shutdown()
@@ -0,0 +1,77 @@
+import os
+import time
+import functools
+import threading
+
+import pytest
+
+from dt_communication_utils import DTRawCommunicationGroup, DTDeliveryOptions
+from dt_communication_utils.pool import DTProcessDelivery
+from dt_communication_utils.shm import DTSharedMemoryRing
+
+
+def record(path: str, message: bytes, header):
+    with open(path, "ab") as fout:
+        fout.write(b"%d %s\n" % (os.getpid(), message))
+
+
+def read(path: str):
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as fin:
+        return [line.split(b" ") for line in fin.read().splitlines()]
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def test_workers_decode_and_call_the_callback(tmp_path):
+    path = str(tmp_path / "received")
+    # the process is multi-threaded (mailman), workers are not forked from it
+    assert threading.active_count() >= 1
+    group = DTRawCommunicationGroup("test_pool", local_delivery=True)
+    try:
+        subscriber = group.Subscriber(functools.partial(record, path),
+                                      delivery=DTDeliveryOptions(processes=2))
+        publisher = group.Publisher()
+        for i in range(20):
+            publisher.publish(b"m%d" % i)
+        assert wait_for(lambda: len(read(path)) == 20)
+        lines = read(path)
+        assert sorted(message for _, message in lines) == sorted(b"m%d" % i for i in range(20))
+        assert all(int(pid) != os.getpid() for pid, _ in lines)
+        assert wait_for(lambda: subscriber.stats.delivered == 20)
+    finally:
+        group.shutdown()
+
+
+def test_unpicklable_callback_is_rejected():
+    group = DTRawCommunicationGroup("test_pool_unpicklable")
+    try:
+        with pytest.raises(ValueError):
+            group.Subscriber(lambda message, header: None,
+                             delivery=DTDeliveryOptions(processes=1))
+    finally:
+        group.shutdown()
+
+
+def test_oversized_header_is_dropped(tmp_path):
+    path = str(tmp_path / "received")
+    group = DTRawCommunicationGroup("test_pool_header", local_delivery=True)
+    try:
+        subscriber = group.Subscriber(functools.partial(record, path),
+                                      delivery=DTDeliveryOptions(processes=1))
+        publisher = group.Publisher()
+        publisher.publish(b"big", txt="x" * (DTSharedMemoryRing.MAX_TOPIC_SIZE + 1))
+        publisher.publish(b"small")
+        assert wait_for(lambda: len(read(path)) == 1)
+        assert read(path)[0][1] == b"small"
+        assert subscriber.stats.dropped_overflow == 1
+    finally:
+        group.shutdown()
@@ -0,0 +1,71 @@
+import time
+import logging
+import threading
+
+from dt_communication_utils.ratelimit import DTRateLimit, DTRateLimitOptions
+from dt_communication_utils.mailman import DTCommunicationMailman
+
+
+def limiter(options):
+    rate_limit = DTRateLimit(logging.getLogger("test_ratelimit"))
+    return rate_limit, rate_limit.limiter(options, lambda *args: None)
+
+
+def test_idle_periods_are_not_carried_over():
+    rate_limit, rl = limiter(DTRateLimitOptions(period=0.1, trailing=False))
+    try:
+        assert rl.admit(0, None, None)
+        # idle for several periods
+        time.sleep(0.35)
+        admitted = [rl.admit(i, None, None) for i in range(5)]
+        assert admitted == [True, False, False, False, False]
+    finally:
+        rl.close()
+
+
+def test_private_messages_are_not_conflated():
+    _, rl = limiter(DTRateLimitOptions(period=10, trailing=False))
+    try:
+        assert all(rl.admit(i, "robot", None) for i in range(3))
+    finally:
+        rl.close()
+
+
+def test_pacing_does_not_block_the_publisher():
+    rate_limit, rl = limiter(DTRateLimitOptions(bytes_per_second=10000, burst=1000))
+    sent = []
+    done = threading.Event()
+
+    def publish(msg):
+        sent.append(msg)
+        if len(sent) == 5:
+            done.set()
+
+    try:
+        stamp = time.monotonic()
+        # 5000 bytes, 4000 of them above the burst: about 0.4 seconds
+        for _ in range(5):
+            rl.transmit([b"x" * 1000], publish)
+        assert time.monotonic() - stamp < 0.1
+        assert done.wait(5)
+        assert time.monotonic() - stamp >= 0.35
+        assert rate_limit.stats.paced >= 4
+    finally:
+        rl.close()
+
+
+def test_pacing_from_the_mailman_thread():
+    rate_limit, rl = limiter(DTRateLimitOptions(bytes_per_second=1000, burst=100))
+    mailman = DTCommunicationMailman.get_instance()
+    # 2 seconds worth of data are handed over from the mailman, which keeps spinning
+    ticks = []
+    ticker = mailman.every(0.02, lambda: ticks.append(time.monotonic()))
+    sender = mailman.every(0.01, lambda: rl.transmit([b"x" * 1000], lambda msg: None))
+    try:
+        time.sleep(0.3)
+        assert len(ticks) >= 5
+        assert rate_limit.stats.dropped > 0
+    finally:
+        mailman.cancel(sender)
+        mailman.cancel(ticker)
+        rl.close()
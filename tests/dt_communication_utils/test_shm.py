@@ -0,0 +1,89 @@
+import os
+import time
+import subprocess
+import sys
+
+import pytest
+
+from dt_communication_utils import DTRawCommunicationGroup
+from dt_communication_utils.shm import DTSharedMemoryTransport, PID_NAMESPACE, \
+    remove_stale_files
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def groups():
+    created = []
+
+    def make(*args, **kwargs):
+        group = DTRawCommunicationGroup(*args, **kwargs)
+        created.append(group)
+        return group
+
+    yield make
+    for group in created:
+        group.shutdown()
+
+
+def test_plain_group_receives_from_shm_publisher(groups):
+    publisher = groups("test_shm_plain", shared_memory=True)
+    subscriber = groups("test_shm_plain")
+    received = []
+    subscriber.Subscriber(lambda data, header: received.append(bytes(data)))
+    # discovery has settled, nobody announced a subscription to the topic
+    time.sleep(DTSharedMemoryTransport.SETTLE_TIME + 0.5)
+    publisher.Publisher().publish(b"hello")
+    assert wait_for(lambda: received == [b"hello"])
+
+
+def test_shm_reader_receives_each_message_once(groups):
+    publisher = groups("test_shm_once", shared_memory=True)
+    reader = groups("test_shm_once", shared_memory=True)
+    plain = groups("test_shm_once")
+    received, received_plain = [], []
+    reader.Subscriber(lambda data, header: received.append(bytes(data)))
+    plain.Subscriber(lambda data, header: received_plain.append(bytes(data)))
+    time.sleep(DTSharedMemoryTransport.SETTLE_TIME + 1.5)
+    pub = publisher.Publisher()
+    for i in range(5):
+        pub.publish(b"%d" % i)
+    expected = [b"%d" % i for i in range(5)]
+    assert wait_for(lambda: received == expected and received_plain == expected)
+    time.sleep(0.2)
+    assert received == expected
+
+
+def test_exclusive_publisher_skips_multicast_without_subscribers(groups):
+    publisher = groups("test_shm_exclusive", shared_memory=True, shm_exclusive=True)
+    time.sleep(DTSharedMemoryTransport.SETTLE_TIME + 0.5)
+    _, network = publisher.transport.route("/test")
+    assert not network
+
+
+@pytest.mark.skipif(PID_NAMESPACE == "0", reason="PID namespace unknown")
+def test_stale_files_are_removed(tmp_path):
+    # a process that no longer exists
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    other_namespace = str(int(PID_NAMESPACE) + 1)
+    names = {
+        f"dt-comm-{PID_NAMESPACE}-{dead.pid}-0123456789abcdef.ring": False,
+        f"dt-comm-pool-{PID_NAMESPACE}-{dead.pid}-0123456789abcdef-0.inbox": False,
+        f"dt-comm-{PID_NAMESPACE}-{os.getpid()}-0123456789abcdef.ring": True,
+        f"dt-comm-{other_namespace}-{dead.pid}-0123456789abcdef.ring": True,
+        "something-else": True,
+    }
+    for name in names:
+        (tmp_path / name).touch()
+    removed = remove_stale_files(str(tmp_path))
+    assert sorted(removed) == sorted(str(tmp_path / name)
+                                     for name, kept in names.items() if not kept)
+    assert sorted(os.listdir(tmp_path)) == sorted(name for name, kept in names.items() if kept)
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+import pytest
+
+cbor2 = pytest.importorskip("cbor2")
+
+from dt_communication_utils import DTStructuredCommunicationGroup
+
+
+@dataclass
+class Pose:
+    x: float
+    y: float
+
+
+@dataclass
+class Path:
+    name: str
+    poses: List[Pose]
+    landmarks: Dict[str, Pose]
+    start: Optional[Pose] = None
+    alternatives: Optional[List[List[Pose]]] = None
+
+
+def roundtrip(group, msg):
+    return group.decode(group.encode(msg), group._metadata)
+
+
+def test_integer_keys_are_not_mistaken_for_dictionary_ids():
+    group = DTStructuredCommunicationGroup("test_structured_int_keys", keys=["a", "b"])
+    try:
+        msg = {0: "zero", -1: "neg", 1: {"b": 2, 7: "seven"}, "a": 1, "other": [{"a": 0}]}
+        assert roundtrip(group, msg) == msg
+    finally:
+        group.shutdown()
+
+
+def test_dataclasses_in_containers_are_rebuilt():
+    group = DTStructuredCommunicationGroup("test_structured_containers", schema=Path,
+                                           keys=["x", "y", "poses"])
+    try:
+        msg = Path(name="p", poses=[Pose(0, 1), Pose(2, 3)],
+                   landmarks={"door": Pose(4, 5)}, start=Pose(6, 7),
+                   alternatives=[[Pose(8, 9)], []])
+        assert roundtrip(group, msg) == msg
+        assert roundtrip(group, Path(name="q", poses=[], landmarks={})) == \
+            Path(name="q", poses=[], landmarks={})
+    finally:
+        group.shutdown()
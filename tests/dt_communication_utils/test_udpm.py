@@ -0,0 +1,70 @@
+import time
+import select
+
+import pytest
+
+from dt_communication_utils import DTRawCommunicationGroup
+from dt_communication_utils.udpm import DTUDPMulticastHandler
+
+
+@pytest.fixture
+def handler():
+    handler = DTUDPMulticastHandler("udpm://239.255.76.67:7699?ttl=0")
+    yield handler
+    handler.close()
+
+
+def drain(handler, timeout: float = 0.5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if select.select([handler], [], [], 0.05)[0]:
+            handler.handle_timeout(0)
+
+
+def test_consecutive_messages_are_delivered_in_batches(handler):
+    received = []
+    handler.subscribe_many("batch", lambda channel, batch: received.append(
+        (channel, [bytes(data) for data in batch])))
+    handler.subscribe("single", lambda channel, data: received.append((channel, bytes(data))))
+    handler.publish_many("batch", [b"1", b"2", b"3"])
+    handler.publish("single", b"x")
+    handler.publish("batch", b"4")
+    handler.publish("batch", b"y" * 100000)
+    drain(handler)
+    assert received == [
+        ("batch", [b"1", b"2", b"3"]),
+        ("single", b"x"),
+        ("batch", [b"4", b"y" * 100000]),
+    ]
+
+
+def test_batched_group_delivers_in_order():
+    group = DTRawCommunicationGroup("test_udpm_group", batched_io=True)
+    received = []
+    try:
+        group.Subscriber(lambda message, header: received.append(bytes(message)))
+        publisher = group.Publisher()
+        for i in range(100):
+            publisher.publish(b"m%d" % i)
+        deadline = time.monotonic() + 5
+        while len(received) < 100 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert received == [b"m%d" % i for i in range(100)]
+    finally:
+        group.shutdown()
+
+
+def test_duplicated_fragments_do_not_complete_a_message(handler):
+    received = []
+    handler.subscribe("long", lambda channel, data: received.append(bytes(data)))
+    data = bytes(range(256)) * 1000
+    datagrams = [memoryview(datagram) for datagram in
+                 DTUDPMulticastHandler._datagrams(b"long\0", 1, data)]
+    assert len(datagrams) > 2
+    sender = b"sender"
+    # the first fragment twice, then all but the last one
+    assert handler._parse(datagrams[0], sender) is None
+    for datagram in datagrams[:-1]:
+        assert handler._parse(datagram, sender) is None
+    channel, message = handler._parse(datagrams[-1], sender)
+    assert (channel, bytes(message)) == ("long", data)